@@ -3,23 +3,195 @@
 SQLAlchemy database setup using SQLite for audit history persistence.
 """
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey
+import re
+import time
+import zlib
+import logging
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import create_engine, event, inspect, select, text, Column, Index, Integer, String, Float, Boolean, Date, DateTime, Text, ForeignKey
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
 from sqlalchemy.sql import func
+from sqlalchemy.types import TypeDecorator
+
+logger = logging.getLogger(__name__)
 
 # Resolve DB path relative to this file
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.getenv("DATABASE_URL", f"sqlite:///{os.path.join(BASE_DIR, 'audit.db')}")
 
-engine = create_engine(
-    DB_PATH,
-    connect_args={"check_same_thread": False},  # Needed for SQLite + FastAPI
-    echo=False,
-)
+# ============================================================
+# SQLITE STORAGE PROFILE
+# ============================================================
+# "production": WAL journal (readers never block the writer), synchronous=NORMAL
+#               (durable at checkpoints, safe in WAL), bigger page cache, mmap
+#               reads and a busy timeout so concurrent workers wait instead of
+#               failing with "database is locked". New files are created with
+#               auto_vacuum=INCREMENTAL so app/maintenance.py can return
+#               freed pages to the OS in small steps.
+# "default":    SQLite's own settings (rollback journal, synchronous=FULL).
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "production").strip().lower()
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", "65536"))
+SQLITE_MMAP_BYTES = int(os.getenv("SQLITE_MMAP_BYTES", str(256 * 1024 * 1024)))
+
+SQLITE_PROFILES = {
+    "default": {},
+    "production": {
+        "auto_vacuum": "INCREMENTAL",  # only takes effect before the first table (or on VACUUM)
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -SQLITE_CACHE_KB,  # negative = KiB
+        "mmap_size": SQLITE_MMAP_BYTES,
+        "temp_store": "MEMORY",
+        "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    },
+}
+if SQLITE_PROFILE not in SQLITE_PROFILES:
+    raise ValueError(f"Unknown SQLITE_PROFILE: {SQLITE_PROFILE!r} (expected {', '.join(SQLITE_PROFILES)})")
+
+# Connection pool (one pool per uvicorn worker process)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+
+def sqlite_pragmas(profile: Optional[str] = None) -> dict:
+    """PRAGMAs of `profile` (default: SQLITE_PROFILE, read at call time)."""
+    return dict(SQLITE_PROFILES[profile or SQLITE_PROFILE])
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """connect-event hook: run the profile's PRAGMAs on every new connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in sqlite_pragmas().items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def _engine_options(url: str) -> dict:
+    """create_engine() keyword arguments for `url` (pool settings only for SQLite files)."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite":
+        return {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT}
+
+    connect_args = {"check_same_thread": False}  # Needed for SQLite + FastAPI
+    if parsed.database in (None, "", ":memory:"):
+        return {"connect_args": connect_args}
+    return {
+        "connect_args": connect_args,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": False,  # local file: a dead connection is not a thing
+    }
+
+
+engine = create_engine(DB_PATH, echo=False, **_engine_options(DB_PATH))
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# ============================================================
+# ASYNC ENGINE (optional, DB_ASYNC=1)
+# ============================================================
+# Same database through aiosqlite, so async endpoints can await commits
+# instead of blocking the event loop. Schema management (create_db) and the
+# background workers keep using the sync engine above.
+DB_ASYNC = os.getenv("DB_ASYNC", "0").strip().lower() in {"1", "true", "yes"}
+
+
+def async_database_url(url: str) -> str:
+    """sqlite:///... -> sqlite+aiosqlite:///... (other URLs are returned unchanged)."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.get_driver_name() in ("pysqlite", ""):
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    return parsed.render_as_string(hide_password=False)
+
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    async_engine = create_async_engine(async_database_url(DB_PATH), echo=False, **_engine_options(DB_PATH))
+    if async_engine.dialect.name == "sqlite":
+        event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+# ============================================================
+# COMPACT MESSAGE STORAGE
+# ============================================================
+# "plain":   every message row carries its own sender, label and both texts.
+# "compact": sender and label are interned in lookup tables (the row keeps an
+#            id and an empty string), and normalized_text only keeps what
+#            cannot be rebuilt from raw_text (see MSG_* flags).
+# Reads understand both layouts, so the mode can be switched at any time;
+# app/maintenance.py converts existing rows.
+STORAGE_MODE = os.getenv("AUDIT_STORAGE", "plain").strip().lower()
+if STORAGE_MODE not in {"plain", "compact"}:
+    raise ValueError(f"Unknown AUDIT_STORAGE: {STORAGE_MODE!r} (expected plain or compact)")
+
+# zlib for long message texts (SQLite only; short chat lines do not shrink)
+TEXT_COMPRESSION = os.getenv("AUDIT_TEXT_COMPRESSION", "0").strip().lower() in {"1", "true", "yes"}
+TEXT_COMPRESS_MIN_BYTES = int(os.getenv("AUDIT_TEXT_COMPRESS_MIN_BYTES", "256"))
+
+# AuditMessage.flags
+MSG_NORMALIZED_SAME = 1   # normalized_text == raw_text (stored empty)
+MSG_NORMALIZED_DELTA = 2  # stored as token overrides on top of _base_tokens(raw_text)
+
+# Lexicon-independent half of the normalizer (services/normalizer.py), frozen
+# here because stored deltas decode against it: do not change it.
+_EDGE_PUNCT_RE = re.compile(r"^\W+|\W+$")
+_REPEATED_CHARS_RE = re.compile(r"(.)\1{2,}")
+_DELTA_SEP = "\x1f"
+_DELTA_MAX_WORDS = 4
+
+
+class CompressedText(TypeDecorator):
+    """
+    TEXT column whose long values may be stored as zlib BLOBs. SQLite keeps a
+    BLOB as-is in a TEXT column, so compressed and plain rows can coexist and
+    reads decompress whatever they find.
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or not TEXT_COMPRESSION or dialect.name != "sqlite":
+            return value
+        data = value.encode("utf-8")
+        if len(data) < TEXT_COMPRESS_MIN_BYTES:
+            return value
+        packed = zlib.compress(data)
+        return packed if len(packed) < len(data) else value
+
+    def process_result_value(self, value, dialect):
+        if isinstance(value, (bytes, memoryview)):
+            return zlib.decompress(value).decode("utf-8")
+        return value
+
+
+# ============================================================
+# FULL-TEXT SEARCH (SQLite FTS5)
+# ============================================================
+# One FTS5 row per message (rowid = audit_messages.id) holding the full
+# normalized text with leet spellings folded (search.fold_leet). Rows are
+# added from Python on insert, since compact rows
+# only store a delta that an external-content table would index as-is, and
+# removed by an AFTER DELETE trigger, so every delete path keeps it in sync.
+AUDIT_SEARCH = os.getenv("AUDIT_SEARCH", "1").strip().lower() in {"1", "true", "yes"}
+SEARCH_ENABLED = AUDIT_SEARCH and engine.dialect.name == "sqlite"
+SEARCH_TABLE = "audit_messages_fts"
+# Renamed whenever what gets indexed changes; an index with another column is rebuilt
+SEARCH_COLUMN = "folded_text"
+
 
 # ============================================================
 # MODELS
@@ -29,7 +201,7 @@ class AuditSession(Base):
     """Represents one audit request (the whole conversation)."""
     __tablename__ = "audit_sessions"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     source = Column(String(10), nullable=False)          # "text" or "image"
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     total_messages = Column(Integer, nullable=False)
@@ -37,34 +209,307 @@ class AuditSession(Base):
     safety_score = Column(Integer, nullable=False)
     processing_time_seconds = Column(Float, nullable=False)
 
+    # Job state for asynchronous audits; synchronous audits are saved as "done"
+    status = Column(String(10), nullable=False, default="done", server_default="done")  # queued/running/saving/done/failed
+    processed_messages = Column(Integer, nullable=False, default=0, server_default="0")
+    error = Column(Text, nullable=True)
+    # Unfinished jobs: the process running them (main.WORKER_ID) and its heartbeat,
+    # refreshed on every commit and every AUDIT_JOB_HEARTBEAT_SECONDS
+    owner = Column(String(64), nullable=True)
+    updated_at = Column(DateTime(timezone=True), nullable=True, default=func.now(), onupdate=func.now())
+
+    # Version of the lexicon snapshot the audit was judged with (see services/lexicon.py)
+    lexicon_version = Column(String(16), nullable=True)
+
     messages = relationship("AuditMessage", back_populates="session", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # History listing: WHERE status = 'done' ORDER BY created_at DESC, id DESC (keyset)
+        Index("ix_audit_sessions_status_created_at_id", "status", "created_at", "id"),
+    )
+
 
 class AuditMessage(Base):
     """Represents a single parsed message within an audit session."""
     __tablename__ = "audit_messages"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     session_id = Column(Integer, ForeignKey("audit_sessions.id", ondelete="CASCADE"), nullable=False)
     msg_order = Column(Integer, nullable=False)          # original order in conversation
-    sender = Column(String(255), nullable=False)
+    sender = Column(String(255), nullable=False)         # "" when sender_id is set
     timestamp = Column(String(50), nullable=False)
-    raw_text = Column(Text, nullable=False)
-    normalized_text = Column(Text, nullable=False)
-    label = Column(String(20), nullable=False)           # positive/negative/neutral
+    raw_text = Column(CompressedText, nullable=False)
+    normalized_text = Column(CompressedText, nullable=False)
+    label = Column(String(20), nullable=False)           # positive/negative/neutral ("" when label_id is set)
     score = Column(Float, nullable=False)
     is_toxic = Column(Boolean, nullable=False)
 
+    # Compact storage (see STORAGE_MODE)
+    sender_id = Column(Integer, ForeignKey("audit_senders.id"), nullable=True)
+    label_id = Column(Integer, ForeignKey("audit_labels.id"), nullable=True)
+    flags = Column(Integer, nullable=False, default=0, server_default="0")
+
     session = relationship("AuditSession", back_populates="messages")
 
+    __table_args__ = (
+        # Detail view: WHERE session_id = ? ORDER BY msg_order (also serves cascade deletes)
+        Index("ix_audit_messages_session_id_msg_order", "session_id", "msg_order"),
+    )
+
+
+class AuditSender(Base):
+    """Interned sender names (compact storage)."""
+    __tablename__ = "audit_senders"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(255), nullable=False, unique=True)
+
+
+class AuditLabel(Base):
+    """Interned sentiment labels (compact storage)."""
+    __tablename__ = "audit_labels"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(20), nullable=False, unique=True)
+
+
+# Aggregates of finished ("done") sessions, maintained incrementally by app/stats.py
+# so /api/stats never scans audit_messages.
+
+class StatsDaily(Base):
+    """Totals per UTC day and source."""
+    __tablename__ = "stats_daily"
+
+    day = Column(Date, primary_key=True)
+    source = Column(String(10), primary_key=True)
+    sessions = Column(Integer, nullable=False, default=0)
+    messages = Column(Integer, nullable=False, default=0)
+    toxic_messages = Column(Integer, nullable=False, default=0)
+    safety_score_sum = Column(Integer, nullable=False, default=0)
+
+
+class StatsSender(Base):
+    """All-time totals per sender name."""
+    __tablename__ = "stats_senders"
+
+    sender = Column(String(255), primary_key=True)
+    messages = Column(Integer, nullable=False, default=0)
+    toxic_messages = Column(Integer, nullable=False, default=0)
+
+
+class StatsSafetyBucket(Base):
+    """Session count per safety-score bucket (0 = 0-9, ..., 9 = 90-100)."""
+    __tablename__ = "stats_safety_buckets"
+
+    bucket = Column(Integer, primary_key=True)
+    sessions = Column(Integer, nullable=False, default=0)
+
 
 # ============================================================
 # HELPERS
 # ============================================================
 
+def dialect_insert(db, table):
+    """INSERT with ON CONFLICT support for the bound dialect (SQLite or PostgreSQL)."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+def intern_names(db, model, names: Iterable[str]) -> Dict[str, int]:
+    """Ids of `names` in a lookup table (AuditSender / AuditLabel), inserting new ones."""
+    names = set(names)
+    if not names:
+        return {}
+    ids = dict(db.execute(select(model.name, model.id).where(model.name.in_(names))).all())
+    missing = names - ids.keys()
+    if missing:
+        # DO NOTHING: a concurrent save may intern the same name first
+        db.execute(dialect_insert(db, model.__table__).on_conflict_do_nothing(), [{"name": n} for n in missing])
+        ids.update(db.execute(select(model.name, model.id).where(model.name.in_(missing))).all())
+    return ids
+
+
+def _base_tokens(raw_text: str) -> List[str]:
+    return [_REPEATED_CHARS_RE.sub(r"\1", _EDGE_PUNCT_RE.sub("", w).lower()) for w in raw_text.split()]
+
+
+def _apply_delta(raw_text: str, delta: str) -> str:
+    tokens = _base_tokens(raw_text)
+    if delta:
+        for part in delta.split(_DELTA_SEP):
+            index, _, token = part.partition(":")
+            tokens[int(index)] = token
+    return " ".join(tokens)
+
+
+def _normalized_delta(raw_text: str, normalized_text: str) -> Optional[str]:
+    """
+    "index:replacement" entries (one per slang replacement) that turn
+    raw_text into normalized_text, or None when no such alignment is found.
+    """
+    base = _base_tokens(raw_text)
+    tokens = normalized_text.split(" ")
+    entries, j = [], 0
+    for i, word in enumerate(base):
+        if j < len(tokens) and tokens[j] == word:
+            j += 1
+            continue
+        # A replacement may span a few words ("makasih" -> "terima kasih"): take
+        # words until the next base token lines up again, else just one
+        if i + 1 == len(base):
+            k = len(tokens)
+        else:
+            span = tokens[j + 1:j + 1 + _DELTA_MAX_WORDS]
+            k = j + 1 + (span.index(base[i + 1]) if base[i + 1] in span else 0)
+        entries.append(f"{i}:{' '.join(tokens[j:k])}")
+        j = k
+    delta = _DELTA_SEP.join(entries)
+    return delta if _apply_delta(raw_text, delta) == normalized_text else None
+
+
+def compact_message_rows(db, rows: List[dict]) -> None:
+    """Rewrite audit_messages rows (dicts with sender/label/raw_text/normalized_text) to the compact layout, in place."""
+    senders = intern_names(db, AuditSender, {r["sender"] for r in rows})
+    labels = intern_names(db, AuditLabel, {r["label"] for r in rows})
+    for r in rows:
+        r["sender_id"], r["sender"] = senders[r["sender"]], ""
+        r["label_id"], r["label"] = labels[r["label"]], ""
+        raw, normalized = r["raw_text"], r["normalized_text"]
+        delta = None if normalized == raw else _normalized_delta(raw, normalized)
+        if normalized == raw:
+            r["normalized_text"], r["flags"] = "", MSG_NORMALIZED_SAME
+        elif delta is not None and len(delta) < len(normalized):
+            r["normalized_text"], r["flags"] = delta, MSG_NORMALIZED_DELTA
+        else:
+            r["flags"] = 0
+
+
+def expand_normalized(raw_text: str, normalized_text: str, flags: int) -> str:
+    """normalized_text of a stored message, rebuilt from raw_text in compact rows."""
+    if flags & MSG_NORMALIZED_SAME:
+        return raw_text
+    if flags & MSG_NORMALIZED_DELTA:
+        return _apply_delta(raw_text, normalized_text)
+    return normalized_text
+
+
+def _add_missing_columns():
+    """
+    Lightweight migration for existing databases: create_all() never alters
+    existing tables, so columns added to the models later are appended here
+    with ALTER TABLE (using their server_default for existing rows).
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+                if column.server_default is not None:
+                    default = column.server_default.arg
+                    default = default if not isinstance(default, str) else f"'{default}'"
+                    ddl += f" NOT NULL DEFAULT {default}" if not column.nullable else f" DEFAULT {default}"
+                logger.info("Migrating database: %s", ddl)
+                conn.execute(text(ddl))
+
+
+# Indexes created by older versions that a newer index now covers
+_OBSOLETE_INDEXES = {
+    "audit_sessions": ["ix_audit_sessions_id"],  # duplicate of the rowid primary key
+    "audit_messages": [
+        "ix_audit_messages_id",                   # duplicate of the rowid primary key
+        "ix_audit_messages_session_id",           # prefix of (session_id, msg_order)
+    ],
+}
+
+
+def _create_missing_indexes():
+    """
+    create_all() skips the indexes of tables that already exist; add them here
+    and drop the ones listed in _OBSOLETE_INDEXES.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+                logger.info("Migrating database: creating index %s (may take a while on large tables)", index.name)
+                index.create(bind=conn, checkfirst=True)
+            for name in _OBSOLETE_INDEXES.get(table.name, []):
+                if name in existing:
+                    logger.info("Migrating database: dropping index %s", name)
+                    conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def _backfill_stats():
+    """Fill freshly created aggregate tables from the sessions already stored."""
+    from app.stats import rebuild_stats  # app.stats imports the models above
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        rebuild_stats(db)
+        db.commit()
+        logger.info("Migrating database: aggregate stats backfilled in %.2fs", time.perf_counter() - started)
+    finally:
+        db.close()
+
+
+def create_search_index(bind=engine) -> bool:
+    """
+    Create the FTS5 table and its delete trigger if missing, replacing an
+    index built by an older layout; True if the table is new (and empty).
+    """
+    with bind.begin() as conn:
+        columns = [row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({SEARCH_TABLE})")]
+        if columns and columns != [SEARCH_COLUMN]:
+            logger.info("Migrating database: rebuilding the search index (columns %s)", columns)
+            conn.exec_driver_sql(f"DROP TABLE {SEARCH_TABLE}")
+        conn.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+            f"USING fts5({SEARCH_COLUMN}, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete AFTER DELETE ON audit_messages "
+            f"BEGIN DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id; END"
+        )
+    return columns != [SEARCH_COLUMN]
+
+
+def _backfill_search():
+    """Index the messages stored before the search table existed or while AUDIT_SEARCH was off."""
+    from app.search import index_new_messages  # app.search imports the models above
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        rows = index_new_messages(db)
+        if rows:
+            logger.info("Migrating database: %d messages indexed for search in %.2fs", rows, time.perf_counter() - started)
+    finally:
+        db.close()
+
+
 def create_db():
-    """Create all tables if they don't exist."""
+    """Create all tables if they don't exist, then migrate older databases."""
+    stats_missing = not inspect(engine).has_table(StatsDaily.__tablename__)
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    _create_missing_indexes()
+    if stats_missing:
+        _backfill_stats()
+    if SEARCH_ENABLED:
+        create_search_index()  # a new or replaced index starts empty and is filled below
+        _backfill_search()
 
 
 def get_db():
@@ -74,3 +519,11 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """FastAPI dependency: yields an AsyncSession (requires DB_ASYNC=1)."""
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database engine is disabled (set DB_ASYNC=1)")
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,19 +1,31 @@
 ﻿# app/main.py
+import asyncio
+import json
 import time
 import os
+import secrets
+import socket
+import threading
+from datetime import date, datetime, timedelta, timezone
+from itertools import islice
 import sys
 import logging
 from contextlib import asynccontextmanager
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Header, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from starlette.requests import Request
+from sqlalchemy import func, insert, literal, select, text, tuple_, update, String
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 # Load environment variables
 load_dotenv()
@@ -26,22 +38,57 @@ logger = logging.getLogger(__name__)
 
 # Windows Asyncio Fix
 if sys.platform == "win32":
-    import asyncio
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
 # Imports (clean — no fragile try/except path hacks)
-from app.services.ocr_service import extract_text_from_image
-from app.services.normalizer import parse_chat_log
+from app.services.ocr_service import (
+    extract_text_from_image,
+    extract_text_from_images,
+    get_ocr_engine,
+    shutdown_ocr,
+    OCR_PROFILES,
+)
+from app.services.normalizer import (
+    parse_chat_log,
+    iter_chat_log,
+    normalize_text,
+    load_slang_dict,
+    lexicon_status,
+    merge_overlapping_lines,
+)
 from app.services.ai_engine import ai_analyzer
-from app.database import create_db, get_db, AuditSession, AuditMessage
+from app.services.lexicon import LexiconSnapshot, lexicon_registry
+from app.database import (
+    create_db,
+    get_db,
+    get_async_db,
+    SessionLocal,
+    AsyncSessionLocal,
+    async_engine,
+    DB_ASYNC,
+    STORAGE_MODE,
+    SEARCH_ENABLED,
+    AuditSession,
+    AuditMessage,
+    AuditSender,
+    AuditLabel,
+    compact_message_rows,
+    expand_normalized,
+)
+from app.maintenance import run_maintenance, start_scheduler, stop_scheduler
+from app.search import index_messages, match_expression, search_index_active, search_messages
+from app.stats import rebuild_stats, record_session, stats_summary, unrecord_sessions
+from app.worker_pool import BoundedWorkerPool, PoolSaturatedError
 from app.schemas import (
     TextAuditRequest,
+    AuditJobRequest,
+    AuditJobStatus,
     AuditResponse,
     AuditMeta,
-    MessageResult,
-    AnalysisResult,
     HistorySession,
     HistoryDetail,
+    StatsResponse,
+    SearchHit,
 )
 
 # ============================================================
@@ -49,16 +96,87 @@ from app.schemas import (
 # ============================================================
 limiter = Limiter(key_func=get_remote_address, default_limits=["60/minute"])
 
+# ============================================================
+# CPU WORKER POOL (OCR / parsing / inference off the event loop)
+# ============================================================
+cpu_pool = BoundedWorkerPool.from_env()
+RETRY_AFTER_SECONDS = int(os.getenv("AUDIT_RETRY_AFTER", "5"))
+
+# Background audit jobs get their own small pool so big exports can't starve
+# interactive requests; progress is committed every JOB_CHUNK_SIZE messages.
+job_pool = BoundedWorkerPool(
+    max_workers=int(os.getenv("AUDIT_JOB_WORKERS", "1")),
+    max_queue=int(os.getenv("AUDIT_JOB_QUEUE_DEPTH", "32")),
+    name="audit-job",
+)
+JOB_CHUNK_SIZE = int(os.getenv("AUDIT_JOB_CHUNK_SIZE", "256"))
+# Every process stamps the jobs it accepts with WORKER_ID and refreshes their
+# heartbeat; jobs whose owner has exited, or whose heartbeat is older than
+# JOB_STALE_SECONDS, are marked failed by the other (or the restarted) processes.
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+JOB_HEARTBEAT_SECONDS = float(os.getenv("AUDIT_JOB_HEARTBEAT_SECONDS", "30"))
+JOB_STALE_SECONDS = float(os.getenv("AUDIT_JOB_STALE_SECONDS", "120"))
+UNFINISHED_JOB_STATES = ("queued", "running", "saving")
+
+# Messages parsed + analyzed per step of /api/audit/text/stream
+STREAM_CHUNK_SIZE = int(os.getenv("AUDIT_STREAM_CHUNK_SIZE", "16"))
+
+# Audit persistence: "sync" writes messages before responding, "background"
+# responds first and writes them afterwards (retrying while SQLite is locked)
+DB_WRITE_MODE = os.getenv("AUDIT_DB_WRITE", "sync").strip().lower()
+DB_WRITE_RETRIES = int(os.getenv("AUDIT_DB_WRITE_RETRIES", "3"))
+DB_WRITE_RETRY_DELAY = float(os.getenv("AUDIT_DB_WRITE_RETRY_DELAY", "0.25"))
+
+# Screenshots accepted per /api/audit/upload/batch request
+BATCH_MAX_IMAGES = int(os.getenv("AUDIT_BATCH_MAX_IMAGES", "20"))
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+
+# Bearer token for /api/admin/* (admin endpoints are disabled while unset)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
 # ============================================================
 # LIFESPAN (replaces deprecated @app.on_event)
 # ============================================================
+
+# Load lexicon + model at startup instead of inside the first request
+EAGER_MODEL_LOAD = os.getenv("EAGER_MODEL_LOAD", "0").strip().lower() in {"1", "true", "yes"}
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting up — creating database tables...")
     create_db()
     logger.info("Database ready.")
+    _check_jobs()
+    start_job_monitor()
+    try:
+        lexicon_registry.current()
+    except Exception:
+        logger.exception("Lexicons failed to load at startup")
+    lexicon_registry.start_watching()
+    start_scheduler()
+    try:
+        get_ocr_engine()  # detects the OCR language once
+    except Exception:
+        logger.exception("OCR engine failed to initialise; image audits will fail")
+    if EAGER_MODEL_LOAD:
+        logger.info("Warming up slang lexicon and sentiment model...")
+        try:
+            load_slang_dict()
+        except Exception:
+            logger.exception("Slang lexicon failed to load at startup")
+        if not ai_analyzer.warm_up():
+            logger.error("Sentiment model is not ready; /api/ready will report 503.")
     yield
     logger.info("Shutting down.")
+    lexicon_registry.stop_watching()
+    stop_scheduler()
+    stop_job_monitor()
+    cpu_pool.shutdown()
+    job_pool.shutdown()
+    shutdown_ocr()
+    if async_engine is not None:
+        await async_engine.dispose()
 
 # ============================================================
 # APP SETUP
@@ -80,6 +198,7 @@ app.add_middleware(
     allow_origins=ALLOWED_ORIGINS,
     allow_methods=["GET", "POST"],
     allow_headers=["Content-Type", "Authorization"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 
@@ -87,16 +206,24 @@ app.add_middleware(
 # SHARED HELPER — DRY: single analysis loop
 # ============================================================
 
-def _process_messages(chats: List[dict]) -> tuple[List[dict], int]:
+def _process_messages(
+    chats: List[dict],
+    mode: str = "full",
+    lexicon: Optional[LexiconSnapshot] = None,
+) -> tuple[List[dict], int]:
     """
     Run AI analysis on a list of parsed chat messages.
+    mode="rules" skips the sentiment model (toxicity only).
     Returns (result_data, toxic_count).
     """
     result_data = []
     toxic_count = 0
 
-    for c in chats:
-        ai = ai_analyzer.analyze(c.get("normalized_text", ""))
+    analyses = ai_analyzer.analyze_batch(
+        [c.get("normalized_text", "") for c in chats], mode=mode, lexicon=lexicon
+    )
+
+    for c, ai in zip(chats, analyses):
         row = {**c, "analysis": ai}
         if ai.get("is_toxic"):
             toxic_count += 1
@@ -105,46 +232,171 @@ def _process_messages(chats: List[dict]) -> tuple[List[dict], int]:
     return result_data, toxic_count
 
 
+async def _run_cpu_bound(fn, *args, **kwargs):
+    """Run a blocking stage in cpu_pool; 503 + Retry-After when the pool is full."""
+    try:
+        return await cpu_pool.run(fn, *args, **kwargs)
+    except PoolSaturatedError:
+        logger.warning("Worker pool saturated, rejecting request (%s)", cpu_pool.stats())
+        raise HTTPException(
+            status_code=503,
+            detail="Server sedang sibuk. Silakan coba lagi beberapa saat lagi.",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+        )
+
+
+async def _active_lexicon() -> LexiconSnapshot:
+    """Lexicon snapshot for one request (first load runs in cpu_pool, not on the event loop)."""
+    return lexicon_registry.peek() or await _run_cpu_bound(lexicon_registry.current)
+
+
+def _check_ocr_profile(ocr_profile: Optional[str]) -> None:
+    if ocr_profile is not None and ocr_profile not in OCR_PROFILES:
+        raise HTTPException(status_code=400, detail=f"Profil OCR harus salah satu dari: {', '.join(OCR_PROFILES)}")
+
+
+def _check_image_upload(file: UploadFile) -> None:
+    if not file.content_type or not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="File harus berupa gambar valid (JPG/PNG)")
+
+    if file.size and file.size > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=400, detail="Ukuran file maksimal 5MB")
+
+
+# Request-scoped session: AsyncSession (aiosqlite) with DB_ASYNC=1, else a sync Session
+DB_DEPENDENCY = get_async_db if DB_ASYNC else get_db
+
+
+async def _run_db(db, fn, *args, **kwargs):
+    """
+    Run sync ORM code `fn(session, *args, **kwargs)` without blocking the event loop:
+    on the AsyncSession's connection via run_sync, or in the threadpool for a sync Session.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+def _insert_messages(db: Session, session_id: int, result_data: List[dict]) -> None:
+    """Insert all messages of a session with one executemany (no ORM objects)."""
+    if not result_data:
+        return
+    rows = []
+    for item in result_data:
+        analysis = item.get("analysis", {})
+        rows.append({
+            "session_id": session_id,
+            "msg_order": item.get("id", 0),
+            "sender": item.get("sender", ""),
+            "timestamp": item.get("timestamp", ""),
+            "raw_text": item.get("raw_text", ""),
+            "normalized_text": item.get("normalized_text", ""),
+            "label": analysis.get("label", "neutral"),
+            "score": analysis.get("score", 0.0),
+            "is_toxic": analysis.get("is_toxic", False),
+        })
+    normalized_texts = [r["normalized_text"] for r in rows]  # before compaction turns them into deltas
+    if STORAGE_MODE == "compact":
+        compact_message_rows(db, rows)
+    if not search_index_active(db):
+        db.execute(insert(AuditMessage.__table__), rows)
+        return
+    table = AuditMessage.__table__
+    ids = db.execute(insert(table).returning(table.c.id, sort_by_parameter_order=True), rows).scalars().all()
+    index_messages(db, ids, normalized_texts)
+
+
+def _write_messages_in_background(session_id: int, result_data: List[dict]) -> None:
+    """Background half of _save_to_db: insert messages and mark the session done, with retry."""
+    started = time.perf_counter()
+    for attempt in range(1, DB_WRITE_RETRIES + 1):
+        db = SessionLocal()
+        try:
+            _insert_messages(db, session_id, result_data)
+            db.get(AuditSession, session_id).status = "done"
+            record_session(db, session_id)
+            db.commit()
+            logger.info("Saved audit #%d in background: %d messages in %.1f ms (attempt %d)",
+                        session_id, len(result_data), (time.perf_counter() - started) * 1000, attempt)
+            return
+        except OperationalError as e:
+            db.rollback()
+            if attempt == DB_WRITE_RETRIES:
+                logger.error("Giving up saving audit #%d after %d attempts: %s", session_id, attempt, e)
+                break
+            time.sleep(DB_WRITE_RETRY_DELAY * 2 ** (attempt - 1))
+        except Exception:
+            db.rollback()
+            logger.exception("Failed to save audit #%d", session_id)
+            break
+        finally:
+            db.close()
+
+    db = SessionLocal()
+    try:
+        session = db.get(AuditSession, session_id)
+        if session is not None:
+            session.status = "failed"
+            session.error = "Gagal menyimpan hasil audit."
+            db.commit()
+    finally:
+        db.close()
+
+
 def _save_to_db(
     db: Session,
     source: str,
     result_data: List[dict],
     toxic_count: int,
     processing_time: float,
+    session: Optional[AuditSession] = None,
+    lexicon_version: Optional[str] = None,
+    background: Optional[BackgroundTasks] = None,
 ) -> int:
-    """Persist audit results to database, return session_id."""
+    """
+    Persist audit results to database, return session_id.
+    Pass `session` to complete an existing (job) session instead of creating one.
+    With AUDIT_DB_WRITE=background and `background` given, only the session row
+    is written now (status "saving"); messages are inserted after the response.
+    """
+    started = time.perf_counter()
     total = len(result_data)
     safety_score = int(100 - ((toxic_count / total) * 100)) if total > 0 else 100
 
-    session = AuditSession(
-        source=source,
-        total_messages=total,
-        toxic_messages=toxic_count,
-        safety_score=safety_score,
-        processing_time_seconds=round(processing_time, 2),
-    )
-    db.add(session)
-    db.flush()  # get session.id
+    if session is None:
+        session = AuditSession(source=source)
+        db.add(session)
+    session.total_messages = total
+    session.processed_messages = total
+    session.toxic_messages = toxic_count
+    session.safety_score = safety_score
+    session.processing_time_seconds = round(processing_time, 2)
+    session.lexicon_version = lexicon_version
 
-    for item in result_data:
-        analysis = item.get("analysis", {})
-        db.add(AuditMessage(
-            session_id=session.id,
-            msg_order=item.get("id", 0),
-            sender=item.get("sender", ""),
-            timestamp=item.get("timestamp", ""),
-            raw_text=item.get("raw_text", ""),
-            normalized_text=item.get("normalized_text", ""),
-            label=analysis.get("label", "neutral"),
-            score=analysis.get("score", 0.0),
-            is_toxic=analysis.get("is_toxic", False),
-        ))
+    if background is not None and DB_WRITE_MODE == "background":
+        session.status = "saving"
+        session.owner = WORKER_ID
+        db.commit()
+        background.add_task(_write_messages_in_background, session.id, result_data)
+        return session.id
 
+    session.status = "done"
+    db.flush()  # get session.id
+    _insert_messages(db, session.id, result_data)
+    record_session(db, session.id)
     db.commit()
+    logger.info("Saved audit #%d: %d messages in %.1f ms",
+                session.id, total, (time.perf_counter() - started) * 1000)
     return session.id
 
 
-def _build_response(result_data: List[dict], toxic_count: int, processing_time: float, session_id: int) -> dict:
+def _build_response(
+    result_data: List[dict],
+    toxic_count: int,
+    processing_time: float,
+    session_id: int,
+    ocr_report: Optional[dict] = None,
+) -> dict:
     total = len(result_data)
     safety_score = int(100 - ((toxic_count / total) * 100)) if total > 0 else 100
     return {
@@ -154,11 +406,296 @@ def _build_response(result_data: List[dict], toxic_count: int, processing_time:
             "safety_score": safety_score,
             "processing_time_seconds": round(processing_time, 2),
             "session_id": session_id,
+            "ocr": ocr_report,
         },
         "data": result_data,
     }
 
 
+# Columns needed to rebuild a MessageResult (no ORM objects, no unused columns)
+# Works for plain and compact rows (interned names win over the inline column)
+_MESSAGE_COLUMNS = (
+    AuditMessage.msg_order,
+    AuditMessage.timestamp,
+    func.coalesce(AuditSender.name, AuditMessage.sender),
+    AuditMessage.raw_text,
+    AuditMessage.normalized_text,
+    func.coalesce(AuditLabel.name, AuditMessage.label),
+    AuditMessage.score,
+    AuditMessage.is_toxic,
+    AuditMessage.flags,
+)
+
+
+def _load_messages(
+    db: Session,
+    session_id: int,
+    after: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> List[dict]:
+    """
+    Messages of a session as MessageResult-shaped dicts, in conversation order.
+    One query on the (session_id, msg_order) index; `after` (a msg_order) and
+    `limit` page through very large sessions.
+    """
+    query = (
+        select(*_MESSAGE_COLUMNS)
+        .outerjoin(AuditSender, AuditMessage.sender_id == AuditSender.id)
+        .outerjoin(AuditLabel, AuditMessage.label_id == AuditLabel.id)
+        .where(AuditMessage.session_id == session_id)
+    )
+    if after is not None:
+        query = query.where(AuditMessage.msg_order > after)
+    query = query.order_by(AuditMessage.msg_order)
+    if limit is not None:
+        query = query.limit(limit)
+
+    return [
+        {
+            "id": msg_order,
+            "timestamp": timestamp,
+            "sender": sender,
+            "raw_text": raw_text,
+            "normalized_text": expand_normalized(raw_text, normalized_text, flags),
+            "analysis": {"label": label, "score": score, "is_toxic": is_toxic},
+        }
+        for msg_order, timestamp, sender, raw_text, normalized_text, label, score, is_toxic, flags
+        in db.execute(query)
+    ]
+
+
+# ============================================================
+# BACKGROUND AUDIT JOBS
+# ============================================================
+
+def _run_audit_job(session_id: int, text: str, mode: str) -> None:
+    """Worker body for /api/jobs: parse, analyze in chunks (committing progress), save."""
+    start = time.time()
+    db = SessionLocal()
+    try:
+        session = db.get(AuditSession, session_id)
+        if session is None or session.status != "queued":
+            return  # deleted, or already failed by _fail_interrupted_jobs
+        session.status = "running"
+        db.commit()
+
+        lexicon = lexicon_registry.current()
+        chats = parse_chat_log(text, lexicon)
+        if not chats:
+            raise ValueError("Tidak dapat mem-parsing format chat dari teks yang diberikan.")
+        session.total_messages = len(chats)
+        db.commit()
+
+        result_data: List[dict] = []
+        toxic_count = 0
+        for offset in range(0, len(chats), JOB_CHUNK_SIZE):
+            part, toxic = _process_messages(chats[offset:offset + JOB_CHUNK_SIZE], mode=mode, lexicon=lexicon)
+            result_data.extend(part)
+            toxic_count += toxic
+            session.processed_messages = len(result_data)
+            db.commit()
+            if session.status != "running":  # reloaded by the commit
+                logger.warning("Audit job #%d was marked %s meanwhile; dropping it", session_id, session.status)
+                return
+
+        _save_to_db(
+            db, session.source, result_data, toxic_count, time.time() - start,
+            session=session, lexicon_version=lexicon.version,
+        )
+        logger.info("Audit job #%d done (%d messages)", session_id, len(result_data))
+
+    except Exception as e:
+        logger.exception("Audit job #%d failed", session_id)
+        db.rollback()
+        session = db.get(AuditSession, session_id)
+        if session is not None:
+            session.status = "failed"
+            session.error = str(e) if isinstance(e, ValueError) else "Terjadi kesalahan saat menganalisis teks."
+            db.commit()
+    finally:
+        db.close()
+
+
+def _owner_gone(owner: Optional[str]) -> bool:
+    """True if `owner` (a WORKER_ID) is known to have exited: a dead pid on this host, or our own earlier run."""
+    try:
+        host, pid, boot = owner.rsplit(":", 2)
+        pid = int(pid)
+    except (AttributeError, ValueError):
+        return False  # unknown owner: only the heartbeat can tell
+    if host != socket.gethostname():
+        return False
+    if pid == os.getpid():
+        return owner != WORKER_ID  # same pid after a restart (e.g. pid 1 in a container)
+    if os.name == "nt":
+        return False  # os.kill(pid, 0) would terminate the process on Windows
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass  # exists, owned by another user
+    return False
+
+
+def _fail_interrupted_jobs(db: Session, stale_seconds: float = JOB_STALE_SECONDS) -> int:
+    """
+    Mark unfinished jobs of other processes as failed when their owner has
+    exited or their heartbeat is older than `stale_seconds`, so pollers get
+    an answer; the job text is not stored, so they cannot be requeued.
+    Returns the number of jobs marked.
+    """
+    # created_at/updated_at are stored by SQLite as naive UTC
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=stale_seconds)
+    heartbeat = func.coalesce(AuditSession.updated_at, AuditSession.created_at)
+    rows = db.execute(
+        select(AuditSession.id, AuditSession.owner, heartbeat <= cutoff)
+        .where(
+            AuditSession.status.in_(UNFINISHED_JOB_STATES),
+            func.coalesce(AuditSession.owner, "") != WORKER_ID,
+        )
+    ).all()
+    ids = [job_id for job_id, owner, expired in rows if expired or _owner_gone(owner)]
+    if not ids:
+        return 0
+    result = db.execute(
+        update(AuditSession)
+        .where(AuditSession.id.in_(ids), AuditSession.status.in_(UNFINISHED_JOB_STATES))
+        .values(status="failed", error="Audit terhenti karena server dimulai ulang. Silakan kirim ulang.")
+    )
+    db.commit()
+    return result.rowcount
+
+
+def _touch_own_jobs(db: Session) -> None:
+    """Heartbeat for every unfinished job of this process, including ones still waiting in the queue."""
+    db.execute(
+        update(AuditSession)
+        .where(AuditSession.owner == WORKER_ID, AuditSession.status.in_(UNFINISHED_JOB_STATES))
+        .values(updated_at=func.now())
+    )
+    db.commit()
+
+
+def _check_jobs() -> None:
+    db = SessionLocal()
+    try:
+        _touch_own_jobs(db)
+        interrupted = _fail_interrupted_jobs(db)
+    finally:
+        db.close()
+    if interrupted:
+        logger.warning("Marked %d interrupted audit job(s) as failed", interrupted)
+
+
+_job_monitor_stop = threading.Event()
+_job_monitor: Optional[threading.Thread] = None
+
+
+def start_job_monitor(interval: float = JOB_HEARTBEAT_SECONDS) -> None:
+    """Run _check_jobs() every `interval` seconds in a daemon thread (0 disables)."""
+    global _job_monitor
+    if interval <= 0 or (_job_monitor is not None and _job_monitor.is_alive()):
+        return
+    _job_monitor_stop.clear()
+
+    def loop():
+        while not _job_monitor_stop.wait(interval):
+            try:
+                _check_jobs()
+            except Exception:
+                logger.exception("Audit job heartbeat failed")
+
+    _job_monitor = threading.Thread(target=loop, name="audit-job-monitor", daemon=True)
+    _job_monitor.start()
+
+
+def stop_job_monitor() -> None:
+    _job_monitor_stop.set()
+
+
+def _job_status(session: AuditSession) -> AuditJobStatus:
+    return AuditJobStatus(
+        job_id=session.id,
+        status=session.status,
+        processed_messages=session.processed_messages,
+        total_messages=session.total_messages,
+        error=session.error,
+    )
+
+
+# ============================================================
+# STREAMING TEXT AUDIT
+# ============================================================
+
+def _take(iterator, n: int) -> List[dict]:
+    return list(islice(iterator, n))
+
+
+def _ndjson(record_type: str, data) -> bytes:
+    return (json.dumps({"type": record_type, "data": data}, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def _save_stream_result(result_data: List[dict], toxic_count: int, elapsed: float, lexicon_version: str) -> int:
+    # The stream outlives the request's dependencies, so it opens its own session
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            return await db.run_sync(
+                _save_to_db, "text", result_data, toxic_count, elapsed, lexicon_version=lexicon_version
+            )
+
+    def save() -> int:
+        db = SessionLocal()
+        try:
+            return _save_to_db(db, "text", result_data, toxic_count, elapsed, lexicon_version=lexicon_version)
+        finally:
+            db.close()
+
+    return await run_in_threadpool(save)
+
+
+async def _stream_text_audit(
+    chats_iter,
+    first_chunk: List[dict],
+    mode: str,
+    lexicon: LexiconSnapshot,
+    start: float,
+):
+    """
+    Yield one NDJSON "message" record per analyzed message, then a final "meta"
+    record. The next chunk is parsed while the current one is being analyzed.
+    Failures after the stream has started are reported as an "error" record.
+    """
+    result_data: List[dict] = []
+    toxic_count = 0
+    chunk = first_chunk
+    next_chunk = None
+
+    try:
+        while chunk:
+            next_chunk = asyncio.ensure_future(_run_cpu_bound(_take, chats_iter, STREAM_CHUNK_SIZE))
+            part, toxic = await _run_cpu_bound(_process_messages, chunk, mode=mode, lexicon=lexicon)
+            toxic_count += toxic
+            for row in part:
+                result_data.append(row)
+                yield _ndjson("message", row)
+            chunk = await next_chunk
+            next_chunk = None
+
+        elapsed = time.time() - start
+        session_id = await _save_stream_result(result_data, toxic_count, elapsed, lexicon.version)
+        yield _ndjson("meta", _build_response(result_data, toxic_count, elapsed, session_id)["meta"])
+
+    except HTTPException as e:
+        yield _ndjson("error", {"status_code": e.status_code, "detail": e.detail})
+    except Exception:
+        logger.exception("Error streaming text audit")
+        yield _ndjson("error", {"status_code": 500, "detail": "Terjadi kesalahan saat menganalisis teks. Silakan coba lagi."})
+    finally:
+        if next_chunk is not None:
+            next_chunk.cancel()
+
+
 # ============================================================
 # ENDPOINTS
 # ============================================================
@@ -173,37 +710,52 @@ def health_check():
     return {"status": "ok", "message": "Backend is running"}
 
 
+@app.get("/api/ready")
+def readiness_check():
+    """Readiness probe: 200 only once the model and slang lexicon are loaded."""
+    model = ai_analyzer.status()
+    lexicon = lexicon_status()
+    ready = model["loaded"] and lexicon["loaded"]
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "model": model, "lexicon": lexicon},
+    )
+
+
 @app.post("/api/audit/upload", response_model=AuditResponse)
 @limiter.limit("10/minute")
 async def audit_image(
     request: Request,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    ocr_profile: Optional[str] = None,
+    db=Depends(DB_DEPENDENCY),
 ):
     start = time.time()
-
-    if not file.content_type or not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="File harus berupa gambar valid (JPG/PNG)")
-
-    if file.size and file.size > 5 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="Ukuran file maksimal 5MB")
+    _check_ocr_profile(ocr_profile)
+    _check_image_upload(file)
 
     try:
         content = await file.read()
-        raw_text = extract_text_from_image(content)
+        ocr_report: dict = {}
+        raw_text = await _run_cpu_bound(extract_text_from_image, content, profile=ocr_profile, report=ocr_report)
 
         if not raw_text.strip():
             raise HTTPException(status_code=400, detail="Tidak ada teks terbaca pada gambar. Coba gambar yang lebih jelas.")
 
-        chats = parse_chat_log(raw_text)
+        lexicon = await _active_lexicon()
+        chats = await _run_cpu_bound(parse_chat_log, raw_text, lexicon)
         if not chats:
             raise HTTPException(status_code=422, detail="Tidak dapat mem-parsing format chat. Pastikan gambar berisi percakapan.")
 
-        result_data, toxic_count = _process_messages(chats)
+        result_data, toxic_count = await _run_cpu_bound(_process_messages, chats, lexicon=lexicon)
         elapsed = time.time() - start
-        session_id = _save_to_db(db, "image", result_data, toxic_count, elapsed)
+        session_id = await _run_db(
+            db, _save_to_db, "image", result_data, toxic_count, elapsed,
+            lexicon_version=lexicon.version, background=background_tasks,
+        )
 
-        return _build_response(result_data, toxic_count, elapsed, session_id)
+        return _build_response(result_data, toxic_count, elapsed, session_id, ocr_report=ocr_report)
 
     except HTTPException:
         raise
@@ -212,23 +764,81 @@ async def audit_image(
         raise HTTPException(status_code=500, detail="Terjadi kesalahan saat memproses gambar. Silakan coba lagi.")
 
 
+@app.post("/api/audit/upload/batch", response_model=AuditResponse)
+@limiter.limit("10/minute")
+async def audit_image_batch(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    ocr_profile: Optional[str] = None,
+    db=Depends(DB_DEPENDENCY),
+):
+    """
+    Audit one conversation sent as several consecutive screenshots (in order).
+    Images are OCR'd concurrently, lines repeated where screenshots overlap are
+    dropped, and the merged conversation is saved as a single audit session.
+    """
+    start = time.time()
+    _check_ocr_profile(ocr_profile)
+    if len(files) > BATCH_MAX_IMAGES:
+        raise HTTPException(status_code=400, detail=f"Maksimal {BATCH_MAX_IMAGES} gambar per permintaan")
+    for file in files:
+        _check_image_upload(file)
+
+    try:
+        contents = [await file.read() for file in files]
+        image_reports: List[dict] = []
+        texts = await _run_cpu_bound(extract_text_from_images, contents, profile=ocr_profile, reports=image_reports)
+
+        if not any(t.strip() for t in texts):
+            raise HTTPException(status_code=400, detail="Tidak ada teks terbaca pada gambar. Coba gambar yang lebih jelas.")
+
+        raw_text, overlap_lines = merge_overlapping_lines(texts)
+
+        lexicon = await _active_lexicon()
+        chats = await _run_cpu_bound(parse_chat_log, raw_text, lexicon)
+        if not chats:
+            raise HTTPException(status_code=422, detail="Tidak dapat mem-parsing format chat. Pastikan gambar berisi percakapan.")
+
+        result_data, toxic_count = await _run_cpu_bound(_process_messages, chats, lexicon=lexicon)
+        elapsed = time.time() - start
+        session_id = await _run_db(
+            db, _save_to_db, "image", result_data, toxic_count, elapsed,
+            lexicon_version=lexicon.version, background=background_tasks,
+        )
+
+        ocr_report = {"images": len(files), "overlap_lines_removed": overlap_lines, "per_image": image_reports}
+        return _build_response(result_data, toxic_count, elapsed, session_id, ocr_report=ocr_report)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error processing batch image upload")
+        raise HTTPException(status_code=500, detail="Terjadi kesalahan saat memproses gambar. Silakan coba lagi.")
+
+
 @app.post("/api/audit/text", response_model=AuditResponse)
 @limiter.limit("30/minute")
 async def audit_text(
     request: Request,
+    background_tasks: BackgroundTasks,
     payload: TextAuditRequest,
-    db: Session = Depends(get_db),
+    db=Depends(DB_DEPENDENCY),
 ):
     start = time.time()
 
     try:
-        chats = parse_chat_log(payload.text)
+        lexicon = await _active_lexicon()
+        chats = await _run_cpu_bound(parse_chat_log, payload.text, lexicon)
         if not chats:
             raise HTTPException(status_code=422, detail="Tidak dapat mem-parsing format chat dari teks yang diberikan.")
 
-        result_data, toxic_count = _process_messages(chats)
+        result_data, toxic_count = await _run_cpu_bound(_process_messages, chats, mode=payload.mode, lexicon=lexicon)
         elapsed = time.time() - start
-        session_id = _save_to_db(db, "text", result_data, toxic_count, elapsed)
+        session_id = await _run_db(
+            db, _save_to_db, "text", result_data, toxic_count, elapsed,
+            lexicon_version=lexicon.version, background=background_tasks,
+        )
 
         return _build_response(result_data, toxic_count, elapsed, session_id)
 
@@ -239,59 +849,201 @@ async def audit_text(
         raise HTTPException(status_code=500, detail="Terjadi kesalahan saat menganalisis teks. Silakan coba lagi.")
 
 
+@app.post("/api/audit/text/stream")
+@limiter.limit("30/minute")
+async def audit_text_stream(
+    request: Request,
+    payload: TextAuditRequest,
+):
+    """
+    Streaming variant of /api/audit/text (NDJSON, one JSON object per line):
+    {"type": "message", "data": MessageResult} for each message as soon as it is analyzed,
+    then {"type": "meta", "data": AuditMeta} (or {"type": "error", ...}).
+    """
+    start = time.time()
+    lexicon = await _active_lexicon()
+    chats_iter = iter_chat_log(payload.text, lexicon)
+
+    # Parse the first chunk up front so "nothing to parse" / "busy" still map to HTTP status codes
+    first_chunk = await _run_cpu_bound(_take, chats_iter, STREAM_CHUNK_SIZE)
+    if not first_chunk:
+        raise HTTPException(status_code=422, detail="Tidak dapat mem-parsing format chat dari teks yang diberikan.")
+
+    return StreamingResponse(
+        _stream_text_audit(chats_iter, first_chunk, payload.mode, lexicon, start),
+        media_type="application/x-ndjson",
+    )
+
+
+@app.post("/api/jobs/text", response_model=AuditJobStatus, status_code=202)
+@limiter.limit("10/minute")
+def submit_text_job(
+    request: Request,
+    payload: AuditJobRequest,
+    db: Session = Depends(get_db),
+):
+    """Queue a (large) chat log for background analysis; poll /api/jobs/{job_id}."""
+    session = AuditSession(
+        source="text",
+        status="queued",
+        owner=WORKER_ID,
+        total_messages=0,
+        toxic_messages=0,
+        safety_score=100,
+        processing_time_seconds=0.0,
+    )
+    db.add(session)
+    db.commit()
+
+    try:
+        job_pool.submit(_run_audit_job, session.id, payload.text, payload.mode)
+    except PoolSaturatedError:
+        db.delete(session)
+        db.commit()
+        raise HTTPException(
+            status_code=503,
+            detail="Antrian audit sedang penuh. Silakan coba lagi beberapa saat lagi.",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+        )
+
+    return _job_status(session)
+
+
+@app.get("/api/jobs/{job_id}", response_model=AuditJobStatus)
+@limiter.limit("120/minute")
+def get_job_status(
+    request: Request,
+    job_id: int,
+    db: Session = Depends(get_db),
+):
+    """Job state and progress (processed_messages / total_messages)."""
+    session = db.get(AuditSession, job_id)
+    if not session:
+        raise HTTPException(status_code=404, detail=f"Job audit #{job_id} tidak ditemukan.")
+    return _job_status(session)
+
+
+@app.get("/api/jobs/{job_id}/result", response_model=AuditResponse)
+@limiter.limit("60/minute")
+def get_job_result(
+    request: Request,
+    job_id: int,
+    db: Session = Depends(get_db),
+):
+    """Full audit result of a finished job (409 while it is still queued/running or failed)."""
+    session = db.get(AuditSession, job_id)
+    if not session:
+        raise HTTPException(status_code=404, detail=f"Job audit #{job_id} tidak ditemukan.")
+    if session.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job audit #{job_id} berstatus '{session.status}'.")
+
+    return {
+        "meta": {
+            "total_messages": session.total_messages,
+            "toxic_messages": session.toxic_messages,
+            "safety_score": session.safety_score,
+            "processing_time_seconds": session.processing_time_seconds,
+            "session_id": session.id,
+        },
+        "data": _load_messages(db, session.id),
+    }
+
+
 @app.get("/api/history", response_model=List[HistorySession])
 @limiter.limit("60/minute")
-def get_history(
+async def get_history(
     request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 20,
-    db: Session = Depends(get_db),
+    cursor: Optional[int] = None,
+    db=Depends(DB_DEPENDENCY),
 ):
-    """Return list of past audit sessions, newest first."""
-    sessions = (
+    """
+    Return list of past audit sessions, newest first.
+    Pagination: pass the X-Next-Cursor header of a page as `cursor` to get the
+    next one (keyset, constant cost at any depth); `skip` still works but
+    scans every skipped row.
+    """
+    if cursor is not None and skip:
+        raise HTTPException(status_code=400, detail="Gunakan salah satu: cursor atau skip.")
+    limit = max(1, min(limit, 100))
+
+    sessions = await _run_db(db, _history_page, skip, limit, cursor)
+    if len(sessions) == limit:
+        response.headers["X-Next-Cursor"] = str(sessions[-1].id)
+    return sessions
+
+
+def _history_page(db: Session, skip: int, limit: int, cursor: Optional[int]) -> List[AuditSession]:
+    query = (
         db.query(AuditSession)
-        .order_by(AuditSession.created_at.desc())
-        .offset(skip)
-        .limit(min(limit, 100))
-        .all()
+        .filter(AuditSession.status == "done")
+        .order_by(AuditSession.created_at.desc(), AuditSession.id.desc())
     )
-    return sessions
+    if cursor is not None:
+        # Compare against the stored created_at text itself: re-binding it as a
+        # datetime would not match SQLite's CURRENT_TIMESTAMP format on ties.
+        anchor = db.execute(
+            text("SELECT created_at FROM audit_sessions WHERE id = :id"), {"id": cursor}
+        ).scalar()
+        if anchor is not None:
+            query = query.filter(
+                tuple_(AuditSession.created_at, AuditSession.id) < tuple_(literal(anchor, String), literal(cursor))
+            )
+        else:
+            # Cursor session was deleted meanwhile; ids follow insertion order
+            query = query.filter(AuditSession.id < cursor)
+    else:
+        query = query.offset(skip)
+    return query.limit(limit).all()
 
 
 @app.get("/api/history/{session_id}", response_model=HistoryDetail)
 @limiter.limit("60/minute")
-def get_history_detail(
+async def get_history_detail(
     request: Request,
+    response: Response,
     session_id: int,
-    db: Session = Depends(get_db),
+    after: Optional[int] = None,
+    limit: Optional[int] = None,
+    db=Depends(DB_DEPENDENCY),
 ):
-    """Return full detail of a specific audit session including all messages."""
-    session = db.query(AuditSession).filter(AuditSession.id == session_id).first()
-    if not session:
+    """
+    Return full detail of a specific audit session including all messages.
+    Large sessions can be paged: `limit` messages per page, then pass the
+    X-Next-Cursor header (last message id) as `after` for the next page.
+    """
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit minimal 1.")
+    if limit is not None:
+        limit = min(limit, 100)
+
+    content = await _run_db(db, _history_detail, session_id, after, limit)
+    if content is None:
         raise HTTPException(status_code=404, detail=f"Sesi audit #{session_id} tidak ditemukan.")
 
-    messages = [
-        MessageResult(
-            id=m.msg_order,
-            timestamp=m.timestamp,
-            sender=m.sender,
-            raw_text=m.raw_text,
-            normalized_text=m.normalized_text,
-            analysis=AnalysisResult(label=m.label, score=m.score, is_toxic=m.is_toxic),
-        )
-        for m in sorted(session.messages, key=lambda x: x.msg_order)
-    ]
+    messages = content["messages"]
+    if limit is not None and len(messages) == limit:
+        response.headers["X-Next-Cursor"] = str(messages[-1]["id"])
+    return content
 
-    return HistoryDetail(
-        id=session.id,
-        source=session.source,
-        created_at=session.created_at,
-        total_messages=session.total_messages,
-        toxic_messages=session.toxic_messages,
-        safety_score=session.safety_score,
-        processing_time_seconds=session.processing_time_seconds,
-        messages=messages,
-    )
+
+def _history_detail(db: Session, session_id: int, after: Optional[int], limit: Optional[int]) -> Optional[dict]:
+    session = db.get(AuditSession, session_id)
+    if not session:
+        return None
+    return {
+        "id": session.id,
+        "source": session.source,
+        "created_at": session.created_at.isoformat() if session.created_at else None,
+        "total_messages": session.total_messages,
+        "toxic_messages": session.toxic_messages,
+        "safety_score": session.safety_score,
+        "processing_time_seconds": session.processing_time_seconds,
+        "lexicon_version": session.lexicon_version,
+        "messages": _load_messages(db, session_id, after=after, limit=limit),
+    }
 
 
 @app.delete("/api/history/{session_id}", status_code=204)
@@ -305,5 +1057,125 @@ def delete_history(
     session = db.query(AuditSession).filter(AuditSession.id == session_id).first()
     if not session:
         raise HTTPException(status_code=404, detail=f"Sesi audit #{session_id} tidak ditemukan.")
+    if session.status == "done":
+        unrecord_sessions(db, [session.id])
     db.delete(session)
-    db.commit()
\ No newline at end of file
+    db.commit()
+
+
+# ============================================================
+# STATS
+# ============================================================
+
+@app.get("/api/stats", response_model=StatsResponse)
+@limiter.limit("60/minute")
+async def get_stats(
+    request: Request,
+    days: int = 30,
+    source: Optional[str] = None,
+    top_senders: int = 10,
+    db=Depends(DB_DEPENDENCY),
+):
+    """
+    Toxicity trends from the aggregate tables (no scan of audit messages):
+    per day and per source over the last `days` days, plus all-time top
+    senders and the safety-score distribution.
+    """
+    if not 1 <= days <= 366:
+        raise HTTPException(status_code=400, detail="days harus antara 1 dan 366.")
+    top_senders = max(0, min(top_senders, 100))
+    return await _run_db(db, stats_summary, days=days, source=source, top_senders=top_senders)
+
+
+# ============================================================
+# SEARCH
+# ============================================================
+
+@app.get("/api/search", response_model=List[SearchHit])
+@limiter.limit("30/minute")
+async def search(
+    request: Request,
+    response: Response,
+    q: str,
+    sender: Optional[str] = None,
+    label: Optional[str] = None,
+    is_toxic: Optional[bool] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    cursor: Optional[int] = None,
+    limit: int = 20,
+    db=Depends(DB_DEPENDENCY),
+):
+    """
+    Full-text search over all audited messages, newest first. `q` is
+    normalized like the messages (slang, case, punctuation) and every word
+    must match. Pass the X-Next-Cursor header of a page as `cursor` for the next.
+    """
+    if not SEARCH_ENABLED:
+        raise HTTPException(status_code=501, detail="Pencarian teks tidak diaktifkan (butuh SQLite dengan AUDIT_SEARCH=1).")
+    limit = max(1, min(limit, 100))
+
+    lexicon = await _active_lexicon()
+    match = match_expression(normalize_text(q, lexicon))
+    if match is None:
+        raise HTTPException(status_code=400, detail="Kata kunci pencarian tidak boleh kosong.")
+
+    hits = await _run_db(
+        db, search_messages, match, sender=sender, label=label, is_toxic=is_toxic,
+        date_from=date_from, date_to=date_to, cursor=cursor, limit=limit,
+    )
+    if len(hits) == limit:
+        response.headers["X-Next-Cursor"] = str(hits[-1]["message_id"])
+    return hits
+
+
+# ============================================================
+# ADMIN
+# ============================================================
+
+def _require_admin(authorization: Optional[str] = Header(None)) -> None:
+    """Dependency: `Authorization: Bearer <ADMIN_TOKEN>`; 403 while ADMIN_TOKEN is unset."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Endpoint admin tidak diaktifkan.")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(token.strip(), ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Token admin tidak valid.")
+
+
+@app.get("/api/admin/lexicon", dependencies=[Depends(_require_admin)])
+def get_lexicon_status():
+    """Active lexicon version and sizes."""
+    snapshot = lexicon_registry.peek()
+    return {
+        "active": snapshot.status() if snapshot else None,
+        "changed_on_disk": lexicon_registry.changed_on_disk(),
+    }
+
+
+@app.post("/api/admin/lexicon/reload", status_code=202, dependencies=[Depends(_require_admin)])
+@limiter.limit("5/minute")
+def reload_lexicon(request: Request):
+    """Rebuild the lexicons in the background and swap them in once ready."""
+    lexicon_registry.reload_in_background()
+    snapshot = lexicon_registry.peek()
+    return {"status": "reloading", "current_version": snapshot.version if snapshot else None}
+
+
+@app.post("/api/admin/stats/rebuild", dependencies=[Depends(_require_admin)])
+@limiter.limit("5/minute")
+def rebuild_stats_tables(request: Request, db: Session = Depends(get_db)):
+    """Recompute the /api/stats aggregates from scratch (full scan; for repairs only)."""
+    started = time.perf_counter()
+    rebuild_stats(db)
+    db.commit()
+    return {"status": "rebuilt", "seconds": round(time.perf_counter() - started, 2)}
+
+
+@app.post("/api/admin/maintenance", status_code=202, dependencies=[Depends(_require_admin)])
+@limiter.limit("2/minute")
+def start_maintenance(request: Request, background_tasks: BackgroundTasks, vacuum: str = "incremental"):
+    """Run retention, compaction and incremental vacuum (see app/maintenance.py) after responding."""
+    if vacuum not in ("incremental", "none"):
+        raise HTTPException(status_code=400, detail="vacuum harus 'incremental' atau 'none' (VACUUM penuh hanya lewat CLI).")
+    background_tasks.add_task(run_maintenance, vacuum=vacuum)
+    return {"status": "scheduled"}
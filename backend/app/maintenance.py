@@ -0,0 +1,218 @@
+# app/maintenance.py
+"""
+Retention and compaction for the audit database.
+- purge_old_sessions: delete sessions older than N days, one chunk per
+  transaction so live saves only ever wait for a short write
+- compact_messages: rewrite plain message rows to the compact layout
+  (see database.STORAGE_MODE)
+- reclaim_space: hand freed pages back to the OS, in steps with
+  incremental_vacuum or with one full VACUUM
+
+Run it from cron:
+    python -m app.maintenance --retention-days 90 --compact --vacuum incremental
+or in-process every MAINTENANCE_INTERVAL_HOURS (start_scheduler).
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.database import (
+    STORAGE_MODE,
+    AuditMessage,
+    AuditSession,
+    SessionLocal,
+    compact_message_rows,
+    engine,
+)
+from app.stats import unrecord_sessions
+
+logger = logging.getLogger(__name__)
+
+RETENTION_DAYS = int(os.getenv("AUDIT_RETENTION_DAYS", "0"))               # 0 = keep everything
+CHUNK_SESSIONS = int(os.getenv("MAINTENANCE_CHUNK_SESSIONS", "200"))       # sessions per delete transaction
+CHUNK_MESSAGES = int(os.getenv("MAINTENANCE_CHUNK_MESSAGES", "5000"))      # rows per compaction transaction
+VACUUM_STEP_PAGES = int(os.getenv("MAINTENANCE_VACUUM_STEP_PAGES", "2000"))
+INTERVAL_HOURS = float(os.getenv("MAINTENANCE_INTERVAL_HOURS", "0"))       # 0 = no in-process scheduler
+PAUSE_SECONDS = 0.05  # between chunks, so waiting writers get the lock
+
+
+# ============================================================
+# RETENTION
+# ============================================================
+
+def purge_old_sessions(db: Session, older_than_days: int, chunk_size: int = CHUNK_SESSIONS) -> int:
+    """Delete finished/failed sessions older than `older_than_days` (and their stats); returns sessions removed."""
+    # created_at is stored by SQLite as naive UTC
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=older_than_days)
+    removed = 0
+    while True:
+        rows = db.execute(
+            select(AuditSession.id, AuditSession.status)
+            .where(AuditSession.status.in_(("done", "failed")), AuditSession.created_at < cutoff)
+            .order_by(AuditSession.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        ids = [r.id for r in rows]
+        unrecord_sessions(db, [r.id for r in rows if r.status == "done"])
+        db.execute(delete(AuditMessage).where(AuditMessage.session_id.in_(ids)))
+        db.execute(delete(AuditSession).where(AuditSession.id.in_(ids)))
+        db.commit()
+        removed += len(ids)
+        time.sleep(PAUSE_SECONDS)
+    return removed
+
+
+# ============================================================
+# COMPACTION
+# ============================================================
+
+def compact_messages(db: Session, chunk_size: int = CHUNK_MESSAGES) -> int:
+    """
+    Convert plain message rows (no sender_id yet) to the compact layout; returns rows rewritten.
+    Texts are re-written too, so they get compressed when AUDIT_TEXT_COMPRESSION is on.
+    """
+    table = AuditMessage.__table__
+    stmt = update(table).where(table.c.id == bindparam("row_id"))
+    last_id, converted = 0, 0
+    while True:
+        rows = db.execute(
+            select(table.c.id, table.c.sender, table.c.label, table.c.raw_text, table.c.normalized_text)
+            .where(table.c.id > last_id, table.c.sender_id.is_(None))
+            .order_by(table.c.id)
+            .limit(chunk_size)
+        ).mappings().all()
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+
+        params = [dict(r) for r in rows]
+        compact_message_rows(db, params)
+        for p in params:
+            p["row_id"] = p.pop("id")
+        db.execute(stmt, params)
+        db.commit()
+        converted += len(params)
+        time.sleep(PAUSE_SECONDS)
+    return converted
+
+
+def reclaim_space(bind: Engine = engine, full: bool = False, step_pages: int = VACUUM_STEP_PAGES) -> Dict:
+    """
+    Return free pages to the OS. Incremental mode frees `step_pages` per step
+    and needs auto_vacuum=INCREMENTAL (new files get it from the production
+    profile); `full` runs one VACUUM, which also switches an older file over
+    but rewrites the whole database while holding the write lock.
+    """
+    if bind.dialect.name != "sqlite":
+        return {"skipped": "not sqlite"}
+
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        def free_pages() -> int:
+            return conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+
+        before = free_pages()
+        if full:
+            conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.exec_driver_sql("VACUUM")
+        elif conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+            logger.warning("auto_vacuum is not INCREMENTAL on this database; run one full VACUUM "
+                           "(python -m app.maintenance --vacuum full) to enable chunked reclaiming")
+        else:
+            remaining = before
+            while remaining > 0:
+                # executescript: sqlite3's execute() would only step the pragma once (= one page)
+                conn.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(step_pages)});")
+                left = free_pages()
+                if left >= remaining:
+                    break
+                remaining = left
+                time.sleep(PAUSE_SECONDS)
+        # In WAL mode the file only shrinks once the log is checkpointed
+        if conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal":
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        after = free_pages()
+
+    return {"free_pages_before": before, "free_pages_after": after}
+
+
+# ============================================================
+# ENTRY POINTS
+# ============================================================
+
+def run_maintenance(
+    retention_days: int = RETENTION_DAYS,
+    compact: bool = STORAGE_MODE == "compact",
+    vacuum: str = "incremental",
+) -> Dict:
+    """Retention, then compaction, then space reclaiming; returns a report."""
+    if vacuum not in ("incremental", "full", "none"):
+        raise ValueError(f"Unknown vacuum mode: {vacuum!r}")
+
+    started = time.perf_counter()
+    report: Dict = {}
+    db = SessionLocal()
+    try:
+        if retention_days > 0:
+            report["sessions_deleted"] = purge_old_sessions(db, retention_days)
+        if compact:
+            report["messages_compacted"] = compact_messages(db)
+    finally:
+        db.close()
+    if vacuum != "none":
+        report.update(reclaim_space(full=vacuum == "full"))
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    logger.info("Database maintenance finished: %s", report)
+    return report
+
+
+_stop = threading.Event()
+_scheduler: Optional[threading.Thread] = None
+
+
+def start_scheduler(interval_hours: float = INTERVAL_HOURS) -> None:
+    """Run run_maintenance() every `interval_hours` in a daemon thread (0 disables)."""
+    global _scheduler
+    if interval_hours <= 0 or (_scheduler is not None and _scheduler.is_alive()):
+        return
+    _stop.clear()
+
+    def loop():
+        while not _stop.wait(interval_hours * 3600):
+            try:
+                run_maintenance()
+            except Exception:
+                logger.exception("Database maintenance failed")
+
+    _scheduler = threading.Thread(target=loop, name="db-maintenance", daemon=True)
+    _scheduler.start()
+
+
+def stop_scheduler() -> None:
+    _stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS,
+                        help="delete sessions older than this (0 = keep everything)")
+    parser.add_argument("--compact", action="store_true", default=STORAGE_MODE == "compact",
+                        help="convert plain message rows to the compact layout")
+    parser.add_argument("--vacuum", choices=["incremental", "full", "none"], default="incremental")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(name)s - %(message)s")
+    run_maintenance(args.retention_days, args.compact, args.vacuum)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,8 @@ Pydantic request and response models for ChatGuard Vision API.
 Using Pydantic for automatic validation, serialization, and OpenAPI documentation.
 """
 from pydantic import BaseModel, Field, field_validator
-from typing import List, Optional
-from datetime import datetime
+from typing import Any, Dict, List, Literal, Optional
+from datetime import date, datetime
 
 
 # ============================================================
@@ -14,6 +14,23 @@ from datetime import datetime
 
 class TextAuditRequest(BaseModel):
     text: str = Field(..., min_length=1, max_length=50_000, description="Raw chat log text")
+    mode: Literal["full", "rules"] = Field(
+        "full",
+        description='"full" = sentiment + toxicity, "rules" = toxicity only (label "unscored", much faster)',
+    )
+
+    @field_validator("text")
+    @classmethod
+    def must_not_be_blank(cls, v: str) -> str:
+        if not v.strip():
+            raise ValueError("text must not be empty or whitespace only")
+        return v
+
+
+class AuditJobRequest(BaseModel):
+    """Large chat exports are analyzed in the background (see /api/jobs)."""
+    text: str = Field(..., min_length=1, max_length=2_000_000, description="Raw chat log text")
+    mode: Literal["full", "rules"] = "full"
 
     @field_validator("text")
     @classmethod
@@ -48,6 +65,7 @@ class AuditMeta(BaseModel):
     safety_score: int
     processing_time_seconds: float
     session_id: Optional[int] = None  # filled after DB save
+    ocr: Optional[Dict[str, Any]] = None  # image audits: OCR profile, noise, stage timings (ms)
 
 
 class AuditResponse(BaseModel):
@@ -67,6 +85,7 @@ class HistorySession(BaseModel):
     toxic_messages: int
     safety_score: int
     processing_time_seconds: float
+    lexicon_version: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -74,3 +93,74 @@ class HistorySession(BaseModel):
 
 class HistoryDetail(HistorySession):
     messages: List[MessageResult]
+
+
+# ============================================================
+# STATS RESPONSE MODELS
+# ============================================================
+
+class StatsDay(BaseModel):
+    day: date
+    sessions: int
+    messages: int
+    toxic_messages: int
+    toxic_rate: float
+    avg_safety_score: float
+
+
+class StatsSource(BaseModel):
+    source: str
+    sessions: int
+    messages: int
+    toxic_messages: int
+    toxic_rate: float
+
+
+class StatsSender(BaseModel):
+    sender: str
+    messages: int
+    toxic_messages: int
+    toxic_rate: float
+
+
+class SafetyBucket(BaseModel):
+    min_score: int
+    max_score: int
+    sessions: int
+
+
+class StatsResponse(BaseModel):
+    days: int
+    daily: List[StatsDay]                    # last `days` days, oldest first
+    sources: List[StatsSource]               # same window
+    senders: List[StatsSender]               # all-time, most toxic first
+    safety_distribution: List[SafetyBucket]  # all-time
+
+
+# ============================================================
+# SEARCH RESPONSE MODELS
+# ============================================================
+
+class SearchHit(BaseModel):
+    message_id: int          # pass the last one as `cursor` for the next page
+    session_id: int
+    msg_order: int
+    session_created_at: datetime
+    timestamp: str
+    sender: str
+    label: str
+    score: float
+    is_toxic: bool
+    snippet: str             # normalized text around the hits, matches in [brackets]
+
+
+# ============================================================
+# JOB RESPONSE MODELS
+# ============================================================
+
+class AuditJobStatus(BaseModel):
+    job_id: int
+    status: str          # "queued" / "running" / "done" / "failed"
+    processed_messages: int
+    total_messages: int
+    error: Optional[str] = None
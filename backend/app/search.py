@@ -0,0 +1,194 @@
+# app/search.py
+"""
+Full-text search over audited messages.
+Queries hit the FTS5 index (database.SEARCH_TABLE) and only join the
+matching rows back to audit_messages / audit_sessions for the filters, so
+the cost follows the number of matches instead of the size of the history.
+Results are newest first and paged by message id (keyset).
+Leet spellings are folded the way the lexicon matcher reads them, on both
+the indexed text and the query, so "tolol" also finds "t0l0l".
+"""
+import re
+import weakref
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import column, func, literal_column, select, table, text
+from sqlalchemy.orm import Session
+
+from app.database import (
+    AUDIT_SEARCH,
+    SEARCH_COLUMN,
+    SEARCH_TABLE,
+    AuditLabel,
+    AuditMessage,
+    AuditSender,
+    AuditSession,
+    expand_normalized,
+)
+from app.services.ai_engine import LEET_MAP
+
+SNIPPET_TOKENS = 12           # words of context around the hits
+SNIPPET_MARKS = ("[", "]")    # wrapped around each matched word
+
+_fts = table(SEARCH_TABLE, column("rowid"))
+_TERM_RE = re.compile(r"\w+")
+# A word, with leet symbols allowed inside it ("b!tch", "@njing")
+_LEET_WORD_RE = re.compile(r"@?\w+(?:[@!$+]\w+)*")
+
+
+def fold_leet(value: str) -> str:
+    """Apply LEET_MAP to words that contain a letter; numbers and times stay as they are."""
+    return _LEET_WORD_RE.sub(
+        lambda m: m.group().translate(LEET_MAP) if any(c.isalpha() for c in m.group()) else m.group(),
+        value,
+    )
+
+
+# ============================================================
+# INDEXING
+# ============================================================
+
+_indexed_binds: "weakref.WeakSet" = weakref.WeakSet()
+
+
+def search_index_active(db: Session) -> bool:
+    """True if messages written through `db` must be indexed: AUDIT_SEARCH is on and its database has the FTS table."""
+    if not AUDIT_SEARCH:
+        return False
+    bind = db.get_bind()
+    if bind in _indexed_binds:
+        return True
+    if bind.dialect.name != "sqlite":
+        return False
+    found = db.connection().exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (SEARCH_TABLE,)
+    ).first() is not None
+    if found:  # the table is never dropped for good, so only a hit is remembered
+        _indexed_binds.add(bind)
+    return found
+
+
+def index_messages(db: Session, message_ids: Sequence[int], normalized_texts: Sequence[str]) -> None:
+    """Add freshly inserted messages to the search index (same transaction as the insert)."""
+    if message_ids:
+        db.execute(
+            text(f"INSERT INTO {SEARCH_TABLE} (rowid, {SEARCH_COLUMN}) VALUES (:id, :text)"),
+            [{"id": i, "text": fold_leet(t)} for i, t in zip(message_ids, normalized_texts)],
+        )
+
+
+def index_new_messages(db: Session, chunk_size: int = 5000) -> int:
+    """
+    Index messages newer than the newest indexed one (saved while AUDIT_SEARCH
+    was off), committing per chunk; returns messages indexed. The index's
+    highest rowid is the high-water mark: rows are only ever added in id order.
+    """
+    last_id = db.execute(
+        text(f"SELECT rowid FROM {SEARCH_TABLE} ORDER BY rowid DESC LIMIT 1")
+    ).scalar() or 0
+    indexed = 0
+    while True:
+        rows = db.execute(
+            select(AuditMessage.id, AuditMessage.raw_text, AuditMessage.normalized_text, AuditMessage.flags)
+            .where(AuditMessage.id > last_id)
+            .order_by(AuditMessage.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return indexed
+        last_id = rows[-1].id
+        index_messages(db, [r.id for r in rows],
+                       [expand_normalized(r.raw_text, r.normalized_text, r.flags) for r in rows])
+        db.commit()
+        indexed += len(rows)
+
+
+def rebuild_search_index(db: Session, chunk_size: int = 5000) -> int:
+    """Re-index every stored message, committing per chunk; returns messages indexed."""
+    db.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    db.commit()
+    return index_new_messages(db, chunk_size)
+
+
+# ============================================================
+# QUERIES
+# ============================================================
+
+def match_expression(normalized_query: str) -> Optional[str]:
+    """
+    FTS5 MATCH string requiring every word of an already-normalized query.
+    Words are quoted, so user input can never be parsed as FTS5 syntax.
+    """
+    terms = _TERM_RE.findall(fold_leet(normalized_query))
+    return " ".join(f'"{t}"' for t in terms) if terms else None
+
+
+def search_messages(
+    db: Session,
+    match: str,
+    sender: Optional[str] = None,
+    label: Optional[str] = None,
+    is_toxic: Optional[bool] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    cursor: Optional[int] = None,
+    limit: int = 20,
+) -> List[Dict]:
+    """Messages matching `match` (see match_expression), newest first, older than message id `cursor`."""
+    sender_name = func.coalesce(AuditSender.name, AuditMessage.sender)
+    label_name = func.coalesce(AuditLabel.name, AuditMessage.label)
+    day = func.date(AuditSession.created_at)
+
+    query = (
+        select(
+            AuditMessage.id,
+            AuditMessage.session_id,
+            AuditMessage.msg_order,
+            AuditSession.created_at,
+            AuditMessage.timestamp,
+            sender_name,
+            label_name,
+            AuditMessage.score,
+            AuditMessage.is_toxic,
+            func.snippet(literal_column(SEARCH_TABLE), 0, *SNIPPET_MARKS, "…", SNIPPET_TOKENS),
+        )
+        .select_from(_fts)
+        .join(AuditMessage, AuditMessage.id == _fts.c.rowid)
+        .join(AuditSession, AuditSession.id == AuditMessage.session_id)
+        .outerjoin(AuditSender, AuditMessage.sender_id == AuditSender.id)
+        .outerjoin(AuditLabel, AuditMessage.label_id == AuditLabel.id)
+        .where(literal_column(SEARCH_TABLE).op("MATCH")(match))
+    )
+    if cursor is not None:
+        query = query.where(_fts.c.rowid < cursor)
+    if sender is not None:
+        query = query.where(sender_name == sender)
+    if label is not None:
+        query = query.where(label_name == label)
+    if is_toxic is not None:
+        query = query.where(AuditMessage.is_toxic == is_toxic)
+    # created_at is stored as text; compare its day part as ISO strings
+    if date_from is not None:
+        query = query.where(day >= date_from.isoformat())
+    if date_to is not None:
+        query = query.where(day <= date_to.isoformat())
+    # FTS5 walks its rowids backwards natively, so LIMIT stops the scan early
+    query = query.order_by(_fts.c.rowid.desc()).limit(limit)
+
+    return [
+        {
+            "message_id": message_id,
+            "session_id": session_id,
+            "msg_order": msg_order,
+            "session_created_at": created_at,
+            "timestamp": timestamp,
+            "sender": sender_value,
+            "label": label_value,
+            "score": score,
+            "is_toxic": toxic,
+            "snippet": snippet,
+        }
+        for message_id, session_id, msg_order, created_at, timestamp, sender_value, label_value, score, toxic, snippet
+        in db.execute(query)
+    ]
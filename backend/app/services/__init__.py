@@ -1,6 +1,6 @@
 ﻿# app/services/__init__.py
 from .ai_engine import ai_analyzer
-from .normalizer import normalize_text, parse_chat_log
+from .normalizer import normalize_text, normalize_many, parse_chat_log, iter_chat_log
 from .ocr_service import extract_text_from_image
 
-__all__ = ["ai_analyzer", "normalize_text", "parse_chat_log", "extract_text_from_image"]
+__all__ = ["ai_analyzer", "normalize_text", "normalize_many", "parse_chat_log", "iter_chat_log", "extract_text_from_image"]
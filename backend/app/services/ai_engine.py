@@ -1,12 +1,35 @@
 ﻿# app/services/ai_engine.py
 import logging
 import os
-import re
-from typing import Any, Dict
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .cache import InferenceCache, inference_cache_from_env
+from .lexicon import LexiconSnapshot, lexicon_registry
+from .matcher import LexiconHit
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+# Max characters fed to the model per message
+MAX_TEXT_CHARS = 512
+
+# Messages per padded forward pass in analyze_batch()
+BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", "16"))
+
+# Inference backend: "pytorch" (default), "onnx" or "onnx-int8" (see build_pipeline)
+SENTIMENT_BACKEND = os.getenv("SENTIMENT_BACKEND", "pytorch").strip().lower()
+
+# Where exported ONNX graphs are kept between restarts
+ONNX_EXPORT_DIR = os.getenv(
+    "SENTIMENT_ONNX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "onnx"),
+)
+
+# "full"  → sentiment model + rule-based toxicity
+# "rules" → rule-based toxicity only, the model is never loaded
+ANALYSIS_MODES = ("full", "rules")
+
 # ============================================================
 # LEET SPEAK / OBFUSCATION MAP
 # ============================================================
@@ -128,6 +151,77 @@ FRIENDLY_PATTERNS = [
     r"gokil\s+(banget|abis)?",
 ]
 
+# The lists above are the built-in defaults; the compiled matcher actually used
+# lives in the active LexiconSnapshot (see lexicon.py, reloadable at runtime).
+
+
+# ============================================================
+# INFERENCE BACKENDS
+# ============================================================
+
+def _load_pytorch_model(model_name: str, cache_dir: Optional[str]):
+    from transformers import AutoModelForSequenceClassification
+
+    return AutoModelForSequenceClassification.from_pretrained(model_name, cache_dir=cache_dir)
+
+
+def _load_onnx_model(model_name: str, cache_dir: Optional[str], quantize: bool):
+    """
+    Export the classifier to ONNX once (kept under ONNX_EXPORT_DIR) and load it
+    through ONNX Runtime. With `quantize`, weights are dynamically quantized to INT8.
+    Requires `optimum[onnxruntime]`.
+    """
+    from optimum.onnxruntime import ORTModelForSequenceClassification
+
+    export_dir = os.path.join(ONNX_EXPORT_DIR, model_name.replace("/", "__"))
+    fp32_file = os.path.join(export_dir, "model.onnx")
+
+    if not os.path.exists(fp32_file):
+        logger.info("Exporting %s to ONNX at %s", model_name, export_dir)
+        exported = ORTModelForSequenceClassification.from_pretrained(
+            model_name, export=True, cache_dir=cache_dir
+        )
+        exported.save_pretrained(export_dir)
+
+    file_name = "model.onnx"
+    if quantize:
+        file_name = "model_quantized.onnx"
+        int8_file = os.path.join(export_dir, file_name)
+        if not os.path.exists(int8_file):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            logger.info("Quantizing ONNX model to INT8: %s", int8_file)
+            quantize_dynamic(fp32_file, int8_file, weight_type=QuantType.QInt8)
+
+    return ORTModelForSequenceClassification.from_pretrained(export_dir, file_name=file_name)
+
+
+def build_pipeline(model_name: str, backend: str = "pytorch", cache_dir: Optional[str] = None):
+    """
+    Build the sentiment-analysis pipeline for `backend`:
+    - "pytorch":   transformers + torch (default)
+    - "onnx":      ONNX Runtime, fp32 graph
+    - "onnx-int8": ONNX Runtime, dynamically quantized INT8 graph
+    """
+    from transformers import AutoTokenizer, pipeline
+
+    if backend == "pytorch":
+        model = _load_pytorch_model(model_name, cache_dir)
+    elif backend in ("onnx", "onnx-int8"):
+        model = _load_onnx_model(model_name, cache_dir, quantize=backend == "onnx-int8")
+    else:
+        raise ValueError(f"Unknown SENTIMENT_BACKEND: {backend!r} (expected pytorch, onnx or onnx-int8)")
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=cache_dir)
+
+    return pipeline(
+        "sentiment-analysis",
+        model=model,
+        tokenizer=tokenizer,
+        device=-1,  # CPU only
+        top_k=None,
+    )
+
 
 class SentimentEngine:
     """
@@ -140,6 +234,10 @@ class SentimentEngine:
     _instance = None
     _pipeline = None
     _model_name: str
+    _backend: str
+    cache: InferenceCache
+    load_time_seconds: Optional[float] = None
+    warmup_time_seconds: Optional[float] = None
 
     def __new__(cls):
         if cls._instance is None:
@@ -149,43 +247,65 @@ class SentimentEngine:
                 "SENTIMENT_MODEL",
                 "w11wo/indonesian-roberta-base-sentiment-classifier",
             )
+            cls._instance._backend = SENTIMENT_BACKEND
+            cls._instance.cache = inference_cache_from_env()
         return cls._instance
 
+    def _cache_namespace(self, lexicon: LexiconSnapshot) -> str:
+        # Quantized backends score slightly differently and verdicts depend on
+        # the lexicons, so both are part of the cache identity
+        return f"{self._model_name}@{self._backend}#{lexicon.version}"
+
     # ============================================================
     # MODEL LOADER (LAZY, SINGLETON)
     # ============================================================
 
     def _load_model(self):
         try:
-            logger.info("Loading sentiment model...")
-            from transformers import (
-                AutoTokenizer,
-                AutoModelForSequenceClassification,
-                pipeline,
-            )
-
-            cache_dir = os.getenv("HF_CACHE_DIR")
-
-            tokenizer = AutoTokenizer.from_pretrained(
-                self._model_name, cache_dir=cache_dir
-            )
-            model = AutoModelForSequenceClassification.from_pretrained(
-                self._model_name, cache_dir=cache_dir
-            )
-
-            self._pipeline = pipeline(
-                "sentiment-analysis",
-                model=model,
-                tokenizer=tokenizer,
-                device=-1,  # CPU only
-                top_k=None,
-            )
-
-            logger.info("Sentiment model ready.")
+            logger.info("Loading sentiment model (backend=%s)...", self._backend)
+            started = time.perf_counter()
+            self._pipeline = build_pipeline(self._model_name, self._backend, os.getenv("HF_CACHE_DIR"))
+            self.load_time_seconds = round(time.perf_counter() - started, 3)
+            logger.info("Sentiment model ready in %.2fs.", self.load_time_seconds)
         except Exception as e:
             logger.exception("Model load failed: %s", e)
             self._pipeline = None
 
+    def warm_up(self) -> bool:
+        """
+        Load the model now (instead of on the first request) and run one
+        dummy forward pass so lazy kernels/allocations happen up front.
+        Returns True when the model is ready.
+        """
+        if self._pipeline is None:
+            self._load_model()
+            if self._pipeline is None:
+                return False
+
+        try:
+            started = time.perf_counter()
+            self._pipeline(["halo, apa kabar?"], batch_size=1)
+            self.warmup_time_seconds = round(time.perf_counter() - started, 3)
+            logger.info("Sentiment model warmed up in %.2fs.", self.warmup_time_seconds)
+        except Exception as e:
+            logger.exception("Model warm-up failed: %s", e)
+            return False
+        return True
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._pipeline is not None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.is_loaded,
+            "model": self._model_name,
+            "backend": self._backend,
+            "load_time_seconds": self.load_time_seconds,
+            "warmup_time_seconds": self.warmup_time_seconds,
+            "cache": self.cache.stats(),
+        }
+
     # ============================================================
     # RULE HELPERS
     # ============================================================
@@ -194,99 +314,202 @@ class SentimentEngine:
         """Convert leet speak characters to their alphabetic equivalents."""
         return text.translate(LEET_MAP)
 
-    def _has_positive_context(self, text: str) -> bool:
-        t = text.lower()
-        if any(p in t for p in POSITIVE_INDICATORS):
-            return True
-        for pattern in FRIENDLY_PATTERNS:
-            if re.search(pattern, t):
-                return True
-        return False
+    def scan_lexicons(self, text: str, lexicon: Optional[LexiconSnapshot] = None) -> List[LexiconHit]:
+        """All toxic / positive / friendly lexicon hits in `text`, with spans."""
+        return (lexicon or lexicon_registry.current()).matcher.scan(text)
+
+    def _has_positive_context(self, text: str, hits: Optional[List[LexiconHit]] = None) -> bool:
+        if hits is None:
+            hits = self.scan_lexicons(text)
+        return any(h.kind != "toxic" for h in hits)
 
-    def _detect_toxicity(self, text: str) -> Dict[str, Any]:
+    def _detect_toxicity(self, text: str, hits: Optional[List[LexiconHit]] = None) -> Dict[str, Any]:
         """
         Toxicity detection with leet speak normalization:
         - hard insults → toxic
         - crude → contextual (not toxic unless no positive context)
         - mild → never toxic
         """
-        normalized = self._normalize_leet(text.lower())
-        words = re.findall(r"\b\w+\b", normalized)
-        found = set()
-
-        for w in words:
-            if w in TOXIC_KEYWORDS:
-                found.add(TOXIC_KEYWORDS[w])
-
-        # Also check multi-word phrases
-        for phrase, level in TOXIC_KEYWORDS.items():
-            if " " in phrase and phrase in normalized:
-                found.add(level)
+        if hits is None:
+            hits = self.scan_lexicons(text)
+        toxic_hits = [h for h in hits if h.kind == "toxic"]
+        found = {h.level for h in toxic_hits}
+        matches = [
+            {"term": h.term, "level": h.level, "start": h.start, "end": h.end}
+            for h in toxic_hits
+        ]
 
         if "hard" in found:
-            return {"is_toxic": True, "level": "hard"}
+            return {"is_toxic": True, "level": "hard", "matches": matches}
         if "crude" in found:
-            return {"is_toxic": False, "level": "crude"}
+            return {"is_toxic": False, "level": "crude", "matches": matches}
         if "mild" in found:
-            return {"is_toxic": False, "level": "mild"}
+            return {"is_toxic": False, "level": "mild", "matches": matches}
 
-        return {"is_toxic": False, "level": "none"}
+        return {"is_toxic": False, "level": "none", "matches": matches}
 
     # ============================================================
     # MAIN ANALYSIS
     # ============================================================
 
-    def analyze(self, text: str) -> Dict[str, Any]:
+    def _top_prediction(self, results: Any) -> Optional[Tuple[str, float]]:
+        """Pick the highest scoring (label, score) from raw pipeline output."""
+        # Flatten if nested (top_k returns nested list)
+        if isinstance(results, list) and len(results) > 0:
+            if isinstance(results[0], list):
+                results = results[0]
+
+            if len(results) > 0 and isinstance(results[0], dict):
+                top = max(results, key=lambda x: x.get("score", 0.0))
+                return str(top.get("label", "neutral")).lower(), float(top.get("score", 0.0))
+
+            logger.warning("Unexpected results format: %s", type(results[0]))
+            return None
+
+        logger.warning("Empty or invalid results: %s", results)
+        return None
+
+    def _finalize(self, text: str, results: Any, lexicon: LexiconSnapshot) -> Dict[str, Any]:
+        """Combine model output with the rule-based toxicity/context checks."""
+        top = self._top_prediction(results)
+        if top is None:
+            return {"label": "error", "score": 0.0, "is_toxic": False}
+        label, score = top
+
+        hits = self.scan_lexicons(text, lexicon)
+        toxicity = self._detect_toxicity(text, hits)
+
+        # Context correction: positive context downgrades negative sentiment
+        if label == "negative" and self._has_positive_context(text, hits):
+            label = "neutral"
+            score = round(score * 0.5, 4)
+
+        # Toxicity is strictly rule-based and separate from sentiment
+        return {
+            "label": label,
+            "score": round(score, 4),
+            "is_toxic": toxicity["is_toxic"],
+        }
+
+    def _analyze_rules_only(self, text: str, lexicon: LexiconSnapshot) -> Dict[str, Any]:
+        """Toxicity verdict without sentiment (label "unscored")."""
+        safe_text = text[:MAX_TEXT_CHARS]
+        toxicity = self._detect_toxicity(safe_text, self.scan_lexicons(safe_text, lexicon))
+        return {"label": "unscored", "score": 0.0, "is_toxic": toxicity["is_toxic"]}
+
+    def _check_mode(self, mode: str) -> None:
+        if mode not in ANALYSIS_MODES:
+            raise ValueError(f"Unknown analysis mode: {mode!r} (expected one of {ANALYSIS_MODES})")
+
+    def analyze(self, text: str, mode: str = "full", lexicon: Optional[LexiconSnapshot] = None) -> Dict[str, Any]:
+        self._check_mode(mode)
         if not text or not text.strip():
             return {"label": "neutral", "score": 0.0, "is_toxic": False}
 
+        lexicon = lexicon or lexicon_registry.current()
+        if mode == "rules":
+            return self._analyze_rules_only(text, lexicon)
+
+        namespace = self._cache_namespace(lexicon)
+        safe_text = text[:MAX_TEXT_CHARS]
+        cached = self.cache.get(namespace, safe_text)
+        if cached is not None:
+            return cached
+
         if self._pipeline is None:
             self._load_model()
             if self._pipeline is None:
                 return {"label": "error", "score": 0.0, "is_toxic": False}
 
-        safe_text = text[:512]
         logger.info("Analyzing: %s", safe_text[:80])
 
         try:
-            toxicity = self._detect_toxicity(safe_text)
-            has_positive_ctx = self._has_positive_context(safe_text)
-
-            results = self._pipeline(safe_text)
-            # Flatten if nested (top_k returns nested list)
-            if isinstance(results, list) and len(results) > 0:
-                if isinstance(results[0], list):
-                    results = results[0]
-
-                if len(results) > 0 and isinstance(results[0], dict):
-                    top = max(results, key=lambda x: x.get("score", 0.0))
-                    label = str(top.get("label", "neutral")).lower()
-                    score = float(top.get("score", 0.0))
-                else:
-                    logger.warning("Unexpected results format: %s", type(results[0]))
-                    return {"label": "error", "score": 0.0, "is_toxic": False}
-            else:
-                logger.warning("Empty or invalid results: %s", results)
-                return {"label": "error", "score": 0.0, "is_toxic": False}
-
-            # Context correction: positive context downgrades negative sentiment
-            if has_positive_ctx and label == "negative":
-                label = "neutral"
-                score = round(score * 0.5, 4)
-
-            # Toxicity is strictly rule-based and separate from sentiment
-            is_toxic = toxicity["is_toxic"]
-
-            return {
-                "label": label,
-                "score": round(score, 4),
-                "is_toxic": is_toxic,
-            }
-
+            result = self._finalize(safe_text, self._pipeline(safe_text), lexicon)
+            if result["label"] != "error":
+                self.cache.put(namespace, safe_text, result)
+            return result
         except Exception as e:
             logger.exception("Inference error: %s", e)
             return {"label": "error", "score": 0.0, "is_toxic": False}
 
+    def analyze_batch(
+        self,
+        texts: List[str],
+        batch_size: Optional[int] = None,
+        mode: str = "full",
+        lexicon: Optional[LexiconSnapshot] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Analyze many messages at once.
+        - Texts are sorted by length and fed to the pipeline in mini-batches,
+          so each padded batch holds messages of similar size
+        - Results are returned in the original order
+        - A failing mini-batch only marks its own messages as "error"
+        - Cached and duplicate texts are only sent to the model once
+        - mode="rules" skips the model entirely
+        - The whole batch is judged against one lexicon snapshot
+        """
+        self._check_mode(mode)
+        lexicon = lexicon or lexicon_registry.current()
+        batch_size = batch_size or BATCH_SIZE
+        results: List[Dict[str, Any]] = [
+            {"label": "neutral", "score": 0.0, "is_toxic": False} for _ in texts
+        ]
+
+        if mode == "rules":
+            for i, t in enumerate(texts):
+                if t and t.strip():
+                    results[i] = self._analyze_rules_only(t, lexicon)
+            return results
+
+        namespace = self._cache_namespace(lexicon)
+
+        # unique model input -> indices of the messages that share it
+        pending: Dict[str, List[int]] = {}
+        for i, t in enumerate(texts):
+            if not t or not t.strip():
+                continue
+            safe_text = t[:MAX_TEXT_CHARS]
+            if safe_text in pending:
+                pending[safe_text].append(i)
+                continue
+            cached = self.cache.get(namespace, safe_text)
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending[safe_text] = [i]
+
+        if not pending:
+            return results
+
+        if self._pipeline is None:
+            self._load_model()
+            if self._pipeline is None:
+                for indices in pending.values():
+                    for i in indices:
+                        results[i] = {"label": "error", "score": 0.0, "is_toxic": False}
+                return results
+
+        unique = sorted(pending, key=len)
+        logger.info("Analyzing batch of %d messages (batch_size=%d)", len(unique), batch_size)
+
+        for start in range(0, len(unique), batch_size):
+            chunk = unique[start:start + batch_size]
+            try:
+                outputs = self._pipeline(chunk, batch_size=len(chunk))
+                chunk_results = [self._finalize(t, out, lexicon) for t, out in zip(chunk, outputs)]
+            except Exception as e:
+                logger.exception("Batch inference error: %s", e)
+                chunk_results = [{"label": "error", "score": 0.0, "is_toxic": False} for _ in chunk]
+
+            for safe_text, result in zip(chunk, chunk_results):
+                if result["label"] != "error":
+                    self.cache.put(namespace, safe_text, result)
+                for i in pending[safe_text]:
+                    results[i] = dict(result)
+
+        return results
+
 
 # Singleton instance
 ai_analyzer = SentimentEngine()
@@ -0,0 +1,176 @@
+# app/services/cache.py
+"""
+Small in-process caches used by the analysis services.
+- LRUCache: bounded, thread-safe, with hit/miss counters
+- InferenceCache: content-addressed model results + optional SQLite tier
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================
+# IN-MEMORY LRU
+# ============================================================
+
+class LRUCache:
+    """Thread-safe LRU mapping bounded by entry count (0 disables caching)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(0, max_entries)
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# ============================================================
+# INFERENCE RESULT CACHE
+# ============================================================
+
+class InferenceCache:
+    """
+    Caches analysis results keyed on sha256(model name + text).
+    - Memory tier: LRUCache
+    - Disk tier (optional): SQLite file that survives restarts,
+      pruned to `disk_max_entries` most recently written rows
+    """
+
+    _PRUNE_EVERY = 500  # disk writes between prune passes
+
+    def __init__(self, max_entries: int, disk_path: Optional[str] = None, disk_max_entries: int = 200_000):
+        self.memory = LRUCache(max_entries)
+        self.disk_path = disk_path or None
+        self.disk_max_entries = disk_max_entries
+        self.disk_hits = 0
+        self._disk = None
+        self._disk_lock = threading.Lock()
+        self._writes_since_prune = 0
+
+        if self.disk_path:
+            try:
+                self._disk = sqlite3.connect(self.disk_path, check_same_thread=False)
+                self._disk.execute(
+                    "CREATE TABLE IF NOT EXISTS inference_cache ("
+                    " key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+                )
+                self._disk.commit()
+            except sqlite3.Error as e:
+                logger.warning("Inference cache disk tier disabled (%s): %s", self.disk_path, e)
+                self._disk = None
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get(self, model_name: str, text: str) -> Optional[Dict[str, Any]]:
+        key = self.make_key(model_name, text)
+        value = self.memory.get(key)
+        if value is not None:
+            return dict(value)
+
+        if self._disk is None:
+            return None
+
+        with self._disk_lock:
+            row = self._disk.execute(
+                "SELECT value FROM inference_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        value = json.loads(row[0])
+        self.disk_hits += 1
+        self.memory.put(key, value)
+        return dict(value)
+
+    def put(self, model_name: str, text: str, value: Dict[str, Any]) -> None:
+        key = self.make_key(model_name, text)
+        self.memory.put(key, dict(value))
+
+        if self._disk is None:
+            return
+
+        with self._disk_lock:
+            try:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO inference_cache (key, value) VALUES (?, ?)",
+                    (key, json.dumps(value)),
+                )
+                self._writes_since_prune += 1
+                if self._writes_since_prune >= self._PRUNE_EVERY:
+                    self._disk.execute(
+                        "DELETE FROM inference_cache WHERE rowid NOT IN ("
+                        " SELECT rowid FROM inference_cache ORDER BY rowid DESC LIMIT ?)",
+                        (self.disk_max_entries,),
+                    )
+                    self._writes_since_prune = 0
+                self._disk.commit()
+            except sqlite3.Error as e:
+                logger.warning("Inference cache disk write failed: %s", e)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self._disk is not None:
+            with self._disk_lock:
+                self._disk.execute("DELETE FROM inference_cache")
+                self._disk.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.memory.stats()
+        stats["disk_enabled"] = self._disk is not None
+        stats["disk_hits"] = self.disk_hits
+        return stats
+
+
+def inference_cache_from_env() -> InferenceCache:
+    return InferenceCache(
+        max_entries=int(os.getenv("INFERENCE_CACHE_SIZE", "10000")),
+        disk_path=os.getenv("INFERENCE_CACHE_PATH") or None,
+        disk_max_entries=int(os.getenv("INFERENCE_CACHE_DISK_MAX", "200000")),
+    )
@@ -0,0 +1,245 @@
+# app/services/lexicon.py
+"""
+Versioned lexicon registry.
+Everything an audit depends on (slang map, toxic keywords, positive
+indicators, friendly patterns) is bundled into one immutable LexiconSnapshot.
+A reload builds a complete new snapshot off to the side and then swaps a
+single reference, so requests already running keep the snapshot they started
+with and never see a half-built dict.
+"""
+import csv
+import hashlib
+import logging
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from .matcher import LexiconMatcher
+
+logger = logging.getLogger(__name__)
+
+# Optional external lists (defaults: the built-in lists in ai_engine.py)
+TOXIC_LEXICON_PATH = os.getenv("TOXIC_LEXICON_PATH") or None        # CSV: term,level
+POSITIVE_LEXICON_PATH = os.getenv("POSITIVE_LEXICON_PATH") or None  # one term per line
+
+# Seconds between file-change checks (0 disables the watcher)
+WATCH_INTERVAL = float(os.getenv("LEXICON_WATCH_INTERVAL", "30"))
+
+TOXIC_LEVELS = {"hard", "crude", "mild"}
+
+
+# ============================================================
+# SNAPSHOT
+# ============================================================
+
+class LexiconSnapshot:
+    """One immutable, versioned set of lexicons plus the structures compiled from it."""
+
+    __slots__ = (
+        "version", "slang", "toxic_keywords", "positive_indicators",
+        "friendly_patterns", "matcher", "token_memo", "loaded_at", "load_seconds",
+    )
+
+    def __init__(
+        self,
+        version: str,
+        slang: Mapping[str, str],
+        toxic_keywords: Mapping[str, str],
+        positive_indicators: Iterable[str],
+        friendly_patterns: Iterable[str],
+        matcher: LexiconMatcher,
+        token_memo: Mapping[str, str],
+        load_seconds: float,
+    ):
+        self.version = version
+        self.slang = MappingProxyType(dict(slang))
+        self.toxic_keywords = MappingProxyType(dict(toxic_keywords))
+        self.positive_indicators = frozenset(positive_indicators)
+        self.friendly_patterns = tuple(friendly_patterns)
+        self.matcher = matcher
+        self.token_memo = token_memo  # memo cache only, derived from `slang`
+        self.loaded_at = time.time()
+        self.load_seconds = load_seconds
+
+    def status(self) -> Dict:
+        return {
+            "version": self.version,
+            "slang_entries": len(self.slang),
+            "toxic_keywords": len(self.toxic_keywords),
+            "positive_indicators": len(self.positive_indicators),
+            "loaded_at": self.loaded_at,
+            "load_time_seconds": self.load_seconds,
+        }
+
+
+# ============================================================
+# SOURCES
+# ============================================================
+
+def _read_toxic_file(path: str) -> Dict[str, str]:
+    """`term,level` rows (optional header); unknown levels are skipped."""
+    keywords: Dict[str, str] = {}
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.reader(f):
+            if len(row) < 2 or row[0].strip().startswith("#"):
+                continue
+            term, level = row[0].strip().lower(), row[1].strip().lower()
+            if level not in TOXIC_LEVELS:
+                if term != "term":
+                    logger.warning("Skipping toxic term %r with unknown level %r", term, level)
+                continue
+            keywords[term] = level
+    return keywords
+
+
+def _read_positive_file(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return [ln.strip().lower() for ln in f if ln.strip() and not ln.lstrip().startswith("#")]
+
+
+def _source_paths() -> List[str]:
+    from . import normalizer
+
+    return [p for p in (normalizer.SLANG_PATH, TOXIC_LEXICON_PATH, POSITIVE_LEXICON_PATH) if p]
+
+
+def _fingerprint() -> Tuple:
+    out = []
+    for path in _source_paths():
+        try:
+            st = os.stat(path)
+            out.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            out.append((path, None, None))
+    return tuple(out)
+
+
+def build_snapshot() -> LexiconSnapshot:
+    """Read every lexicon source and compile a new snapshot (does not install it)."""
+    # Imported here: both modules import this one at load time
+    from . import ai_engine, normalizer
+
+    started = time.perf_counter()
+
+    slang = normalizer.read_slang_lexicon()
+    toxic = _read_toxic_file(TOXIC_LEXICON_PATH) if TOXIC_LEXICON_PATH else dict(ai_engine.TOXIC_KEYWORDS)
+    positive = _read_positive_file(POSITIVE_LEXICON_PATH) if POSITIVE_LEXICON_PATH else list(ai_engine.POSITIVE_INDICATORS)
+    friendly = list(ai_engine.FRIENDLY_PATTERNS)
+
+    digest = hashlib.sha256()
+    for key in sorted(slang):
+        digest.update(f"s\0{key}\0{slang[key]}\n".encode("utf-8"))
+    for key in sorted(toxic):
+        digest.update(f"t\0{key}\0{toxic[key]}\n".encode("utf-8"))
+    for term in sorted(set(positive)):
+        digest.update(f"p\0{term}\n".encode("utf-8"))
+    for pattern in friendly:
+        digest.update(f"f\0{pattern}\n".encode("utf-8"))
+
+    matcher = LexiconMatcher(toxic, positive, friendly, ai_engine.LEET_MAP)
+    return LexiconSnapshot(
+        version=digest.hexdigest()[:12],
+        slang=slang,
+        toxic_keywords=toxic,
+        positive_indicators=positive,
+        friendly_patterns=friendly,
+        matcher=matcher,
+        token_memo=normalizer._TokenMemo(slang),
+        load_seconds=round(time.perf_counter() - started, 3),
+    )
+
+
+# ============================================================
+# REGISTRY
+# ============================================================
+
+class LexiconRegistry:
+    """Holds the current snapshot; reloads build a new one and swap it in."""
+
+    def __init__(self):
+        self._current: Optional[LexiconSnapshot] = None
+        self._fingerprint: Optional[Tuple] = None
+        self._build_lock = threading.Lock()
+        self._listeners: List[Callable[[LexiconSnapshot], None]] = []
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def add_listener(self, fn: Callable[[LexiconSnapshot], None]) -> None:
+        """Call `fn(snapshot)` after every swap."""
+        self._listeners.append(fn)
+
+    def peek(self) -> Optional[LexiconSnapshot]:
+        """Current snapshot without triggering a load (None if never loaded)."""
+        return self._current
+
+    def current(self) -> LexiconSnapshot:
+        snapshot = self._current
+        if snapshot is None:
+            with self._build_lock:
+                if self._current is None:
+                    fingerprint = _fingerprint()
+                    self._install(build_snapshot(), fingerprint)
+                snapshot = self._current
+        return snapshot
+
+    def reload(self) -> LexiconSnapshot:
+        """Build a fresh snapshot and swap it in (raises, keeping the old one, on failure)."""
+        with self._build_lock:
+            previous = self._current
+            fingerprint = _fingerprint()
+            self._install(build_snapshot(), fingerprint)
+            snapshot = self._current
+        if previous is not None and previous.version != snapshot.version:
+            logger.info("Lexicon reloaded: %s -> %s", previous.version, snapshot.version)
+        return snapshot
+
+    def reload_in_background(self) -> threading.Thread:
+        def run():
+            try:
+                self.reload()
+            except Exception:
+                logger.exception("Lexicon reload failed; keeping version %s",
+                                 self._current.version if self._current else None)
+
+        thread = threading.Thread(target=run, name="lexicon-reload", daemon=True)
+        thread.start()
+        return thread
+
+    def _install(self, snapshot: LexiconSnapshot, fingerprint: Tuple) -> None:
+        # `fingerprint` is taken before the build, so edits made during a build trigger one more reload
+        self._fingerprint = fingerprint
+        self._current = snapshot
+        logger.info("Lexicon version %s active (%d slang entries, %d toxic keywords)",
+                    snapshot.version, len(snapshot.slang), len(snapshot.toxic_keywords))
+        for fn in self._listeners:
+            fn(snapshot)
+
+    # ---------------- file watcher ----------------
+
+    def changed_on_disk(self) -> bool:
+        return self._fingerprint is not None and _fingerprint() != self._fingerprint
+
+    def start_watching(self, interval: float = WATCH_INTERVAL) -> None:
+        if interval <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        self._stop.clear()
+
+        def watch():
+            while not self._stop.wait(interval):
+                if self.changed_on_disk():
+                    logger.info("Lexicon files changed on disk, reloading...")
+                    try:
+                        self.reload()
+                    except Exception:
+                        logger.exception("Lexicon reload failed; keeping the current version")
+
+        self._watcher = threading.Thread(target=watch, name="lexicon-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+
+
+lexicon_registry = LexiconRegistry()
@@ -0,0 +1,151 @@
+# app/services/matcher.py
+"""
+Compiled lexicon matcher.
+All toxic, positive and friendly lexicons are folded into ONE regex that is
+built once, so a message is scanned in a single pass no matter how many
+terms the lexicons hold.
+"""
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+
+class LexiconHit(NamedTuple):
+    kind: str              # "toxic" | "positive" | "friendly"
+    term: str              # lexicon entry (toxic terms are de-leeted)
+    level: Optional[str]   # toxic level, None for context hits
+    start: int
+    end: int
+
+
+# ============================================================
+# PATTERN BUILDERS
+# ============================================================
+
+def _trie_pattern(terms: Iterable[str], char_pattern) -> str:
+    """
+    Build a prefix-factored alternation from `terms`, e.g.
+    ["sori", "sorry"] -> "sor(?:i|ry)". Python's `re` tries alternatives one
+    by one, so sharing prefixes keeps each position close to O(1) in the
+    lexicon size. Longer terms win over their prefixes.
+    """
+    trie: Dict = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: Dict) -> str:
+        end = "" in node
+        branches = [char_pattern(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if end:
+            return "(?:" + body + ")?"
+        return body
+
+    return emit(trie)
+
+
+def _leet_sources(leet_map: Dict[int, str]) -> Dict[str, Set[str]]:
+    """Map each de-leeted char to the raw chars that translate into it."""
+    sources: Dict[str, Set[str]] = {}
+    for src, dst in leet_map.items():
+        sources.setdefault(dst, set()).add(chr(src))
+    return sources
+
+
+# ============================================================
+# MATCHER
+# ============================================================
+
+class LexiconMatcher:
+    """
+    Finds lexicon hits in lowercased text.
+    - toxic words: whole-word match on the leet-normalized text
+    - toxic phrases (contain a space): substring match on the leet-normalized text
+    - positive indicators: substring match
+    - friendly patterns: regex search
+
+    Leet speak is handled inside the pattern (e.g. "o" -> "[o0]") instead of by
+    translating the message first, so all lexicons share one pass over the
+    same string and spans point into the original message.
+    """
+
+    def __init__(
+        self,
+        toxic_keywords: Dict[str, str],
+        positive_indicators: Iterable[str],
+        friendly_patterns: Iterable[str],
+        leet_map: Dict[int, str],
+    ):
+        self.toxic_keywords = dict(toxic_keywords)
+        self._leet_map = leet_map
+
+        sources = _leet_sources(leet_map)
+        leet_chars = {chr(c) for c in leet_map}
+
+        def leet_char(ch: str) -> str:
+            chars = set(sources.get(ch, ()))
+            if ch not in leet_chars:
+                chars.add(ch)
+            if len(chars) == 1:
+                return re.escape(ch)
+            return "[" + "".join(re.escape(c) for c in sorted(chars)) + "]"
+
+        # Keys containing a leet source char (e.g. "tol0l") can never appear
+        # after de-leeting, so they are dropped rather than compiled.
+        live = [k for k in self.toxic_keywords if not any(c in leet_chars for c in k)]
+        words = [k for k in live if " " not in k]
+        phrases = [k for k in live if " " in k]
+
+        # A de-leeted "word char" is \w or any leet source symbol (@, !, $, +)
+        word_char = "[\\w" + "".join(re.escape(c) for c in sorted(leet_chars)) + "]"
+
+        alternatives = []
+        if words:
+            alternatives.append(
+                ("toxic", rf"(?<!{word_char}){_trie_pattern(words, leet_char)}(?!{word_char})")
+            )
+        if phrases:
+            alternatives.append(("phrase", _trie_pattern(phrases, leet_char)))
+        positives = [p for p in positive_indicators if p]
+        if positives:
+            alternatives.append(("positive", _trie_pattern(positives, re.escape)))
+        friendly = list(friendly_patterns)
+        if friendly:
+            alternatives.append(("friendly", "|".join(f"(?:{p})" for p in friendly)))
+
+        # Zero-width lookaheads: hits may overlap (e.g. "minta maaf" / "maaf").
+        # The leading guard finds positions where any kind matches; then one
+        # optional lookahead per kind captures each of them, so two kinds
+        # starting at the same position (e.g. "seru" and "seru banget") are
+        # both reported. Within a kind the longest term wins.
+        if alternatives:
+            guard = "(?=" + "|".join(body for _, body in alternatives) + ")"
+            captures = "".join(f"(?:(?=(?P<{name}>{body})))?" for name, body in alternatives)
+            self._pattern = re.compile(guard + captures)
+            self._kinds = [name for name, _ in alternatives]
+        else:
+            self._pattern = None
+
+    def scan(self, text: str) -> List[LexiconHit]:
+        """Return every lexicon hit in `text` (case-insensitive), in order."""
+        if not text or self._pattern is None:
+            return []
+
+        lowered = text.lower()
+        hits: List[LexiconHit] = []
+        for m in self._pattern.finditer(lowered):
+            for kind in self._kinds:
+                matched = m.group(kind)
+                if matched is None:
+                    continue
+                start, end = m.span(kind)
+                if kind in ("toxic", "phrase"):
+                    term = matched.translate(self._leet_map)
+                    hits.append(LexiconHit("toxic", term, self.toxic_keywords.get(term), start, end))
+                else:
+                    hits.append(LexiconHit(kind, matched, None, start, end))
+        return hits
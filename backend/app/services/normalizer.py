@@ -1,9 +1,18 @@
 ﻿# app/services/normalizer.py
+import csv
+import difflib
+import hashlib
+import logging
+import marshal
 import os
 import re
-import pandas as pd
-from io import StringIO
-from typing import Dict, Tuple, List
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from .lexicon import LexiconSnapshot, lexicon_registry
+
+logger = logging.getLogger(__name__)
 
 # ============================================================
 # PATH RESOLUTION (FIXED)
@@ -19,6 +28,10 @@ DEFAULT_SLANG_PATH = os.path.join(
 
 SLANG_PATH = os.getenv("SLANG_DATA_PATH", DEFAULT_SLANG_PATH)
 
+# Compiled lexicon cache (marshal), rebuilt whenever the CSV changes
+SLANG_CACHE_PATH = os.getenv("SLANG_CACHE_PATH", SLANG_PATH + ".cache")
+_CACHE_FORMAT = 1
+
 # ============================================================
 # GLOBAL CACHES
 # ============================================================
@@ -26,6 +39,8 @@ SLANG_PATH = os.getenv("SLANG_DATA_PATH", DEFAULT_SLANG_PATH)
 slang_dict: Dict[str, str] = {}
 slang_meta: Dict[str, Dict] = {}
 _slang_loaded: bool = False  # 🔥 guard flag
+_slang_meta_loaded: bool = False
+slang_load_seconds: Optional[float] = None
 
 
 # ============================================================
@@ -33,121 +48,270 @@ _slang_loaded: bool = False  # 🔥 guard flag
 # ============================================================
 
 def _truthy(val) -> bool:
-    if pd.isna(val):
+    if val is None:
         return False
     if isinstance(val, (int, float)):
-        return int(val) != 0
-    return str(val).strip().lower() in {"1", "true", "yes", "y", "t"}
+        return val == val and int(val) != 0  # NaN → False
+    v = str(val).strip().lower()
+    if v in {"", "nan", "none"}:
+        return False
+    try:
+        return float(v) != 0
+    except ValueError:
+        return v in {"true", "yes", "y", "t"}
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
 
 
 # ============================================================
-# LOAD SLANG DICTIONARY (SAFE & EXPLICIT)
+# CSV PARSER (csv module, no pandas)
 # ============================================================
 
-def load_slang_dict(force_reload: bool = False) -> Tuple[Dict[str, str], Dict[str, Dict]]:
-    """
-    Load slang dictionary safely.
-    - Uses absolute path
-    - Can be force reloaded
-    - No silent failure
-    """
-    global slang_dict, slang_meta, _slang_loaded
+def _parse_slang_csv(path: str) -> Tuple[Dict[str, str], Dict[str, Dict]]:
+    """Build (slang → formal, slang → meta) from the lexicon CSV."""
+    new_dict: Dict[str, str] = {}
+    new_meta: Dict[str, Dict] = {}
+
+    with open(path, "r", encoding="utf-8", errors="ignore", newline="") as f:
+        reader = csv.reader(f)
+        header = [c.strip().lstrip("\ufeff").lower() for c in next(reader, [])]
+        if len(header) < 2:
+            raise ValueError(f"[Normalizer] Slang CSV needs at least 2 columns: {path}")
+
+        slang_idx = header.index("slang") if "slang" in header else 0
+        formal_idx = header.index("formal") if "formal" in header else 1
+        in_dict_idx = next(
+            (i for i, c in enumerate(header) if c.replace("-", "_") == "in_dictionary"),
+            None,
+        )
+        category_idx = [i for i, c in enumerate(header) if c.startswith("category")]
+        context_idx = header.index("context") if "context" in header else None
 
-    if _slang_loaded and not force_reload:
-        return slang_dict, slang_meta
+        for row in reader:
+            if len(row) < len(header):
+                row = row + [""] * (len(header) - len(row))
 
-    slang_dict = {}
-    slang_meta = {}
+            slang = row[slang_idx].strip().lower()
+            if not slang:
+                continue
+
+            if in_dict_idx is not None and not _truthy(row[in_dict_idx]):
+                continue
+
+            # An empty "formal" keeps the word as it is (pandas used to turn it into "nan")
+            new_dict[slang] = row[formal_idx].strip().lower() or slang
+
+            meta = {}
+            if context_idx is not None:
+                meta["context"] = row[context_idx] or None
+
+            cats = [
+                row[i].strip() for i in category_idx
+                if row[i].strip() and row[i].strip().lower() not in {"0", "nan", "none"}
+            ]
+            if cats:
+                meta["categories"] = cats
+
+            new_meta[slang] = meta
+
+    return new_dict, new_meta
 
+
+# ============================================================
+# COMPILED CACHE
+# ============================================================
+# Layout: three consecutive marshal records — header, slang_dict, slang_meta —
+# so the dict can be loaded without paying for the (larger) meta record.
+
+def _cache_header(path: str, sha256: Optional[str] = None) -> Dict[str, Any]:
+    st = os.stat(path)
+    return {
+        "format": _CACHE_FORMAT,
+        "python": sys.version_info[:2],
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "sha256": sha256 or _file_sha256(path),
+    }
+
+
+def _cache_is_fresh(cached: Dict[str, Any], path: str) -> bool:
+    if cached.get("format") != _CACHE_FORMAT or tuple(cached.get("python", ())) != sys.version_info[:2]:
+        return False
+    st = os.stat(path)
+    if cached.get("mtime_ns") == st.st_mtime_ns and cached.get("size") == st.st_size:
+        return True
+    # Touched but maybe unchanged (e.g. git checkout): fall back to the content hash
+    return cached.get("size") == st.st_size and cached.get("sha256") == _file_sha256(path)
+
+
+def _read_cache(path: str, with_meta: bool):
+    """Return (dict, meta or None) from the compiled cache, or None if missing/stale."""
+    try:
+        with open(SLANG_CACHE_PATH, "rb") as f:
+            header = marshal.load(f)
+            if not isinstance(header, dict) or not _cache_is_fresh(header, path):
+                return None
+            new_dict = marshal.load(f)
+            new_meta = marshal.load(f) if with_meta else None
+        return new_dict, new_meta
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def _write_cache(path: str, new_dict: Dict[str, str], new_meta: Dict[str, Dict]) -> None:
+    tmp = f"{SLANG_CACHE_PATH}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            marshal.dump(_cache_header(path), f)
+            marshal.dump(new_dict, f)
+            marshal.dump(new_meta, f)
+        os.replace(tmp, SLANG_CACHE_PATH)
+    except OSError as e:
+        logger.warning("[Normalizer] Could not write slang cache %s: %s", SLANG_CACHE_PATH, e)
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+# ============================================================
+# LOAD SLANG DICTIONARY (SAFE & EXPLICIT)
+# ============================================================
+
+def _read_slang_lexicon(with_meta: bool) -> Tuple[Dict[str, str], Optional[Dict[str, Dict]]]:
+    """Read (slang_dict, slang_meta or None) from the compiled cache or the CSV."""
     if not os.path.exists(SLANG_PATH):
         raise FileNotFoundError(
             f"[Normalizer] Slang CSV not found: {SLANG_PATH}"
         )
 
-    with open(SLANG_PATH, "r", encoding="utf-8", errors="ignore") as f:
-        csv_text = f.read()
+    started = time.perf_counter()
+    source = "cache"
+    cached = _read_cache(SLANG_PATH, with_meta)
+    if cached is not None:
+        new_dict, new_meta = cached
+    else:
+        source = "csv"
+        new_dict, new_meta = _parse_slang_csv(SLANG_PATH)
+        _write_cache(SLANG_PATH, new_dict, new_meta)
 
-    df = pd.read_csv(StringIO(csv_text), sep=",", engine="python")
-    df.columns = [c.strip().lower() for c in df.columns]
+    elapsed = round(time.perf_counter() - started, 3)
+    logger.info("[Normalizer] Loaded %d slang entries from %s (%s, %.3fs)", len(new_dict), SLANG_PATH, source, elapsed)
+    return new_dict, new_meta
 
-    slang_col = "slang" if "slang" in df.columns else df.columns[0]
-    formal_col = "formal" if "formal" in df.columns else df.columns[1]
-    in_dict_col = next(
-        (c for c in df.columns if c.replace("-", "_") == "in_dictionary"),
-        None,
-    )
 
-    category_cols = [c for c in df.columns if c.startswith("category")]
-    context_col = "context" if "context" in df.columns else None
+def read_slang_lexicon() -> Dict[str, str]:
+    """Slang → formal map straight from disk (used to build lexicon snapshots)."""
+    return _read_slang_lexicon(with_meta=False)[0]
 
-    for _, row in df.iterrows():
-        slang = str(row.get(slang_col, "")).strip().lower()
-        if not slang:
-            continue
 
-        in_dict = row.get(in_dict_col, 1) if in_dict_col else 1
-        if not _truthy(in_dict):
-            continue
+def _on_lexicon_swap(snapshot: LexiconSnapshot) -> None:
+    """Keep the module-level compatibility globals in sync with the active snapshot."""
+    global slang_dict, slang_meta, _slang_loaded, _slang_meta_loaded, slang_load_seconds
+
+    slang_dict = snapshot.slang
+    slang_meta = {}
+    _slang_meta_loaded = False
+    _slang_loaded = True
+    slang_load_seconds = snapshot.load_seconds
 
-        formal = str(row.get(formal_col, slang)).strip().lower()
-        slang_dict[slang] = formal
 
-        meta = {}
-        if context_col:
-            meta["context"] = row.get(context_col)
+lexicon_registry.add_listener(_on_lexicon_swap)
 
-        cats: List[str] = []
-        for c in category_cols:
-            v = row.get(c)
-            if pd.notna(v) and str(v).strip() not in {"0", "nan", "none"}:
-                cats.append(str(v).strip())
 
-        if cats:
-            meta["categories"] = cats
+def load_slang_dict(force_reload: bool = False, with_meta: bool = True) -> Tuple[Dict[str, str], Dict[str, Dict]]:
+    """
+    Load slang dictionary safely.
+    - Uses absolute path
+    - Can be force reloaded (builds and swaps in a new lexicon snapshot)
+    - No silent failure
+    - Served from the compiled cache when the CSV is unchanged
+    - with_meta=False skips slang_meta (loaded later on demand)
+    """
+    global slang_meta, _slang_meta_loaded
 
-        slang_meta[slang] = meta
+    if force_reload:
+        lexicon_registry.reload()
+    else:
+        lexicon_registry.current()
 
-    _slang_loaded = True
-    print(f"[Normalizer] Loaded {len(slang_dict)} slang entries from {SLANG_PATH}")
+    if with_meta and not _slang_meta_loaded:
+        slang_meta = _read_slang_lexicon(with_meta=True)[1]
+        _slang_meta_loaded = True
     return slang_dict, slang_meta
 
 
+def lexicon_status() -> Dict[str, Any]:
+    """Load state of the lexicons (for readiness checks)."""
+    snapshot = lexicon_registry.peek()
+    return {
+        "loaded": snapshot is not None,
+        "entries": len(snapshot.slang) if snapshot else 0,
+        "path": SLANG_PATH,
+        "load_time_seconds": snapshot.load_seconds if snapshot else None,
+        "version": snapshot.version if snapshot else None,
+    }
+
+
 # ============================================================
 # NORMALIZATION
 # ============================================================
 
+_EDGE_PUNCT_RE = re.compile(r"^\W+|\W+$")
+_REPEATED_CHARS_RE = re.compile(r"(.)\1{2,}")
+
+# Distinct raw tokens remembered per lexicon before the memo is reset
+TOKEN_MEMO_SIZE = int(os.getenv("NORMALIZER_MEMO_SIZE", "100000"))
+
+
 def dedupe_repeated_chars(word: str) -> str:
-    return re.sub(r"(.)\1{2,}", r"\1", word)
+    return _REPEATED_CHARS_RE.sub(r"\1", word)
+
+
+class _TokenMemo(dict):
+    """
+    raw token → normalized token, computed on first sight (__missing__).
+    Chat logs reuse a small vocabulary, so after warm-up most tokens are a
+    single dict hit. Each memo is tied to one slang dict and is replaced
+    (never mutated) when the lexicon is reloaded.
+    """
+
+    def __init__(self, slang: Dict[str, str]):
+        super().__init__()
+        self.slang = slang
+
+    def __missing__(self, word: str) -> str:
+        clean = dedupe_repeated_chars(_EDGE_PUNCT_RE.sub("", word).lower())
+        clean = self.slang.get(clean, clean)
+        if len(self) >= TOKEN_MEMO_SIZE:
+            self.clear()
+        self[word] = clean
+        return clean
 
 
-def normalize_text(text: str) -> str:
+def normalize_text(text: str, lexicon: Optional[LexiconSnapshot] = None) -> str:
     """
     Normalize chat text:
     - lowercase
     - remove edge punctuation
     - dedupe repeated chars
-    - slang → formal mapping
+    - slang → formal mapping (from `lexicon`, default: the active snapshot)
     """
     if not text:
         return ""
 
-    # ENSURE SLANG LOADED
-    if not _slang_loaded:
-        load_slang_dict()
-
-    words = text.split()
-    out = []
-
-    for w in words:
-        clean = re.sub(r"^[^\w]+|[^\w]+$", "", w).lower()
-        clean = dedupe_repeated_chars(clean)
+    memo = (lexicon or lexicon_registry.current()).token_memo
+    return " ".join([memo[w] for w in text.split()])
 
-        if clean in slang_dict:
-            out.append(slang_dict[clean])
-        else:
-            out.append(clean)
 
-    return " ".join(out)
+def normalize_many(texts: List[str], lexicon: Optional[LexiconSnapshot] = None) -> List[str]:
+    """normalize_text() for a batch of messages (one lexicon snapshot for all)."""
+    memo = (lexicon or lexicon_registry.current()).token_memo
+    return [" ".join([memo[w] for w in t.split()]) if t else "" for t in texts]
 
 
 # ============================================================
@@ -158,18 +322,20 @@ TIMESTAMP_PATTERN = r"(\d{1,2}[:.]\d{2}(?:[:.]\d{2})?)"
 SENDER_MSG_PATTERN = rf"^{TIMESTAMP_PATTERN}\s*-?\s*(.*?)\s*:\s*(.*)$"
 
 
-def parse_chat_log(raw_text: str):
+def iter_chat_log(raw_text: str, lexicon: Optional[LexiconSnapshot] = None) -> Iterator[Dict[str, Any]]:
     """
-    Parse chat logs into structured messages.
+    Parse chat logs into structured messages, lazily (one message at a time)
+    so callers can start analyzing before the whole log is parsed.
+    The whole log is normalized with one lexicon snapshot.
     """
     if not raw_text:
-        return []
+        return
+
+    lexicon = lexicon or lexicon_registry.current()
 
-    lines = raw_text.splitlines()
-    parsed = []
     msg_id = 1
 
-    for ln in lines:
+    for ln in raw_text.splitlines():
         ln = ln.strip()
         if not ln:
             continue
@@ -188,16 +354,95 @@ def parse_chat_log(raw_text: str):
                 sender = "Unknown"
                 msg = ln
 
-        normalized = normalize_text(msg)
+        normalized = normalize_text(msg, lexicon)
 
-        parsed.append({
+        yield {
             "id": msg_id,
             "timestamp": timestamp,
             "sender": sender.strip(),
             "raw_text": msg.strip(),
             "normalized_text": normalized,
-        })
+        }
 
         msg_id += 1
 
-    return parsed
+
+def parse_chat_log(raw_text: str, lexicon: Optional[LexiconSnapshot] = None) -> List[Dict[str, Any]]:
+    """
+    Parse chat logs into structured messages.
+    """
+    return list(iter_chat_log(raw_text, lexicon))
+
+
+# ============================================================
+# SCREENSHOT OVERLAP MERGE
+# ============================================================
+
+_LINE_KEY_RE = re.compile(r"[\W_]+")
+
+# Lines cut off at a screenshot edge that may be skipped when aligning
+OVERLAP_EDGE_LINES = 1
+# Overlaps shorter than this (in key characters) are treated as coincidence
+OVERLAP_MIN_CHARS = 8
+# Two OCR'd lines count as the same line from this similarity ratio up
+OVERLAP_SIMILARITY = 0.85
+
+
+def _line_key(line: str) -> str:
+    """Comparison key that ignores case, spacing and punctuation (OCR jitter)."""
+    return _LINE_KEY_RE.sub("", line.lower())
+
+
+def _lines_match(a: str, b: str) -> bool:
+    if a == b:
+        return True
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    return matcher.quick_ratio() >= OVERLAP_SIMILARITY and matcher.ratio() >= OVERLAP_SIMILARITY
+
+
+def _find_overlap(prev: List[str], nxt: List[str]) -> Optional[Tuple[int, int, int]]:
+    """
+    Longest (drop_prev, skip_next, length) such that the last `length` lines of
+    prev (ignoring its last `drop_prev` lines) match the first `length` lines of
+    nxt (ignoring its first `skip_next` lines).
+    """
+    best = None
+    for drop_prev in range(OVERLAP_EDGE_LINES + 1):
+        end = len(prev) - drop_prev
+        for skip_next in range(OVERLAP_EDGE_LINES + 1):
+            for length in range(min(end, len(nxt) - skip_next), 0, -1):
+                if best is not None and length <= best[2]:
+                    break
+                head = nxt[skip_next:skip_next + length]
+                if sum(map(len, head)) >= OVERLAP_MIN_CHARS \
+                        and all(map(_lines_match, prev[end - length:end], head)):
+                    best = (drop_prev, skip_next, length)
+                    break
+    return best
+
+
+def merge_overlapping_lines(texts: List[str]) -> Tuple[str, int]:
+    """
+    Join OCR text of consecutive screenshots, dropping the lines that appear
+    at the bottom of one screenshot and again at the top of the next (of each
+    matched pair the longer, i.e. less cut-off, line is kept).
+    Returns (merged_text, removed_line_count).
+    """
+    merged: List[str] = []
+    removed = 0
+    for text in texts:
+        lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+        overlap = _find_overlap([_line_key(ln) for ln in merged], [_line_key(ln) for ln in lines])
+        if overlap is None:
+            merged.extend(lines)
+            continue
+        drop_prev, skip_next, length = overlap
+        if drop_prev:
+            del merged[-drop_prev:]
+        start = len(merged) - length
+        for i, line in enumerate(lines[skip_next:skip_next + length]):
+            if len(line) > len(merged[start + i]):
+                merged[start + i] = line
+        merged.extend(lines[skip_next + length:])
+        removed += drop_prev + skip_next + length
+    return "\n".join(merged), removed
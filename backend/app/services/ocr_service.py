@@ -1,9 +1,22 @@
 ﻿# app/services/ocr_service.py
+import abc
+import hashlib
+import logging
 import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, Union
+
 import numpy as np
 import cv2
 import pytesseract
 
+from .cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
 # Configure tesseract command
 # Try to get from environment variable, fallback to common Windows path
 TESSERACT_CMD = os.getenv(
@@ -20,36 +33,576 @@ else:
     print("Attempting to use system PATH...")
 
 
+# ============================================================
+# PREPROCESSING PROFILES
+# ============================================================
+# - max_width:     downscale wider images to this width first (None = keep)
+# - clean_noise:   estimated noise sigma below which denoising is skipped
+# - nlm_noise:     sigma from which NL-means is used (between the two: median blur)
+# - search_window: NL-means search window (cost grows with its square)
+OCR_PROFILES: Dict[str, Dict[str, Any]] = {
+    "fast":     {"max_width": 1080, "clean_noise": 3.0, "nlm_noise": None, "search_window": 0},
+    "balanced": {"max_width": 1440, "clean_noise": 2.0, "nlm_noise": 6.0,  "search_window": 11},
+    "quality":  {"max_width": None, "clean_noise": 0.0, "nlm_noise": 0.0,  "search_window": 21},
+}
+OCR_PROFILE = os.getenv("OCR_PROFILE", "balanced").strip().lower()
+if OCR_PROFILE not in OCR_PROFILES:
+    logger.warning("Unknown OCR_PROFILE %r, using 'balanced'", OCR_PROFILE)
+    OCR_PROFILE = "balanced"
 
-def preprocess_image(image_bytes: bytes):
-    nparr = np.frombuffer(image_bytes, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+# Laplacian-style kernel for noise estimation (sum of squares = 36)
+_NOISE_KERNEL = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+_NOISE_SAMPLE_PIXELS = 512 * 512
 
+# Pixels differing from the background by more than this count as content
+_CONTENT_DELTA = 12
+_CROP_PADDING = 8
+
+
+def _decode(image_bytes: bytes) -> np.ndarray:
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    img = cv2.imdecode(nparr, cv2.IMREAD_GRAYSCALE)
     if img is None:
         raise ValueError("Failed to decode image bytes - unsupported format or corrupted file")
+    return img
+
+
+def _downscale(gray: np.ndarray, max_width: Optional[int]) -> np.ndarray:
+    h, w = gray.shape
+    if not max_width or w <= max_width:
+        return gray
+    scale = max_width / w
+    return cv2.resize(gray, (max_width, max(1, int(round(h * scale)))), interpolation=cv2.INTER_AREA)
+
+
+def crop_to_content(gray: np.ndarray) -> np.ndarray:
+    """Trim uniform margins (background colour = median of the border pixels)."""
+    border = np.concatenate((gray[0], gray[-1], gray[:, 0], gray[:, -1]))
+    background = int(np.median(border))
+    mask = cv2.absdiff(gray, np.full_like(gray, background)) > _CONTENT_DELTA
+
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if rows.size == 0 or cols.size == 0:
+        return gray
+
+    top = max(0, rows[0] - _CROP_PADDING)
+    bottom = min(gray.shape[0], rows[-1] + 1 + _CROP_PADDING)
+    left = max(0, cols[0] - _CROP_PADDING)
+    right = min(gray.shape[1], cols[-1] + 1 + _CROP_PADDING)
+    return gray[top:bottom, left:right]
+
+
+def estimate_noise(gray: np.ndarray) -> float:
+    """
+    Robust estimate of the Gaussian noise sigma (median absolute deviation of
+    a Laplacian-like response). Flat background dominates the median, so text
+    edges in clean screenshots barely move it while sensor/JPEG noise does.
+    Large images are estimated on a strided sample.
+    """
+    stride = max(1, int(np.sqrt(gray.size / _NOISE_SAMPLE_PIXELS)))
+    sample = gray[::stride, ::stride]
+    if min(sample.shape) < 3:
+        return 0.0
+    response = cv2.filter2D(sample.astype(np.float32), -1, _NOISE_KERNEL, borderType=cv2.BORDER_REFLECT)
+    return float(1.4826 * np.median(np.abs(response)) / 6.0)
+
+
+def _denoise(gray: np.ndarray, noise: float, settings: Dict[str, Any]) -> Tuple[np.ndarray, str]:
+    if noise < settings["clean_noise"]:
+        return gray, "none"
+    nlm_noise = settings["nlm_noise"]
+    if nlm_noise is None or noise < nlm_noise:
+        return cv2.medianBlur(gray, 3), "median"
+    window = settings["search_window"]
+    return cv2.fastNlMeansDenoising(gray, None, h=10, templateWindowSize=7, searchWindowSize=window), f"nlmeans-{window}"
+
+
+def _resolve_profile(profile: Optional[str]) -> str:
+    profile = profile or OCR_PROFILE
+    if profile not in OCR_PROFILES:
+        raise ValueError(f"Unknown OCR profile: {profile!r}")
+    return profile
+
+
+def preprocess_image(
+    image: Union[bytes, np.ndarray],
+    profile: Optional[str] = None,
+    report: Optional[Dict[str, Any]] = None,
+):
+    """
+    Decode → crop margins → downscale → dark-mode invert → (adaptive) denoise → Otsu.
+    `image` is encoded image bytes or an already decoded grayscale array.
+    `profile` picks an entry of OCR_PROFILES (default OCR_PROFILE); pass a dict
+    as `report` to receive the noise estimate, denoise choice and per-stage timings (ms).
+    """
+    profile = _resolve_profile(profile)
+    settings = OCR_PROFILES[profile]
+    timings: Dict[str, float] = {}
+    mark = time.perf_counter()
+
+    def lap(stage: str) -> None:
+        nonlocal mark
+        now = time.perf_counter()
+        timings[stage] = round((now - mark) * 1000, 1)
+        mark = now
+
+    if isinstance(image, np.ndarray):
+        gray = image
+    else:
+        gray = _decode(image)
+        lap("decode")
+    original_shape = gray.shape
+
+    gray = crop_to_content(gray)
+    gray = _downscale(gray, settings["max_width"])
+    lap("resize")
 
     # Detect dark-mode heuristically (mean pixel value)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    mean_val = gray.mean()
-    if mean_val < 80:
+    if gray.mean() < 80:
         # invert if dark background
         gray = cv2.bitwise_not(gray)
 
-    # denoise -> threshold
-    denoised = cv2.fastNlMeansDenoising(gray, None, h=10, templateWindowSize=7, searchWindowSize=21)
+    noise = estimate_noise(gray)
+    lap("estimate_noise")
+
+    denoised, method = _denoise(gray, noise, settings)
+    lap("denoise")
+
     _, thresh = cv2.threshold(denoised, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    lap("threshold")
 
+    if report is not None:
+        report.update({
+            "profile": profile,
+            "input_size": [original_shape[1], original_shape[0]],
+            "ocr_size": [thresh.shape[1], thresh.shape[0]],
+            "noise": round(noise, 2),
+            "denoise": method,
+            "timings_ms": timings,
+        })
     return thresh
 
 
-def extract_text_from_image(image_bytes: bytes) -> str:
-    processed = preprocess_image(image_bytes)
+# ============================================================
+# TILED OCR (tall screenshots)
+# ============================================================
+# Tall images are cut into horizontal bands at blank rows between chat
+# bubbles and the bands are OCR'd concurrently. Each pytesseract call runs
+# its own tesseract process, so threads are enough to use every core.
+OCR_TILING = os.getenv("OCR_TILING", "auto").strip().lower()           # auto | on | off
+OCR_TILE_MIN_HEIGHT = int(os.getenv("OCR_TILE_MIN_HEIGHT", "1600"))    # "auto": tile only taller images
+OCR_TILE_HEIGHT = int(os.getenv("OCR_TILE_HEIGHT", "600"))             # minimum band height (px)
+OCR_TILE_MIN_GAP = int(os.getenv("OCR_TILE_MIN_GAP", "6"))             # blank rows needed for a cut
+OCR_TILE_WORKERS = int(os.getenv("OCR_TILE_WORKERS", str(os.cpu_count() or 1)))
+
+_tile_executor: Optional[ThreadPoolExecutor] = None
+_tile_executor_lock = threading.Lock()
+
+
+def _get_tile_executor() -> ThreadPoolExecutor:
+    global _tile_executor
+    if _tile_executor is None:
+        with _tile_executor_lock:
+            if _tile_executor is None:
+                _tile_executor = ThreadPoolExecutor(max_workers=max(1, OCR_TILE_WORKERS), thread_name_prefix="ocr-tile")
+    return _tile_executor
+
+
+def split_into_bands(binary: np.ndarray, min_height: int = OCR_TILE_HEIGHT, min_gap: int = OCR_TILE_MIN_GAP) -> List[Tuple[int, int]]:
+    """
+    (top, bottom) row ranges covering `binary` (dark text on white), cut in
+    the middle of runs of at least `min_gap` blank rows so no text line is
+    split. Bands are at least `min_height` tall (except possibly the last,
+    which is merged into its predecessor when too short).
+    """
+    height = binary.shape[0]
+    blank = np.concatenate(([False], (binary == 0).sum(axis=1) == 0, [False]))
+    edges = np.flatnonzero(np.diff(blank.astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+    long_gaps = (ends - starts) >= min_gap
+    cuts = (starts[long_gaps] + ends[long_gaps]) // 2
+
+    bands: List[Tuple[int, int]] = []
+    top = 0
+    for cut in cuts:
+        if cut - top >= min_height:
+            bands.append((top, int(cut)))
+            top = int(cut)
+    if bands and height - top < min_height // 2:
+        bands[-1] = (bands[-1][0], height)
+    else:
+        bands.append((top, height))
+    return bands
+
+
+def _should_tile(binary: np.ndarray, tiled: Optional[bool]) -> bool:
+    if tiled is not None:
+        return tiled
+    if OCR_TILING == "on":
+        return True
+    if OCR_TILING == "off":
+        return False
+    return binary.shape[0] >= OCR_TILE_MIN_HEIGHT
+
+
+# ============================================================
+# OCR ENGINES
+# ============================================================
+OCR_ENGINE = os.getenv("OCR_ENGINE", "auto").strip().lower()          # auto | tesserocr | pytesseract
+OCR_ENGINE_WORKERS = int(os.getenv("OCR_ENGINE_WORKERS", str(OCR_TILE_WORKERS)))
+OCR_PREFERRED_LANG = "ind"
+TESSERACT_CONFIG = r"--oem 3 --psm 6"
+
+
+class OCREngine(abc.ABC):
+    """Turns a preprocessed (binary, grayscale) image into text."""
+
+    name = "base"
+
+    def __init__(self, lang: Optional[str]):
+        self.lang = lang  # None = Tesseract's default language
+
+    @abc.abstractmethod
+    def image_to_text(self, image: np.ndarray) -> str:
+        ...
+
+    def status(self) -> Dict[str, Any]:
+        return {"engine": self.name, "lang": self.lang}
+
+    def close(self) -> None:
+        pass
+
+
+class PytesseractEngine(OCREngine):
+    """One `tesseract` subprocess per call (the language is resolved once, up front)."""
+
+    name = "pytesseract"
+
+    @staticmethod
+    def available_languages() -> List[str]:
+        return pytesseract.get_languages(config="")
+
+    def image_to_text(self, image: np.ndarray) -> str:
+        if self.lang:
+            try:
+                return pytesseract.image_to_string(image, config=TESSERACT_CONFIG, lang=self.lang) or ""
+            except pytesseract.TesseractError as e:
+                # e.g. the language was never listed, or its traineddata went away since
+                logger.warning("Tesseract failed with lang=%r (%s); retrying with the default language",
+                               self.lang, e)
+        return pytesseract.image_to_string(image, config=TESSERACT_CONFIG) or ""
+
+
+class TesserocrEngine(OCREngine):
+    """
+    Pool of long-lived in-process Tesseract instances (tesserocr / C API).
+    Language data is loaded once per instance; instances are created on demand
+    up to `size` and each is used by one thread at a time.
+    Requires `tesserocr`.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self, lang: Optional[str], size: int):
+        super().__init__(lang)
+        import tesserocr
+
+        self._tesserocr = tesserocr
+        self.size = max(1, size)
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()  # None = closed, wakes waiting threads
+        self._instances: set = set()  # every live instance, idle or checked out
+        self._closed = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def available_languages() -> List[str]:
+        import tesserocr
+
+        return tesserocr.get_languages()[1]
+
+    def _new_api(self):
+        kwargs = {"psm": self._tesserocr.PSM.SINGLE_BLOCK, "oem": self._tesserocr.OEM.DEFAULT}
+        if self.lang:
+            kwargs["lang"] = self.lang
+        return self._tesserocr.PyTessBaseAPI(**kwargs)
+
+    def _acquire(self):
+        try:
+            api = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("OCR engine is closed")
+                if len(self._instances) < self.size:
+                    api = self._new_api()
+                    self._instances.add(api)
+                    return api
+            api = self._idle.get()
+        if api is None:
+            self._idle.put(None)  # pass the wake-up on to the next waiting thread
+            raise RuntimeError("OCR engine is closed")
+        return api
+
+    def _release(self, api) -> None:
+        api.Clear()
+        with self._lock:
+            if not self._closed:
+                self._idle.put(api)
+                return
+        self._end(api)  # came back after close()
+
+    def _end(self, api) -> None:
+        with self._lock:
+            self._instances.discard(api)
+        api.End()
+
+    def image_to_text(self, image: np.ndarray) -> str:
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        height, width = image.shape[:2]
+        api = self._acquire()
+        try:
+            api.SetImageBytes(image.tobytes(), width, height, 1, width)
+            return api.GetUTF8Text() or ""
+        finally:
+            self._release(api)
+
+    def status(self) -> Dict[str, Any]:
+        return {**super().status(), "workers": len(self._instances), "max_workers": self.size}
+
+    def close(self) -> None:
+        """End idle instances now and checked-out ones when their thread releases them."""
+        idle = []
+        with self._lock:
+            self._closed = True
+            while True:
+                try:
+                    api = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if api is not None:
+                    idle.append(api)
+            self._idle.put(None)
+        for api in idle:
+            self._end(api)
+
+
+def _pick_language(available: List[str]) -> Optional[str]:
+    if OCR_PREFERRED_LANG in available:
+        return OCR_PREFERRED_LANG
+    logger.warning("Tesseract language %r not installed (have: %s); using the default language",
+                   OCR_PREFERRED_LANG, ", ".join(available) or "none")
+    return None
+
+
+def create_ocr_engine(kind: str = OCR_ENGINE) -> OCREngine:
+    """Build the configured engine and detect the OCR language once."""
+    if kind not in ("auto", "tesserocr", "pytesseract"):
+        raise ValueError(f"Unknown OCR_ENGINE: {kind!r} (expected auto, tesserocr or pytesseract)")
+
+    if kind in ("auto", "tesserocr"):
+        try:
+            lang = _pick_language(TesserocrEngine.available_languages())
+            return TesserocrEngine(lang, OCR_ENGINE_WORKERS)
+        except ImportError:
+            if kind == "tesserocr":
+                raise
+            logger.info("tesserocr not installed; OCR falls back to one tesseract process per call")
 
-    custom_config = r"--oem 3 --psm 6"
     try:
-        text = pytesseract.image_to_string(processed, config=custom_config, lang="ind")
-    except Exception:
-        # fallback to default language
-        text = pytesseract.image_to_string(processed, config=custom_config)
+        lang = _pick_language(PytesseractEngine.available_languages())
+    except Exception as e:
+        logger.warning("Could not list Tesseract languages (%s); trying %r per call", e, OCR_PREFERRED_LANG)
+        lang = OCR_PREFERRED_LANG
+    return PytesseractEngine(lang)
+
+
+_ocr_engine: Optional[OCREngine] = None
+_ocr_engine_lock = threading.Lock()
+
+
+def get_ocr_engine() -> OCREngine:
+    global _ocr_engine
+    if _ocr_engine is None:
+        with _ocr_engine_lock:
+            if _ocr_engine is None:
+                _ocr_engine = create_ocr_engine()
+                logger.info("OCR engine ready: %s", _ocr_engine.status())
+    return _ocr_engine
+
+
+def shutdown_ocr() -> None:
+    """Release the OCR workers and the tile thread pool."""
+    global _ocr_engine, _tile_executor
+    with _ocr_engine_lock:
+        if _ocr_engine is not None:
+            _ocr_engine.close()
+            _ocr_engine = None
+    with _tile_executor_lock:
+        if _tile_executor is not None:
+            _tile_executor.shutdown(wait=False, cancel_futures=True)
+            _tile_executor = None
+
+
+# ============================================================
+# OCR
+# ============================================================
+
+def _ocr(image: np.ndarray) -> str:
+    return get_ocr_engine().image_to_text(image)
+
+
+def _ocr_tiled(binary: np.ndarray) -> Tuple[str, int]:
+    bands = split_into_bands(binary)
+    if len(bands) == 1:
+        return _ocr(binary), 1
+    texts = _get_tile_executor().map(_ocr, [binary[top:bottom] for top, bottom in bands])
+    return "\n".join(t.strip("\n") for t in texts if t.strip()), len(bands)
+
+
+# ============================================================
+# OCR RESULT CACHE (repeated uploads of the same screenshot)
+# ============================================================
+# One entry per screenshot, keyed by the sha256 of the uploaded bytes (same
+# file uploaded again): (text, report fields, thumbnail or None).
+# With OCR_CACHE_PHASH, ocr_phash_index also maps a coarse dHash of the
+# decoded image to that key, to catch the same screenshot re-encoded (e.g. by
+# a messenger). The dHash only finds a candidate: on 32 columns a
+# one-character edit can leave it unchanged, so a perceptual hit is confirmed
+# against the entry's thumbnail (VERIFY_WIDTH x at most VERIFY_MAX_ROWS, so
+# <= 128 KB per screenshot). Re-encoding moves its pixels by a few grey
+# levels at most; a changed character moves some by far more.
+OCR_CACHE_SIZE = int(os.getenv("OCR_CACHE_SIZE", "512"))   # screenshots (0 = off)
+OCR_CACHE_PHASH = os.getenv("OCR_CACHE_PHASH", "0").strip().lower() in {"1", "true", "yes"}
+DHASH_WIDTH = 32
+VERIFY_WIDTH = 256
+VERIFY_MAX_ROWS = 512
+VERIFY_MAX_DIFF = 32  # grey levels
+
+ocr_cache = LRUCache(OCR_CACHE_SIZE)
+ocr_phash_index = LRUCache(OCR_CACHE_SIZE)  # dHash key -> ocr_cache key
+
+# Report fields that describe the cached result rather than this request
+_CACHED_REPORT_FIELDS = ("input_size", "ocr_size", "noise", "denoise", "engine", "tiles")
+
+
+def _grid(gray: np.ndarray, width: int, max_rows: int) -> np.ndarray:
+    # Height follows the aspect ratio up to max_rows, so tall screenshots keep their lines apart
+    h, w = gray.shape[:2]
+    rows = int(min(max_rows, max(8, round(width * h / w))))
+    return cv2.resize(gray, (width, rows), interpolation=cv2.INTER_AREA)
+
+
+def image_dhash(gray: np.ndarray) -> Tuple[int, int]:
+    """
+    Difference hash on a DHASH_WIDTH-wide grid whose height follows the
+    aspect ratio. Returns (grid_rows, hash_bits).
+    """
+    small = _grid(gray, DHASH_WIDTH + 1, 1024)
+    bits = small[:, 1:] > small[:, :-1]
+    return small.shape[0], int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def _same_picture(a: np.ndarray, b: np.ndarray) -> bool:
+    if a.shape != b.shape:
+        return False
+    return int(np.abs(a.astype(np.int16) - b).max()) <= VERIFY_MAX_DIFF
+
+
+def _cache_hit(
+    text: str,
+    cached_report: Dict[str, Any],
+    report: Dict[str, Any],
+    profile: str,
+    how: str,
+    timings: Dict[str, float],
+) -> str:
+    # Same fields as a miss; stages that were skipped report 0 ms
+    report.update(cached_report)
+    report.update({
+        "profile": profile,
+        "cache": how,
+        "timings_ms": {**dict.fromkeys(cached_report["timings_ms"], 0.0), **timings},
+    })
+    return text
+
+
+def extract_text_from_image(
+    image_bytes: bytes,
+    profile: Optional[str] = None,
+    report: Optional[Dict[str, Any]] = None,
+    tiled: Optional[bool] = None,
+) -> str:
+    """
+    OCR a chat screenshot. `tiled` forces tiled OCR on/off (default: OCR_TILING).
+    Repeated screenshots are served from `ocr_cache` (report["cache"] says how).
+    """
+    report = report if report is not None else {}
+    profile = _resolve_profile(profile)
+
+    content_key = ("sha256", profile, hashlib.sha256(image_bytes).hexdigest())
+    cached = ocr_cache.get(content_key)
+    if cached is not None:
+        return _cache_hit(*cached[:2], report, profile, "exact", {})
+
+    started = time.perf_counter()
+    gray = _decode(image_bytes)
+    decoded = time.perf_counter()
+    perceptual_key = thumbnail = None
+    if OCR_CACHE_PHASH:
+        perceptual_key = ("dhash", profile, *image_dhash(gray))
+        thumbnail = _grid(gray, VERIFY_WIDTH, VERIFY_MAX_ROWS)
+    lookup_timings = {
+        "decode": round((decoded - started) * 1000, 1),
+        "hash": round((time.perf_counter() - decoded) * 1000, 1),
+    }
+    if perceptual_key is not None:
+        similar_key = ocr_phash_index.get(perceptual_key)
+        cached = ocr_cache.get(similar_key) if similar_key is not None else None
+        if cached is not None and cached[2] is not None and _same_picture(cached[2], thumbnail):
+            ocr_cache.put(content_key, cached)  # shares the cached objects
+            return _cache_hit(*cached[:2], report, profile, "perceptual", lookup_timings)
+
+    processed = preprocess_image(gray, profile=profile, report=report)
+    report["timings_ms"] = {**lookup_timings, **report["timings_ms"]}
+
+    started = time.perf_counter()
+    if _should_tile(processed, tiled):
+        text, tiles = _ocr_tiled(processed)
+    else:
+        text, tiles = _ocr(processed), 1
+    report["engine"] = get_ocr_engine().name
+    report["tiles"] = tiles
+    report["cache"] = "miss"
+    report["timings_ms"]["ocr"] = round((time.perf_counter() - started) * 1000, 1)
+
+    cached_report = {k: report[k] for k in _CACHED_REPORT_FIELDS}
+    cached_report["timings_ms"] = dict(report["timings_ms"])
+    ocr_cache.put(content_key, (text, cached_report, thumbnail))
+    if perceptual_key is not None:
+        ocr_phash_index.put(perceptual_key, content_key)
+
+    logger.info(
+        "OCR profile=%s noise=%.2f denoise=%s tiles=%d timings_ms=%s cache=%s",
+        report["profile"], report["noise"], report["denoise"], tiles, report["timings_ms"], ocr_cache.stats(),
+    )
+    return text
+
 
-    return text or ""
+def extract_text_from_images(
+    images: List[bytes],
+    profile: Optional[str] = None,
+    reports: Optional[List[Dict[str, Any]]] = None,
+) -> List[str]:
+    """
+    OCR several screenshots concurrently on the OCR thread pool, one image per
+    thread (images are not tiled, so the pool never waits on itself).
+    Pass a list as `reports` to receive one report dict per image.
+    """
+    image_reports = [{} for _ in images]
+    if reports is not None:
+        reports.extend(image_reports)
+    return list(_get_tile_executor().map(
+        lambda item: extract_text_from_image(item[0], profile=profile, report=item[1], tiled=False),
+        zip(images, image_reports),
+    ))
@@ -0,0 +1,180 @@
+# app/stats.py
+"""
+Incrementally maintained audit statistics.
+Every session that reaches status "done" is added to the aggregate tables
+(stats_daily, stats_senders, stats_safety_buckets) in the same transaction
+that saves it, and subtracted again when it is deleted. /api/stats then only
+reads those small tables, whatever the size of audit_messages.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from app.database import (
+    AuditMessage,
+    AuditSender,
+    AuditSession,
+    StatsDaily,
+    StatsSafetyBucket,
+    StatsSender,
+    dialect_insert,
+)
+
+SAFETY_BUCKETS = 10  # 0-9, 10-19, ..., 90-100
+
+
+# ============================================================
+# MAINTENANCE
+# ============================================================
+
+def _add_from_select(db: Session, model, keys: List[str], counters: List[str], rows) -> None:
+    """INSERT ... SELECT `rows` into `model`, adding the counters onto existing rows."""
+    stmt = dialect_insert(db, model.__table__).from_select(keys + counters, rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={c: getattr(model, c) + getattr(stmt.excluded, c) for c in counters},
+    )
+    db.execute(stmt)
+
+
+def _apply(db: Session, sign: int, session_ids: Optional[Sequence[int]] = None) -> None:
+    """Add (sign=1) or subtract (sign=-1) the given sessions, or all done sessions if session_ids is None."""
+    if session_ids is None:
+        sessions = AuditSession.status == "done"
+        messages = AuditMessage.session_id.in_(select(AuditSession.id).where(sessions))
+    else:
+        sessions = AuditSession.id.in_(session_ids)
+        messages = AuditMessage.session_id.in_(session_ids)
+
+    day = func.date(AuditSession.created_at)
+    _add_from_select(
+        db, StatsDaily, ["day", "source"], ["sessions", "messages", "toxic_messages", "safety_score_sum"],
+        select(
+            day,
+            AuditSession.source,
+            func.count() * sign,
+            func.sum(AuditSession.total_messages) * sign,
+            func.sum(AuditSession.toxic_messages) * sign,
+            func.sum(AuditSession.safety_score) * sign,
+        ).where(sessions).group_by(day, AuditSession.source),
+    )
+
+    bucket = case(
+        (AuditSession.safety_score >= (SAFETY_BUCKETS - 1) * 10, SAFETY_BUCKETS - 1),
+        else_=AuditSession.safety_score // 10,
+    )
+    _add_from_select(
+        db, StatsSafetyBucket, ["bucket"], ["sessions"],
+        select(bucket, func.count() * sign).where(sessions).group_by(bucket),
+    )
+
+    # Compact rows keep the name in audit_senders (see database.STORAGE_MODE)
+    sender = func.coalesce(AuditSender.name, AuditMessage.sender)
+    _add_from_select(
+        db, StatsSender, ["sender"], ["messages", "toxic_messages"],
+        select(
+            sender,
+            func.count() * sign,
+            func.sum(case((AuditMessage.is_toxic, 1), else_=0)) * sign,
+        ).select_from(AuditMessage).outerjoin(AuditSender, AuditMessage.sender_id == AuditSender.id)
+        .where(messages).group_by(sender),
+    )
+
+
+def record_session(db: Session, session_id: int) -> None:
+    """Add a session that was just marked done (its messages must already be flushed)."""
+    _apply(db, 1, [session_id])
+
+
+def unrecord_sessions(db: Session, session_ids: Sequence[int]) -> None:
+    """Subtract done sessions; call before deleting them."""
+    if session_ids:
+        _apply(db, -1, list(session_ids))
+
+
+def rebuild_stats(db: Session) -> None:
+    """Recompute every aggregate from audit_sessions / audit_messages (one full scan)."""
+    for model in (StatsDaily, StatsSender, StatsSafetyBucket):
+        db.query(model).delete()
+    _apply(db, 1)
+
+
+# ============================================================
+# QUERIES
+# ============================================================
+
+def _rate(toxic: int, total: int) -> float:
+    return round(toxic / total, 4) if total else 0.0
+
+
+def stats_summary(db: Session, days: int = 30, source: Optional[str] = None, top_senders: int = 10) -> Dict:
+    """
+    Dashboard statistics. `daily` and `sources` cover the last `days` UTC days
+    (optionally one source); `senders` and `safety_distribution` are all-time.
+    """
+    since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+
+    window = [StatsDaily.day >= since]
+    if source is not None:
+        window.append(StatsDaily.source == source)
+
+    daily = db.execute(
+        select(
+            StatsDaily.day,
+            func.sum(StatsDaily.sessions),
+            func.sum(StatsDaily.messages),
+            func.sum(StatsDaily.toxic_messages),
+            func.sum(StatsDaily.safety_score_sum),
+        ).where(*window).group_by(StatsDaily.day).having(func.sum(StatsDaily.sessions) > 0).order_by(StatsDaily.day)
+    ).all()
+
+    sources = db.execute(
+        select(
+            StatsDaily.source,
+            func.sum(StatsDaily.sessions),
+            func.sum(StatsDaily.messages),
+            func.sum(StatsDaily.toxic_messages),
+        ).where(*window).group_by(StatsDaily.source).having(func.sum(StatsDaily.sessions) > 0).order_by(StatsDaily.source)
+    ).all()
+
+    senders = db.execute(
+        select(StatsSender.sender, StatsSender.messages, StatsSender.toxic_messages)
+        .where(StatsSender.messages > 0)
+        .order_by(StatsSender.toxic_messages.desc(), StatsSender.messages.desc(), StatsSender.sender)
+        .limit(top_senders)
+    ).all()
+
+    buckets = dict(db.execute(select(StatsSafetyBucket.bucket, StatsSafetyBucket.sessions)).all())
+
+    return {
+        "days": days,
+        "daily": [
+            {
+                "day": day,
+                "sessions": n,
+                "messages": msgs,
+                "toxic_messages": toxic,
+                "toxic_rate": _rate(toxic, msgs),
+                "avg_safety_score": round(score_sum / n, 1),
+            }
+            for day, n, msgs, toxic, score_sum in daily
+        ],
+        "sources": [
+            {"source": src, "sessions": n, "messages": msgs, "toxic_messages": toxic, "toxic_rate": _rate(toxic, msgs)}
+            for src, n, msgs, toxic in sources
+        ],
+        "senders": [
+            {"sender": sender, "messages": msgs, "toxic_messages": toxic, "toxic_rate": _rate(toxic, msgs)}
+            for sender, msgs, toxic in senders
+        ],
+        "safety_distribution": [
+            {
+                "min_score": b * 10,
+                "max_score": 100 if b == SAFETY_BUCKETS - 1 else b * 10 + 9,
+                "sessions": max(0, buckets.get(b, 0)),
+            }
+            for b in range(SAFETY_BUCKETS)
+        ],
+    }
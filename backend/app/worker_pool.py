@@ -0,0 +1,79 @@
+# app/worker_pool.py
+"""
+Bounded thread pool for CPU-bound stages (OCR, parsing, model inference).
+Keeps blocking work off the asyncio event loop and rejects new work once
+`max_workers + max_queue` jobs are in flight, so overload turns into a fast
+503 instead of requests (and health checks) piling up behind one another.
+
+Threads (not processes) are enough here: Tesseract runs as a subprocess and
+torch / ONNX Runtime release the GIL during inference.
+"""
+import asyncio
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSaturatedError(RuntimeError):
+    """Raised when the pool has no free worker and its queue is full."""
+
+
+class BoundedWorkerPool:
+    def __init__(self, max_workers: int, max_queue: int, name: str = "audit-worker"):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "BoundedWorkerPool":
+        return cls(
+            max_workers=int(os.getenv("AUDIT_WORKERS", str(min(4, os.cpu_count() or 1)))),
+            max_queue=int(os.getenv("AUDIT_QUEUE_DEPTH", "16")),
+        )
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """Queue `fn(*args, **kwargs)` without waiting; raise PoolSaturatedError if full."""
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise PoolSaturatedError("worker pool saturated")
+
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            self._release(None)
+            raise
+        # Slot is freed when the work actually finishes, even if whoever
+        # awaits it (e.g. a disconnected request) is gone by then.
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run `fn(*args, **kwargs)` in the pool; raise PoolSaturatedError if full."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
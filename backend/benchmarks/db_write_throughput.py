@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""
+Concurrent audit-write benchmark for the SQLite storage profiles.
+
+Starts N worker processes (like N uvicorn workers sharing one DB file), each
+saving audit sessions through app.main._save_to_db, while reader processes
+poll the history query. Reports write throughput, latency and lock errors.
+
+    python benchmarks/db_write_throughput.py --workers 4 --sessions 50 --messages 200
+"""
+import argparse
+import logging
+import multiprocessing as mp
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _setup(db_file: str, profile: str) -> None:
+    """Point a fresh (spawned) process at the benchmark DB; app modules read env at import."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_file}"
+    os.environ["SQLITE_PROFILE"] = profile
+    os.environ["AUDIT_DB_WRITE"] = "sync"
+    sys.path.insert(0, BACKEND_DIR)
+    logging.disable(logging.INFO)
+
+
+def _create_schema(db_file, profile):
+    _setup(db_file, profile)
+    from app.database import create_db
+    create_db()
+
+
+def _messages(n: int):
+    return [
+        {
+            "id": i + 1,
+            "sender": f"user{i % 3}",
+            "timestamp": "10:00",
+            "raw_text": "halo bro apa kabar " * 3,
+            "normalized_text": "halo saudara apa kabar " * 3,
+            "analysis": {"label": "neutral", "score": 0.9, "is_toxic": i % 7 == 0},
+        }
+        for i in range(n)
+    ]
+
+
+def _writer(db_file, profile, sessions, messages, ready, results):
+    _setup(db_file, profile)
+    from sqlalchemy.exc import OperationalError
+    from app.database import SessionLocal
+    from app.main import _save_to_db
+
+    rows = _messages(messages)
+    latencies, errors = [], 0
+    ready.wait()  # start together, after every process has imported the app
+    started_at = time.time()
+    for _ in range(sessions):
+        db = SessionLocal()
+        started = time.perf_counter()
+        try:
+            _save_to_db(db, "text", rows, sum(r["analysis"]["is_toxic"] for r in rows), 0.1)
+            latencies.append(time.perf_counter() - started)
+        except OperationalError:
+            db.rollback()
+            errors += 1
+        finally:
+            db.close()
+    results.put(("writer", latencies, errors, started_at, time.time()))
+
+
+def _reader(db_file, profile, read_seconds, ready, results):
+    _setup(db_file, profile)
+    from sqlalchemy.exc import OperationalError
+    from app.database import SessionLocal, AuditSession
+
+    latencies, errors = [], 0
+    ready.wait()
+    started_at = time.time()
+    stop_at = started_at + read_seconds
+    while time.time() < stop_at:
+        db = SessionLocal()
+        started = time.perf_counter()
+        try:
+            db.query(AuditSession).order_by(AuditSession.created_at.desc()).limit(20).all()
+            latencies.append(time.perf_counter() - started)
+        except OperationalError:
+            errors += 1
+        finally:
+            db.close()
+        time.sleep(0.005)
+    results.put(("reader", latencies, errors, started_at, time.time()))
+
+
+def run(profile: str, args) -> dict:
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        db_file = os.path.join(tmp, "bench.db")
+        schema = ctx.Process(target=_create_schema, args=(db_file, profile))
+        schema.start()
+        schema.join()
+
+        results = ctx.Queue()
+        ready = ctx.Barrier(args.workers + args.readers)
+        writers = [
+            ctx.Process(target=_writer, args=(db_file, profile, args.sessions, args.messages, ready, results))
+            for _ in range(args.workers)
+        ]
+        readers = [
+            ctx.Process(target=_reader, args=(db_file, profile, args.read_seconds, ready, results))
+            for _ in range(args.readers)
+        ]
+        for p in writers + readers:
+            p.start()
+
+        collected = [results.get() for _ in range(len(writers) + len(readers))]
+        for p in writers + readers:
+            p.join()
+
+    writer_results = [r for r in collected if r[0] == "writer"]
+    reader_results = [r for r in collected if r[0] == "reader"]
+    write_lat = [x for r in writer_results for x in r[1]]
+    read_lat = [x for r in reader_results for x in r[1]]
+    write_err = sum(r[2] for r in writer_results)
+    read_err = sum(r[2] for r in reader_results)
+    write_window = max(max(r[4] for r in writer_results) - min(r[3] for r in writer_results), 1e-9)
+    return {
+        "profile": profile,
+        "sessions_ok": len(write_lat),
+        "write_errors": write_err,
+        "sessions_per_s": round(len(write_lat) / write_window, 1),
+        "messages_per_s": round(len(write_lat) * args.messages / write_window),
+        "write_p50_ms": _ms(write_lat, 0.5),
+        "write_p95_ms": _ms(write_lat, 0.95),
+        "read_p95_ms": _ms(read_lat, 0.95),
+        "read_errors": read_err,
+    }
+
+
+def _ms(values, q):
+    if not values:
+        return None
+    if len(values) == 1:
+        return round(values[0] * 1000, 1)
+    return round(statistics.quantiles(values, n=100)[int(q * 100) - 1] * 1000, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4, help="writer processes (uvicorn workers)")
+    parser.add_argument("--readers", type=int, default=2, help="history-reader processes")
+    parser.add_argument("--sessions", type=int, default=50, help="audit sessions saved per writer")
+    parser.add_argument("--messages", type=int, default=200, help="messages per session")
+    parser.add_argument("--read-seconds", type=float, default=5.0, help="how long readers poll")
+    parser.add_argument("--dir", default=None, help="directory for the temporary DB file (default: system temp)")
+    parser.add_argument("--profiles", default="default,production", help="comma-separated SQLITE_PROFILE values")
+    args = parser.parse_args()
+
+    rows = [run(profile, args) for profile in args.profiles.split(",")]
+    keys = list(rows[0])
+    print(" | ".join(keys))
+    for row in rows:
+        print(" | ".join(str(row[k]) for k in keys))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app import database
+from app.database import AuditSession, Base
+from app.main import _insert_messages
+from app.stats import record_session
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """Fresh SQLite file with the production PRAGMAs and every table."""
+    monkeypatch.setattr(database, "SQLITE_PROFILE", "production")
+    engine = create_engine(f"sqlite:///{tmp_path / 'audit.db'}")
+    event.listen(engine, "connect", database._apply_sqlite_pragmas)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def save(db):
+    """
+    save(rows, created_at=None, source="text", safety_score=100) -> session id
+    Stores a finished audit the way _save_to_db does; rows are
+    (sender, raw_text, normalized_text, is_toxic).
+    """
+    def save(rows, created_at=None, source="text", safety_score=100):
+        session = AuditSession(
+            source=source, total_messages=len(rows), toxic_messages=sum(bool(r[3]) for r in rows),
+            safety_score=safety_score, processing_time_seconds=0.1, created_at=created_at,
+        )
+        db.add(session)
+        db.flush()
+        _insert_messages(db, session.id, [
+            {"id": i, "sender": sender, "raw_text": raw, "normalized_text": norm,
+             "analysis": {"label": "negative" if toxic else "neutral", "score": 0.9, "is_toxic": toxic}}
+            for i, (sender, raw, norm, toxic) in enumerate(rows, 1)
+        ])
+        record_session(db, session.id)
+        db.commit()
+        return session.id
+
+    return save
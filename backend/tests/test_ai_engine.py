@@ -4,7 +4,10 @@ from app.services.ai_engine import SentimentEngine
 
 @pytest.fixture
 def engine():
-    return SentimentEngine()
+    e = SentimentEngine()
+    e.cache.clear()
+    yield e
+    e.cache.clear()
 
 def test_normalize_leet(engine):
     assert engine._normalize_leet("t0l0l") == "tolol"
@@ -30,3 +33,72 @@ def test_detect_toxicity_mild(engine):
     res = engine._detect_toxicity("nyebelin banget lu")
     assert res["is_toxic"] == False
     assert res["level"] == "mild"
+
+class FakePipeline:
+    """Stands in for the transformers pipeline; records each call's inputs."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, inputs, **kwargs):
+        self.calls.append(inputs)
+        if isinstance(inputs, str):
+            return [self._predict(inputs)]
+        return [self._predict(t) for t in inputs]
+
+    def _predict(self, text):
+        neg = 0.9 if "bego" in text or "t0l0l" in text else 0.1
+        return [
+            {"label": "negative", "score": neg},
+            {"label": "positive", "score": 1 - neg},
+        ]
+
+def test_analyze_batch_matches_analyze(engine, monkeypatch):
+    monkeypatch.setattr(engine, "_pipeline", FakePipeline())
+    texts = ["halo semua", "woy t0l0l", "", "lu bego tapi gw sayang", "mantap"]
+    assert engine.analyze_batch(texts) == [engine.analyze(t) for t in texts]
+
+def test_analyze_batch_sorts_and_chunks(engine, monkeypatch):
+    fake = FakePipeline()
+    monkeypatch.setattr(engine, "_pipeline", fake)
+    texts = ["ccc ccc ccc", "a", "bb bb", "dddd dddd dddd dddd", "   "]
+    results = engine.analyze_batch(texts, batch_size=2)
+
+    assert len(results) == len(texts)
+    assert results[4] == {"label": "neutral", "score": 0.0, "is_toxic": False}
+    assert fake.calls == [["a", "bb bb"], ["ccc ccc ccc", "dddd dddd dddd dddd"]]
+
+def test_analyze_batch_runs_duplicates_once(engine, monkeypatch):
+    fake = FakePipeline()
+    monkeypatch.setattr(engine, "_pipeline", fake)
+    first = engine.analyze_batch(["wkwk", "ok", "wkwk", "wkwk"])
+    second = engine.analyze_batch(["ok", "wkwk"])
+
+    assert fake.calls == [["ok", "wkwk"]]
+    assert first[0] == first[2] == first[3] == second[1]
+    assert engine.cache.stats()["hits"] >= 2
+
+def test_detect_toxicity_phrase_and_spans(engine):
+    text = "dasar kurang 4jar, t0l0l"
+    res = engine._detect_toxicity(text)
+    assert res["is_toxic"] == True
+    spans = {(m["term"], text[m["start"]:m["end"]]) for m in res["matches"]}
+    assert spans == {("kurang ajar", "kurang 4jar"), ("tolol", "t0l0l")}
+
+def test_detect_toxicity_whole_words_only(engine):
+    assert engine._detect_toxicity("babibu")["level"] == "none"
+    assert engine._detect_toxicity("b@bi.")["level"] == "hard"
+
+def test_rules_mode_skips_model(engine, monkeypatch):
+    fake = FakePipeline()
+    monkeypatch.setattr(engine, "_pipeline", fake)
+    assert engine.analyze("woy t0l0l", mode="rules") == {"label": "unscored", "score": 0.0, "is_toxic": True}
+    results = engine.analyze_batch(["halo", "", "dasar bego"], mode="rules")
+
+    assert [r["is_toxic"] for r in results] == [False, False, True]
+    assert results[1]["label"] == "neutral"
+    assert fake.calls == []
+
+def test_unknown_mode_rejected(engine):
+    with pytest.raises(ValueError):
+        engine.analyze("halo", mode="fast")
@@ -0,0 +1,34 @@
+from app.services.cache import InferenceCache, LRUCache
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+def test_lru_zero_size_disables_cache():
+    cache = LRUCache(0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+def test_inference_cache_key_includes_model():
+    cache = InferenceCache(10)
+    cache.put("model-a", "siap", {"label": "neutral", "score": 0.5, "is_toxic": False})
+    assert cache.get("model-b", "siap") is None
+    assert cache.get("model-a", "siap")["score"] == 0.5
+
+def test_inference_cache_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "inference.sqlite")
+    value = {"label": "positive", "score": 0.9, "is_toxic": False}
+    InferenceCache(10, disk_path=path).put("model", "mantap", value)
+
+    fresh = InferenceCache(10, disk_path=path)
+    assert fresh.get("model", "mantap") == value
+    assert fresh.stats()["disk_hits"] == 1
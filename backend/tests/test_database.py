@@ -0,0 +1,18 @@
+from sqlalchemy import create_engine, event
+from app import database
+
+def test_production_profile_pragmas(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "SQLITE_PROFILE", "production")
+    url = f"sqlite:///{tmp_path / 'audit.db'}"
+    engine = create_engine(url, **database._engine_options(url))
+    event.listen(engine, "connect", database._apply_sqlite_pragmas)
+
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == database.SQLITE_BUSY_TIMEOUT_MS
+    assert engine.pool.size() == database.DB_POOL_SIZE
+    engine.dispose()
+
+def test_memory_database_skips_pool_options():
+    assert database._engine_options("sqlite://") == {"connect_args": {"check_same_thread": False}}
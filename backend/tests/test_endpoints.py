@@ -2,12 +2,12 @@
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
-from app.database import Base, engine, get_db, SessionLocal
+from app.database import create_db, get_db, SessionLocal
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
 # Setup test database
-Base.metadata.create_all(bind=engine)
+create_db()
 
 def override_get_db():
     try:
@@ -63,3 +63,322 @@ def test_history_list():
 def test_history_detail_not_found():
     response = client.get("/api/history/999999")
     assert response.status_code == 404
+
+def test_audit_text_rules_mode():
+    payload = {"text": "10:00 user1: halo semua\n10:01 user2: woy t0l0l", "mode": "rules"}
+    response = client.post("/api/audit/text", json=payload)
+    assert response.status_code == 200
+    messages = response.json()["data"]
+    assert [m["analysis"]["is_toxic"] for m in messages] == [False, True]
+    assert all(m["analysis"]["label"] == "unscored" for m in messages)
+
+def test_audit_text_invalid_mode():
+    response = client.post("/api/audit/text", json={"text": "halo", "mode": "turbo"})
+    assert response.status_code == 422
+
+def test_ready_reports_model_state(monkeypatch):
+    from app.services.ai_engine import ai_analyzer
+    from app.services.normalizer import load_slang_dict
+    load_slang_dict()
+
+    monkeypatch.setattr(ai_analyzer, "_pipeline", None)
+    response = client.get("/api/ready")
+    assert response.status_code == 503
+    assert response.json()["lexicon"]["loaded"] == True
+    assert response.json()["model"]["loaded"] == False
+
+    monkeypatch.setattr(ai_analyzer, "_pipeline", lambda texts, **kwargs: [])
+    response = client.get("/api/ready")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+
+def test_audit_text_busy_returns_503(monkeypatch):
+    import app.main as main
+    from app.worker_pool import PoolSaturatedError
+
+    async def saturated(fn, *args, **kwargs):
+        raise PoolSaturatedError()
+
+    monkeypatch.setattr(main.cpu_pool, "run", saturated)
+    response = client.post("/api/audit/text", json={"text": "10:00 user1: halo"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(main.RETRY_AFTER_SECONDS)
+
+def test_text_job_lifecycle():
+    import time
+    text = "\n".join(f"10:{i % 60:02d} user{i % 3}: pesan ke {i} dasar bego" for i in range(40))
+    response = client.post("/api/jobs/text", json={"text": text, "mode": "rules"})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    for _ in range(100):
+        status = client.get(f"/api/jobs/{job_id}").json()
+        if status["status"] in ("done", "failed"):
+            break
+        time.sleep(0.05)
+    assert status["status"] == "done"
+    assert status["processed_messages"] == status["total_messages"] == 40
+
+    result = client.get(f"/api/jobs/{job_id}/result").json()
+    assert result["meta"]["session_id"] == job_id
+    assert result["meta"]["toxic_messages"] == 40
+    assert [m["id"] for m in result["data"]] == list(range(1, 41))
+
+def test_job_not_found():
+    assert client.get("/api/jobs/999999").status_code == 404
+    assert client.get("/api/jobs/999999/result").status_code == 404
+
+def _job(db, owner, status="running", heartbeat=None):
+    from datetime import datetime
+    from app.database import AuditSession
+    job = AuditSession(source="text", status=status, owner=owner, total_messages=10, toxic_messages=0,
+                       safety_score=100, processing_time_seconds=0.0,
+                       updated_at=heartbeat or datetime.utcnow())
+    db.add(job)
+    db.commit()
+    return job.id
+
+def test_interrupted_jobs_fail_only_when_their_owner_is_gone(db):
+    import os, socket, subprocess, sys
+    from datetime import datetime
+    from app import main
+    from app.database import AuditSession
+    host = socket.gethostname()
+    sibling = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    try:
+        live = _job(db, f"{host}:{sibling.pid}:aaaa")                     # another live worker
+        waiting = _job(db, f"{host}:{sibling.pid}:aaaa", status="queued")  # queued behind it
+        remote = _job(db, "otherhost:1:bbbb")                              # can't be checked, heartbeat fresh
+        mine = _job(db, main.WORKER_ID, heartbeat=datetime(2020, 1, 1))   # this process (monitor keeps it fresh)
+        dead = _job(db, f"{host}:{exited.pid}:cccc")
+        restarted = _job(db, f"{host}:{os.getpid()}:dddd", status="saving")
+        silent = _job(db, "otherhost:1:bbbb", heartbeat=datetime(2020, 1, 1))
+        legacy = _job(db, None, status="queued", heartbeat=datetime(2020, 1, 1))
+
+        assert main._fail_interrupted_jobs(db) == 4
+        status = dict(db.query(AuditSession.id, AuditSession.status))
+        assert [status[i] for i in (live, waiting, remote, mine)] == ["running", "queued", "running", "running"]
+        assert [status[i] for i in (dead, restarted, silent, legacy)] == ["failed"] * 4
+        assert "dimulai ulang" in db.get(AuditSession, dead).error
+    finally:
+        sibling.kill()
+        sibling.wait()
+
+def test_job_heartbeat_covers_queued_jobs(db):
+    from datetime import datetime
+    from app import main
+    from app.database import AuditSession
+    queued = _job(db, main.WORKER_ID, status="queued", heartbeat=datetime(2020, 1, 1))
+    main._touch_own_jobs(db)
+    db.expire_all()
+    assert db.get(AuditSession, queued).updated_at.year > 2020
+
+def test_audit_text_stream():
+    import json
+    text = "\n".join(f"10:{i:02d} user{i % 2}: halo {i}" for i in range(20)) + "\n10:59 user3: woy t0l0l"
+    response = client.post("/api/audit/text/stream", json={"text": text, "mode": "rules"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    records = [json.loads(line) for line in response.text.splitlines()]
+    messages = [r["data"] for r in records if r["type"] == "message"]
+    assert [m["id"] for m in messages] == list(range(1, 22))
+    assert messages[-1]["analysis"]["is_toxic"] == True
+    assert records[-1]["type"] == "meta"
+    assert records[-1]["data"]["total_messages"] == 21
+    assert records[-1]["data"]["session_id"] is not None
+
+def test_session_records_lexicon_version():
+    from app.services.lexicon import lexicon_registry
+    response = client.post("/api/audit/text", json={"text": "10:00 user1: halo", "mode": "rules"})
+    session_id = response.json()["meta"]["session_id"]
+    detail = client.get(f"/api/history/{session_id}").json()
+    assert detail["lexicon_version"] == lexicon_registry.current().version
+
+def test_admin_lexicon_reload(monkeypatch):
+    from app import main
+    assert client.post("/api/admin/lexicon/reload").status_code == 403  # ADMIN_TOKEN unset
+
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "rahasia")
+    assert client.get("/api/admin/lexicon", headers={"Authorization": "Bearer salah"}).status_code == 401
+
+    headers = {"Authorization": "Bearer rahasia"}
+    response = client.post("/api/admin/lexicon/reload", headers=headers)
+    assert response.status_code == 202
+    assert client.get("/api/admin/lexicon", headers=headers).json()["active"]["version"]
+
+def test_upload_rejects_unknown_ocr_profile():
+    files = {"file": ("chat.png", b"\x89PNG", "image/png")}
+    response = client.post("/api/audit/upload?ocr_profile=turbo", files=files)
+    assert response.status_code == 400
+
+def test_upload_batch_merges_screenshots(monkeypatch):
+    from app import main
+    shots = [
+        "10:00 Andi: halo bro\n10:01 Budi: dasar bego",
+        "10:01 Budi: dasar bego\n10:02 Andi: santai dong",
+    ]
+    monkeypatch.setattr(main, "extract_text_from_images", lambda images, profile=None, reports=None: list(shots))
+    files = [("files", (f"shot{i}.png", b"\x89PNG", "image/png")) for i in range(2)]
+
+    response = client.post("/api/audit/upload/batch", files=files)
+    assert response.status_code == 200
+    body = response.json()
+    assert [m["raw_text"] for m in body["data"]] == ["halo bro", "dasar bego", "santai dong"]
+    assert body["meta"]["ocr"]["overlap_lines_removed"] == 1
+    detail = client.get(f"/api/history/{body['meta']['session_id']}").json()
+    assert detail["total_messages"] == 3
+
+def test_background_db_write(monkeypatch):
+    from app import main
+    monkeypatch.setattr(main, "DB_WRITE_MODE", "background")
+    text = "\n".join(f"10:{i:02d} user{i % 2}: halo {i}" for i in range(30))
+    response = client.post("/api/audit/text", json={"text": text, "mode": "rules"})
+    assert response.status_code == 200
+    session_id = response.json()["meta"]["session_id"]
+
+    # TestClient runs background tasks before returning
+    detail = client.get(f"/api/history/{session_id}").json()
+    assert len(detail["messages"]) == 30
+    assert client.get(f"/api/jobs/{session_id}").json()["status"] == "done"
+
+def test_background_db_write_retries_when_locked(monkeypatch):
+    from sqlalchemy.exc import OperationalError
+    from app import main
+    from app.database import AuditSession
+
+    db = SessionLocal()
+    session = AuditSession(source="text", status="saving", total_messages=1, toxic_messages=0,
+                           safety_score=100, processing_time_seconds=0.1)
+    db.add(session)
+    db.commit()
+
+    real_insert = main._insert_messages
+    attempts = []
+
+    def flaky_insert(db, session_id, result_data):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+        real_insert(db, session_id, result_data)
+
+    monkeypatch.setattr(main, "_insert_messages", flaky_insert)
+    monkeypatch.setattr(main, "DB_WRITE_RETRY_DELAY", 0)
+    row = {"id": 1, "sender": "a", "timestamp": "", "raw_text": "halo", "normalized_text": "halo",
+           "analysis": {"label": "neutral", "score": 0.5, "is_toxic": False}}
+    main._write_messages_in_background(session.id, [row])
+
+    db.refresh(session)
+    assert len(attempts) == 2
+    assert session.status == "done"
+    assert len(session.messages) == 1
+    db.close()
+
+def test_history_keyset_pagination():
+    for i in range(5):
+        client.post("/api/audit/text", json={"text": f"10:00 user: halo {i}", "mode": "rules"})
+
+    offset_ids = [s["id"] for s in client.get("/api/history?limit=100").json()]
+    seen, cursor = [], None
+    while True:
+        url = "/api/history?limit=2" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url)
+        seen += [s["id"] for s in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor or len(seen) >= len(offset_ids):
+            break
+    assert seen == offset_ids[:len(seen)]
+    assert len(seen) == len(set(seen))
+
+def test_history_cursor_survives_deleted_anchor():
+    ids = [client.post("/api/audit/text", json={"text": f"10:00 user: hapus {i}", "mode": "rules"}).json()["meta"]["session_id"]
+           for i in range(3)]
+    anchor = ids[-1]
+    client.delete(f"/api/history/{anchor}")
+    page = client.get(f"/api/history?limit=2&cursor={anchor}").json()
+    assert [s["id"] for s in page] == [ids[1], ids[0]]
+
+def test_history_rejects_cursor_with_skip():
+    assert client.get("/api/history?cursor=10&skip=5").status_code == 400
+
+def test_history_detail_message_paging():
+    text = "\n".join(f"10:{i:02d} user{i % 2}: pesan {i}" for i in range(7))
+    session_id = client.post("/api/audit/text", json={"text": text, "mode": "rules"}).json()["meta"]["session_id"]
+
+    full = client.get(f"/api/history/{session_id}").json()
+    assert [m["id"] for m in full["messages"]] == list(range(1, 8))
+    assert full["messages"][0]["analysis"]["label"] == "unscored"
+
+    pages, after = [], None
+    while True:
+        url = f"/api/history/{session_id}?limit=3" + (f"&after={after}" if after else "")
+        response = client.get(url)
+        pages.append([m["id"] for m in response.json()["messages"]])
+        after = response.headers.get("x-next-cursor")
+        if not after:
+            break
+    assert pages == [[1, 2, 3], [4, 5, 6], [7]]
+
+def test_history_detail_limit_is_capped():
+    from app.schemas import HistoryDetail
+    text = "\n".join(f"10:{i % 60:02d} user1: pesan {i}" for i in range(105))
+    session_id = client.post("/api/audit/text", json={"text": text, "mode": "rules"}).json()["meta"]["session_id"]
+
+    response = client.get(f"/api/history/{session_id}?limit=1000")
+    assert len(response.json()["messages"]) == 100
+    assert HistoryDetail.model_validate(response.json()).id == session_id
+    assert response.headers["x-next-cursor"] == "100"
+    client.delete(f"/api/history/{session_id}")
+
+def test_async_session_save_and_history():
+    import asyncio
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from app.database import DB_PATH, async_database_url
+
+    async_engine = create_async_engine(async_database_url(DB_PATH))
+
+    async def override_get_async_db():
+        async with AsyncSession(async_engine, expire_on_commit=False) as db:
+            yield db
+
+    # DB_DEPENDENCY is get_db in the default mode; swap in an AsyncSession to take the aiosqlite path
+    app.dependency_overrides[get_db] = override_get_async_db
+    try:
+        text = "10:00 user1: halo\n10:01 user2: woy t0l0l"
+        session_id = client.post("/api/audit/text", json={"text": text, "mode": "rules"}).json()["meta"]["session_id"]
+
+        detail = client.get(f"/api/history/{session_id}").json()
+        assert [m["sender"] for m in detail["messages"]] == ["user1", "user2"]
+        assert detail["toxic_messages"] == 1
+        assert session_id in [s["id"] for s in client.get("/api/history?limit=100").json()]
+    finally:
+        app.dependency_overrides[get_db] = override_get_db
+        asyncio.run(async_engine.dispose())
+
+def test_stats_endpoint_tracks_saves_and_deletes():
+    before = client.get("/api/stats?days=1").json()
+    text = "10:00 statsuser: halo\n10:01 statsuser: woy t0l0l"
+    session_id = client.post("/api/audit/text", json={"text": text, "mode": "rules"}).json()["meta"]["session_id"]
+
+    stats = client.get("/api/stats?days=1").json()
+    assert stats["daily"][-1]["messages"] == (before["daily"][-1]["messages"] if before["daily"] else 0) + 2
+    assert {"sender": "statsuser", "messages": 2, "toxic_messages": 1, "toxic_rate": 0.5} in \
+        client.get("/api/stats?top_senders=100").json()["senders"]
+
+    client.delete(f"/api/history/{session_id}")
+    assert client.get("/api/stats?days=1").json()["daily"] == before["daily"]
+    assert client.get("/api/stats?days=0").status_code == 400
+
+def test_search_endpoint():
+    text = "10:00 penyidik: Dasar gobloookkk!!\n10:01 saksi: halo"
+    session_id = client.post("/api/audit/text", json={"text": text, "mode": "rules"}).json()["meta"]["session_id"]
+
+    hits = client.get("/api/search", params={"q": "GOBLOK", "sender": "penyidik"}).json()
+    assert hits[0]["session_id"] == session_id and hits[0]["snippet"] == "dasar [goblok]"
+    assert client.get("/api/search", params={"q": "goblok", "sender": "saksi"}).json() == []
+    assert client.get("/api/search", params={"q": "?!"}).status_code == 400
+
+    client.delete(f"/api/history/{session_id}")
+    assert all(h["session_id"] != session_id for h in client.get("/api/search", params={"q": "goblok"}).json())
@@ -0,0 +1,55 @@
+import pytest
+from app.services import lexicon as lexicon_module
+from app.services.lexicon import LexiconRegistry
+
+@pytest.fixture
+def toxic_file(tmp_path, monkeypatch):
+    path = tmp_path / "toxic.csv"
+    path.write_text("term,level\nbego,hard\nkampret,crude\n", encoding="utf-8")
+    monkeypatch.setattr(lexicon_module, "TOXIC_LEXICON_PATH", str(path))
+    return path
+
+def test_external_toxic_list_replaces_builtin(toxic_file):
+    snapshot = LexiconRegistry().current()
+    assert dict(snapshot.toxic_keywords) == {"bego": "hard", "kampret": "crude"}
+    assert [h.term for h in snapshot.matcher.scan("dasar kampret, anjing")] == ["kampret"]
+
+def test_reload_swaps_snapshot_and_keeps_old_one_intact(toxic_file):
+    registry = LexiconRegistry()
+    old = registry.current()
+    assert not registry.changed_on_disk()
+
+    with open(toxic_file, "a", encoding="utf-8") as f:
+        f.write("anjing,hard\n")
+    new = registry.reload()
+
+    assert registry.current() is new
+    assert new.version != old.version
+    assert "anjing" in new.toxic_keywords
+    assert "anjing" not in old.toxic_keywords  # in-flight requests keep their snapshot
+
+def test_failed_reload_keeps_current_snapshot(toxic_file, monkeypatch):
+    registry = LexiconRegistry()
+    old = registry.current()
+
+    def broken():
+        raise OSError("disk gone")
+
+    monkeypatch.setattr(lexicon_module, "build_snapshot", broken)
+    with pytest.raises(OSError):
+        registry.reload()
+    assert registry.current() is old
+
+def test_edit_during_build_is_seen_by_the_watcher(toxic_file, monkeypatch):
+    registry = LexiconRegistry()
+    build = lexicon_module.build_snapshot
+
+    def build_then_edit():
+        snapshot = build()
+        with open(toxic_file, "a", encoding="utf-8") as f:
+            f.write("anjing,hard\n")
+        return snapshot
+
+    monkeypatch.setattr(lexicon_module, "build_snapshot", build_then_edit)
+    assert "anjing" not in registry.current().toxic_keywords
+    assert registry.changed_on_disk()
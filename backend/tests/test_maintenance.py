@@ -0,0 +1,81 @@
+import pytest
+from sqlalchemy import select, text
+
+from app import database
+from app.database import AuditMessage, AuditSession
+from app.main import _load_messages
+from app.maintenance import compact_messages, purge_old_sessions, reclaim_space
+from app.stats import stats_summary
+
+
+ROWS = [("Andi", "Halo semua", "halo semua", False), ("Budi", "ok", "ok", False), ("Andi", "gw otw", "gue otw", False)]
+
+
+def test_compact_storage_round_trip(db, save, monkeypatch):
+    monkeypatch.setattr("app.main.STORAGE_MODE", "compact")
+    plain = _load_messages(db, save(ROWS))  # written compact here
+    monkeypatch.setattr("app.main.STORAGE_MODE", "plain")
+    session_id = save(ROWS)
+
+    assert _load_messages(db, session_id) == plain
+    assert [m["normalized_text"] for m in plain] == ["halo semua", "ok", "gue otw"]
+
+    stored = db.execute(select(AuditMessage.sender, AuditMessage.normalized_text, AuditMessage.flags)
+                        .where(AuditMessage.session_id != session_id).order_by(AuditMessage.id)).all()
+    assert stored == [("", "", database.MSG_NORMALIZED_DELTA), ("", "", database.MSG_NORMALIZED_SAME),
+                      ("", "0:gue", database.MSG_NORMALIZED_DELTA)]
+    assert {s["sender"]: s["messages"] for s in stats_summary(db)["senders"]} == {"Andi": 4, "Budi": 2}
+
+
+@pytest.mark.parametrize("raw, normalized", [
+    ("Makasih ya, gw otw!!", "terima kasih ya gue otw"),
+    ("gitu males", "begitu malas"),
+    ("Halooo   semua...", "halo semua"),
+    ("!!! ok", " ok"),
+    ("ok otw", "ok on the way"),
+])
+def test_normalized_delta_round_trip(raw, normalized):
+    delta = database._normalized_delta(raw, normalized)
+    assert delta is not None
+    assert database.expand_normalized(raw, delta, database.MSG_NORMALIZED_DELTA) == normalized
+
+
+def test_normalized_delta_gives_up_on_unaligned_text():
+    assert database._normalized_delta("satu dua", "tiga") is None
+
+
+def test_compact_messages_converts_plain_rows(db, save, monkeypatch):
+    monkeypatch.setattr(database, "TEXT_COMPRESSION", True)
+    monkeypatch.setattr(database, "TEXT_COMPRESS_MIN_BYTES", 16)
+    long_text = "halo semua " * 20
+    session_id = save(ROWS + [("Citra", long_text, long_text.strip(), False)])
+    before = _load_messages(db, session_id)
+
+    assert compact_messages(db, chunk_size=2) == 4
+    assert compact_messages(db) == 0
+    assert _load_messages(db, session_id) == before
+    assert db.execute(text("SELECT typeof(raw_text) FROM audit_messages WHERE sender_id = "
+                           "(SELECT id FROM audit_senders WHERE name = 'Citra')")).scalar() == "blob"
+
+
+def test_purge_old_sessions_updates_stats(db, save):
+    from datetime import datetime, timedelta
+    old = save(ROWS, created_at=datetime.utcnow() - timedelta(days=40))
+    recent = save(ROWS)
+
+    assert purge_old_sessions(db, older_than_days=30, chunk_size=1) == 1
+    assert db.get(AuditSession, old) is None and db.get(AuditSession, recent) is not None
+    assert db.execute(select(AuditMessage.id).where(AuditMessage.session_id == old)).first() is None
+    assert {s["sender"]: s["messages"] for s in stats_summary(db)["senders"]} == {"Andi": 2, "Budi": 1}
+
+
+def test_reclaim_space_incremental(db, save, engine):
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2  # INCREMENTAL
+    for _ in range(20):
+        save([("Andi", "x" * 2000, "x" * 2000, False)] * 20)
+    purge_old_sessions(db, older_than_days=-1)
+
+    report = reclaim_space(engine, step_pages=50)
+    assert report["free_pages_before"] > 50
+    assert report["free_pages_after"] == 0
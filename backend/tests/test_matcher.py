@@ -0,0 +1,33 @@
+from app.services.ai_engine import LEET_MAP
+from app.services.matcher import LexiconMatcher, _trie_pattern
+import re
+
+def test_trie_pattern_prefers_longest():
+    pattern = re.compile(_trie_pattern(["sori", "sorry", "sor"], re.escape))
+    assert pattern.match("sorry").group() == "sorry"
+    assert pattern.match("sorx").group() == "sor"
+
+def test_scan_reports_overlapping_hits_with_spans():
+    matcher = LexiconMatcher({"bego": "hard"}, {"maaf", "minta maaf"}, [r"keren\s+banget"], LEET_MAP)
+    hits = matcher.scan("Minta maaf ya B3GO, keren banget")
+
+    assert [(h.kind, h.term, h.start, h.end) for h in hits] == [
+        ("positive", "minta maaf", 0, 10),
+        ("positive", "maaf", 6, 10),
+        ("toxic", "bego", 14, 18),
+        ("friendly", "keren banget", 20, 32),
+    ]
+
+def test_unreachable_leet_keys_are_skipped():
+    matcher = LexiconMatcher({"tol0l": "hard"}, set(), [], LEET_MAP)
+    assert matcher.scan("tol0l tolol") == []
+
+def test_scan_reports_every_kind_at_the_same_start():
+    matcher = LexiconMatcher({"seru": "mild"}, {"seru"}, [r"seru\s+banget"], LEET_MAP)
+    hits = matcher.scan("seru banget")
+
+    assert [(h.kind, h.term, h.start, h.end) for h in hits] == [
+        ("toxic", "seru", 0, 4),
+        ("positive", "seru", 0, 4),
+        ("friendly", "seru banget", 0, 11),
+    ]
@@ -1,3 +1,4 @@
+import os
 import pytest
 from app.services.normalizer import normalize_text, parse_chat_log, dedupe_repeated_chars
 
@@ -20,3 +21,86 @@ def test_parse_chat_log_format():
     assert "bro lu dmn?" in parsed[0]["raw_text"]
     assert "Budi" in parsed[1]["sender"] or parsed[1]["sender"] == "10:31 Budi"
     assert "lagi di warkop" in parsed[1]["raw_text"]
+
+@pytest.fixture
+def tiny_lexicon(tmp_path, monkeypatch):
+    from app.services import normalizer
+    from app.services.lexicon import lexicon_registry
+    csv_path = tmp_path / "lexicon.csv"
+    csv_path.write_text(
+        "﻿slang,formal,In-dictionary,context,category1,category2\n"
+        "gw,saya,1,\"gw mau, ya\",abreviasi,0\n"
+        "elu,kamu,1,,homofon,\n"
+        "skip,dilewati,0,,,\n",
+        encoding="utf-8",
+    )
+    # restore the real lexicon state after the test
+    for name in ("slang_dict", "slang_meta", "_slang_loaded", "_slang_meta_loaded"):
+        monkeypatch.setattr(normalizer, name, getattr(normalizer, name))
+    monkeypatch.setattr(lexicon_registry, "_current", lexicon_registry._current)
+    monkeypatch.setattr(lexicon_registry, "_fingerprint", lexicon_registry._fingerprint)
+    monkeypatch.setattr(normalizer, "SLANG_PATH", str(csv_path))
+    monkeypatch.setattr(normalizer, "SLANG_CACHE_PATH", str(tmp_path / "lexicon.cache"))
+    return normalizer
+
+def test_load_slang_dict_from_csv(tiny_lexicon):
+    d, meta = tiny_lexicon.load_slang_dict(force_reload=True)
+    assert d == {"gw": "saya", "elu": "kamu"}
+    assert meta["gw"] == {"context": "gw mau, ya", "categories": ["abreviasi"]}
+    assert meta["elu"] == {"context": None, "categories": ["homofon"]}
+
+def test_empty_formal_maps_slang_to_itself(tiny_lexicon, caplog):
+    with open(tiny_lexicon.SLANG_PATH, "a", encoding="utf-8") as f:
+        f.write("anjay,,1,,,\n")
+    with caplog.at_level("INFO", logger=tiny_lexicon.__name__):
+        d, _ = tiny_lexicon.load_slang_dict(force_reload=True)
+    assert d["anjay"] == "anjay"
+    assert "Loaded 3 slang entries" in caplog.text
+
+def test_load_slang_dict_uses_compiled_cache(tiny_lexicon):
+    tiny_lexicon.load_slang_dict(force_reload=True)
+    assert os.path.exists(tiny_lexicon.SLANG_CACHE_PATH)
+
+    d, meta = tiny_lexicon.load_slang_dict(force_reload=True, with_meta=False)
+    assert d == {"gw": "saya", "elu": "kamu"}
+    assert meta == {}
+    # meta is filled in lazily on request
+    assert tiny_lexicon.load_slang_dict()[1]["gw"]["categories"] == ["abreviasi"]
+
+def test_compiled_cache_invalidated_on_change(tiny_lexicon):
+    tiny_lexicon.load_slang_dict(force_reload=True)
+    with open(tiny_lexicon.SLANG_PATH, "a", encoding="utf-8") as f:
+        f.write("bro,saudara,1,,,\n")
+    d, _ = tiny_lexicon.load_slang_dict(force_reload=True)
+    assert d["bro"] == "saudara"
+
+def test_normalize_many_matches_normalize_text():
+    from app.services.normalizer import normalize_many
+    texts = ["Haaalooo GW!!", "", "...", "elu  (elu) elu?"]
+    assert normalize_many(texts) == [normalize_text(t) for t in texts]
+
+def test_token_memo_follows_reloaded_lexicon(tiny_lexicon):
+    tiny_lexicon.load_slang_dict(force_reload=True)
+    assert tiny_lexicon.normalize_text("gw, bro!") == "saya bro"
+    with open(tiny_lexicon.SLANG_PATH, "a", encoding="utf-8") as f:
+        f.write("bro,saudara,1,,,\n")
+    tiny_lexicon.load_slang_dict(force_reload=True)
+    assert tiny_lexicon.normalize_text("gw, bro!") == "saya saudara"
+
+def test_merge_overlapping_lines_drops_repeated_region():
+    from app.services.normalizer import merge_overlapping_lines
+    first = "10:00 Andi: halo\n10:01 Budi: apa kabar\n10:02 Andi: baik bro\n10:03 Budi: oke si"
+    second = "di: apa kabar\n10:02 Andi: baik br0\n10:03 Budi: oke siap\n10:04 Andi: mantap"
+    merged, removed = merge_overlapping_lines([first, second])
+    assert merged.splitlines() == [
+        "10:00 Andi: halo",
+        "10:01 Budi: apa kabar",
+        "10:02 Andi: baik bro",
+        "10:03 Budi: oke siap",   # the un-truncated copy wins
+        "10:04 Andi: mantap",
+    ]
+    assert removed == 3
+
+def test_merge_overlapping_lines_keeps_short_coincidences():
+    from app.services.normalizer import merge_overlapping_lines
+    assert merge_overlapping_lines(["a: ok", "a: ok\nb: lain"]) == ("a: ok\na: ok\nb: lain", 0)
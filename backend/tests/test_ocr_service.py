@@ -0,0 +1,241 @@
+import cv2
+import numpy as np
+import pytest
+from app.services.ocr_service import crop_to_content, estimate_noise, preprocess_image, split_into_bands
+
+def _screenshot(noise_sigma=0.0):
+    img = np.full((600, 400), 245, np.uint8)
+    for y in range(150, 450, 40):
+        cv2.putText(img, "halo bro", (120, y), cv2.FONT_HERSHEY_SIMPLEX, 0.8, 20, 2)
+    if noise_sigma:
+        rng = np.random.default_rng(0)
+        img = np.clip(img + rng.normal(0, noise_sigma, img.shape), 0, 255).astype(np.uint8)
+    return img
+
+def _png(img):
+    return cv2.imencode(".png", img)[1].tobytes()
+
+def test_estimate_noise_separates_clean_and_noisy():
+    assert estimate_noise(_screenshot()) < 1.0
+    assert 8.0 < estimate_noise(_screenshot(noise_sigma=10)) < 12.0
+
+def test_crop_to_content_trims_uniform_margins():
+    cropped = crop_to_content(_screenshot())
+    assert cropped.shape[0] < 600 and cropped.shape[1] < 400
+
+def test_clean_image_skips_denoise():
+    report = {}
+    out = preprocess_image(_png(_screenshot()), profile="balanced", report=report)
+    assert report["denoise"] == "none"
+    assert set(np.unique(out)) <= {0, 255}
+    assert {"decode", "resize", "estimate_noise", "denoise", "threshold"} <= set(report["timings_ms"])
+
+def test_noisy_image_is_denoised_per_profile():
+    data = _png(_screenshot(noise_sigma=10))
+    fast, quality = {}, {}
+    preprocess_image(data, profile="fast", report=fast)
+    preprocess_image(data, profile="quality", report=quality)
+    assert fast["denoise"] == "median"
+    assert quality["denoise"] == "nlmeans-21"
+
+def test_fast_profile_downscales_wide_images():
+    img = cv2.resize(_screenshot(noise_sigma=10), (2160, 3240))
+    report = {}
+    preprocess_image(_png(img), profile="fast", report=report)
+    assert report["ocr_size"][0] == 1080
+
+def test_unknown_profile_rejected():
+    with pytest.raises(ValueError):
+        preprocess_image(_png(_screenshot()), profile="turbo")
+
+def _tall_binary(lines=40, line_height=20, gap=30):
+    img = np.full((lines * (line_height + gap), 300), 255, np.uint8)
+    for i in range(lines):
+        top = i * (line_height + gap) + gap // 2
+        img[top:top + line_height, 20:280] = 0
+    return img
+
+def test_split_into_bands_cuts_only_in_gaps():
+    binary = _tall_binary()
+    bands = split_into_bands(binary, min_height=300, min_gap=6)
+    assert bands[0][0] == 0 and bands[-1][1] == binary.shape[0]
+    assert all(a[1] == b[0] for a, b in zip(bands, bands[1:]))
+    assert all(bottom - top >= 300 for top, bottom in bands[:-1])
+    assert bands[-1][1] - bands[-1][0] >= 150
+    for _, bottom in bands[:-1]:
+        assert (binary[bottom] == 255).all()  # cut row is blank
+
+def test_tiled_ocr_keeps_band_order(monkeypatch):
+    from app.services import ocr_service
+    binary = _tall_binary()
+    monkeypatch.setattr(ocr_service, "_ocr", lambda band: f"band {band.shape[0]}\n")
+    text, tiles = ocr_service._ocr_tiled(binary)
+    expected = [f"band {b - t}" for t, b in split_into_bands(binary)]
+    assert tiles == len(expected) > 1
+    assert text.splitlines() == expected
+
+def test_ocr_language_detected_once(monkeypatch):
+    from app.services import ocr_service
+    calls = []
+    monkeypatch.setattr(ocr_service.PytesseractEngine, "available_languages", staticmethod(lambda: ["eng", "osd"]))
+    monkeypatch.setattr(ocr_service.pytesseract, "image_to_string", lambda img, **kw: calls.append(kw) or "halo")
+
+    engine = ocr_service.create_ocr_engine("pytesseract")
+    assert engine.lang is None  # "ind" missing -> default language, no per-call retry
+    assert engine.image_to_text(np.zeros((5, 5), np.uint8)) == "halo"
+    assert calls == [{"config": ocr_service.TESSERACT_CONFIG}]
+
+def test_pytesseract_falls_back_to_default_language(monkeypatch):
+    from app.services import ocr_service
+    calls = []
+
+    def image_to_string(img, **kw):
+        calls.append(kw.get("lang"))
+        if "lang" in kw:
+            raise ocr_service.pytesseract.TesseractError(1, "Failed loading language 'ind'")
+        return "halo"
+
+    monkeypatch.setattr(ocr_service.pytesseract, "image_to_string", image_to_string)
+    engine = ocr_service.PytesseractEngine("ind")
+    assert engine.image_to_text(np.zeros((5, 5), np.uint8)) == "halo"
+    assert calls == ["ind", None]
+
+def test_ocr_engine_requires_image_to_text():
+    from app.services.ocr_service import OCREngine
+
+    class Incomplete(OCREngine):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete(None)
+
+@pytest.fixture
+def fake_tesserocr(monkeypatch):
+    """Stand-in tesserocr module; returns (kwargs of every created API, APIs ended)."""
+    import sys, types
+    created, ended = [], []
+
+    class FakeAPI:
+        def __init__(self, **kwargs):
+            created.append(kwargs)
+        def SetImageBytes(self, data, width, height, bpp, bpl):
+            self.size = (width, height)
+        def GetUTF8Text(self):
+            return "%dx%d" % self.size
+        def Clear(self):
+            pass
+        def End(self):
+            ended.append(self)
+
+    fake = types.SimpleNamespace(
+        PyTessBaseAPI=FakeAPI,
+        PSM=types.SimpleNamespace(SINGLE_BLOCK=6),
+        OEM=types.SimpleNamespace(DEFAULT=3),
+        get_languages=lambda: ("/tessdata", ["eng", "ind"]),
+    )
+    monkeypatch.setitem(sys.modules, "tesserocr", fake)
+    return created, ended
+
+def test_tesserocr_engine_reuses_instances(fake_tesserocr):
+    from concurrent.futures import ThreadPoolExecutor
+    from app.services import ocr_service
+    created, _ = fake_tesserocr
+
+    engine = ocr_service.create_ocr_engine("tesserocr")
+    engine.size = 2
+    with ThreadPoolExecutor(8) as pool:
+        out = list(pool.map(engine.image_to_text, [np.zeros((4, w), np.uint8) for w in range(1, 41)]))
+
+    assert out == ["%dx4" % w for w in range(1, 41)]
+    assert 1 <= len(created) <= 2
+    assert created[0] == {"psm": 6, "oem": 3, "lang": "ind"}
+    engine.close()
+
+def test_tesserocr_close_ends_checked_out_instances(fake_tesserocr):
+    from app.services import ocr_service
+    _, ended = fake_tesserocr
+
+    engine = ocr_service.create_ocr_engine("tesserocr")
+    engine.size = 2
+    in_flight = engine._acquire()                        # held by a tile thread during shutdown
+    engine.image_to_text(np.zeros((4, 4), np.uint8))    # second instance, back in the idle queue
+    assert engine.status()["workers"] == 2
+
+    engine.close()
+    assert len(ended) == 1 and in_flight not in ended
+    engine._release(in_flight)
+    assert in_flight in ended and len(ended) == 2
+    assert engine.status()["workers"] == 0
+    with pytest.raises(RuntimeError):
+        engine.image_to_text(np.zeros((4, 4), np.uint8))
+
+@pytest.fixture
+def counting_ocr(monkeypatch):
+    from app.services import ocr_service
+    calls = []
+    monkeypatch.setattr(ocr_service, "_ocr", lambda image: calls.append(image.shape) or "10:00 a: halo")
+    monkeypatch.setattr(ocr_service, "_ocr_engine", ocr_service.PytesseractEngine(None))
+    monkeypatch.setattr(ocr_service, "ocr_cache", ocr_service.LRUCache(16))
+    monkeypatch.setattr(ocr_service, "ocr_phash_index", ocr_service.LRUCache(16))
+    return calls
+
+def test_ocr_cache_exact_and_perceptual_hits(counting_ocr, monkeypatch):
+    from app.services import ocr_service
+    from app.services.ocr_service import extract_text_from_image
+    monkeypatch.setattr(ocr_service, "OCR_CACHE_PHASH", True)
+    img = _screenshot()
+    png = _png(img)
+    jpeg = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 95])[1].tobytes()
+
+    first, again, reencoded = {}, {}, {}
+    assert extract_text_from_image(png, report=first) == "10:00 a: halo"
+    assert extract_text_from_image(png, report=again) == "10:00 a: halo"
+    assert extract_text_from_image(jpeg, report=reencoded) == "10:00 a: halo"
+
+    assert len(counting_ocr) == 1
+    assert (first["cache"], again["cache"], reencoded["cache"]) == ("miss", "exact", "perceptual")
+    for hit in (again, reencoded):
+        assert hit.keys() == first.keys()
+        assert hit["timings_ms"].keys() == first["timings_ms"].keys()
+        assert hit["noise"] == first["noise"] and hit["tiles"] == first["tiles"]
+    assert again["timings_ms"]["ocr"] == 0.0
+
+def test_ocr_cache_perceptual_off_by_default(counting_ocr):
+    from app.services.ocr_service import extract_text_from_image
+    img = _screenshot()
+    extract_text_from_image(_png(img))
+    report = {}
+    extract_text_from_image(cv2.imencode(".jpg", img)[1].tobytes(), report=report)
+    assert report["cache"] == "miss"
+    assert len(counting_ocr) == 2
+
+def test_ocr_cache_misses_on_edited_screenshot(counting_ocr, monkeypatch):
+    from app.services import ocr_service
+    from app.services.ocr_service import extract_text_from_image
+    monkeypatch.setattr(ocr_service, "OCR_CACHE_PHASH", True)
+    # A one-character edit may keep the coarse dHash; the thumbnail check must still reject it
+    monkeypatch.setattr(ocr_service, "image_dhash", lambda gray: (8, 0))
+    img = _screenshot()
+    edited = np.full_like(img, 245)
+    for y in range(150, 450, 40):
+        cv2.putText(edited, "halo brp" if y == 270 else "halo bro", (120, y), cv2.FONT_HERSHEY_SIMPLEX, 0.8, 20, 2)
+
+    extract_text_from_image(_png(img))
+    report = {}
+    extract_text_from_image(_png(edited), report=report)
+    assert report["cache"] == "miss"
+    assert len(counting_ocr) == 2
+
+def test_ocr_cache_holds_one_entry_per_screenshot(counting_ocr, monkeypatch):
+    from app.services import ocr_service
+    from app.services.ocr_service import extract_text_from_image
+    monkeypatch.setattr(ocr_service, "OCR_CACHE_PHASH", True)
+    tall = np.full((8000, 400), 245, np.uint8)
+    for y in range(100, 7900, 40):
+        cv2.putText(tall, "halo bro", (120, y), cv2.FONT_HERSHEY_SIMPLEX, 0.8, 20, 2)
+
+    extract_text_from_image(_png(tall))
+    extract_text_from_image(_png(_screenshot()))
+    assert ocr_service.ocr_cache.stats()["entries"] == 2
+    thumbnails = [entry[2] for entry in ocr_service.ocr_cache._data.values()]
+    assert max(t.nbytes for t in thumbnails) <= ocr_service.VERIFY_WIDTH * ocr_service.VERIFY_MAX_ROWS
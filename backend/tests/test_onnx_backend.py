@@ -0,0 +1,36 @@
+# Parity between the PyTorch and ONNX Runtime backends.
+# Skipped unless torch, optimum[onnxruntime] and the model weights are available.
+import os
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("optimum.onnxruntime")
+
+from app.services.ai_engine import build_pipeline
+
+MODEL = os.getenv("SENTIMENT_MODEL", "w11wo/indonesian-roberta-base-sentiment-classifier")
+SAMPLES = [
+    "bagus sekali",
+    "dasar tolol lu",
+    "sebenernya gue kangen nongkrong aja, lu jarang muncul skrng",
+    "hmm ya lumayan sih wkwk",
+]
+
+@pytest.fixture(scope="module")
+def reference():
+    try:
+        pipe = build_pipeline(MODEL, "pytorch", os.getenv("HF_CACHE_DIR"))
+    except Exception as e:
+        pytest.skip(f"model not available: {e}")
+    return pipe(SAMPLES)
+
+def _scores(output):
+    return [{d["label"]: d["score"] for d in row} for row in output]
+
+@pytest.mark.parametrize("backend,tolerance", [("onnx", 1e-3), ("onnx-int8", 0.1)])
+def test_onnx_matches_pytorch(reference, backend, tolerance):
+    pipe = build_pipeline(MODEL, backend, os.getenv("HF_CACHE_DIR"))
+    for ref, got in zip(_scores(reference), _scores(pipe(SAMPLES))):
+        assert max(got, key=got.get) == max(ref, key=ref.get)
+        for label, score in ref.items():
+            assert got[label] == pytest.approx(score, abs=tolerance)
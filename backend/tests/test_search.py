@@ -0,0 +1,100 @@
+import pytest
+from datetime import date, datetime, timedelta
+from sqlalchemy import delete, text
+
+from app.database import AuditMessage, AuditSession, create_search_index
+from app.search import index_new_messages, match_expression, rebuild_search_index, search_messages
+
+
+@pytest.fixture(autouse=True)
+def search_index(engine):
+    create_search_index(engine)
+
+
+def _rows(messages):
+    return [(sender, norm, norm, toxic) for sender, norm, toxic in messages]
+
+
+def _ids(hits):
+    return [(h["session_id"], h["msg_order"]) for h in hits]
+
+
+def test_match_expression_quotes_terms():
+    assert match_expression('dasar "tolol" OR*') == '"dasar" "tolol" "OR"'
+    assert match_expression(" ... ") is None
+
+
+def test_search_folds_leet_spellings(db, save):
+    session_id = save(_rows([("andi", "woy t0l0l jam 10:00", True), ("budi", "dasar b!tch", True)]))
+
+    assert _ids(search_messages(db, match_expression("tolol"))) == [(session_id, 1)]
+    assert _ids(search_messages(db, match_expression("t0l0l"))) == [(session_id, 1)]
+    assert _ids(search_messages(db, match_expression("bitch"))) == [(session_id, 2)]
+    assert _ids(search_messages(db, match_expression("10"))) == [(session_id, 1)]
+
+
+def test_search_index_with_old_layout_is_replaced(db, save, engine):
+    save(_rows([("andi", "woy t0l0l", True)]))
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE audit_messages_fts")
+        conn.exec_driver_sql("CREATE VIRTUAL TABLE audit_messages_fts USING fts5(normalized_text)")
+    assert create_search_index(engine) is True
+    assert create_search_index(engine) is False
+
+    assert rebuild_search_index(db) == 1
+    assert len(search_messages(db, match_expression("tolol"))) == 1
+
+
+@pytest.mark.parametrize("storage", ["plain", "compact"])
+def test_search_filters_and_snippets(db, save, monkeypatch, storage):
+    monkeypatch.setattr("app.main.STORAGE_MODE", storage)
+    old = save(_rows([("andi", "dasar tolol kamu", True)]), created_at=datetime(2026, 1, 5, 10))
+    new = save(_rows([("budi", "halo semua", False), ("andi", "tolol banget sih", True), ("citra", "jangan bilang tolol", False)]))
+
+    match = match_expression("tolol")
+    assert _ids(search_messages(db, match)) == [(new, 3), (new, 2), (old, 1)]
+    assert _ids(search_messages(db, match, sender="andi")) == [(new, 2), (old, 1)]
+    assert _ids(search_messages(db, match, is_toxic=False)) == [(new, 3)]
+    assert _ids(search_messages(db, match, label="negative", date_to=date(2026, 1, 5))) == [(old, 1)]
+    assert _ids(search_messages(db, match, date_from=datetime.utcnow().date() - timedelta(days=1))) == [(new, 3), (new, 2)]
+    assert _ids(search_messages(db, match_expression("tolol banget"))) == [(new, 2)]
+
+    hit = search_messages(db, match, sender="andi", limit=1)[0]
+    assert hit["snippet"] == "[tolol] banget sih" and hit["sender"] == "andi" and hit["label"] == "negative"
+
+
+def test_search_paging_and_delete_sync(db, save):
+    session_id = save(_rows([("andi", f"pesan kasar nomor {i}", True) for i in range(5)]))
+    match = match_expression("kasar")
+
+    pages, cursor = [], None
+    while True:
+        hits = search_messages(db, match, cursor=cursor, limit=2)
+        pages.append([h["msg_order"] for h in hits])
+        if len(hits) < 2:
+            break
+        cursor = hits[-1]["message_id"]
+    assert pages == [[5, 4], [3, 2], [1]]
+
+    db.execute(delete(AuditMessage).where(AuditMessage.msg_order > 3))
+    db.commit()
+    assert [h["msg_order"] for h in search_messages(db, match)] == [3, 2, 1]
+
+    db.execute(text("DELETE FROM audit_messages_fts"))
+    db.commit()
+    assert rebuild_search_index(db, chunk_size=2) == 3
+    assert len(search_messages(db, match)) == 3
+    db.delete(db.get(AuditSession, session_id))
+    db.commit()
+    assert search_messages(db, match) == []
+
+
+def test_messages_saved_while_search_was_off_are_indexed(db, save, monkeypatch):
+    first = save(_rows([("andi", "dasar tolol", True)]))
+    monkeypatch.setattr("app.search.AUDIT_SEARCH", False)
+    later = save(_rows([("budi", "tolol juga", True), ("citra", "halo", False)]))
+    assert _ids(search_messages(db, match_expression("tolol"))) == [(first, 1)]
+
+    assert index_new_messages(db, chunk_size=1) == 2
+    assert index_new_messages(db) == 0
+    assert _ids(search_messages(db, match_expression("tolol"))) == [(later, 1), (first, 1)]
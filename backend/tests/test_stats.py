@@ -0,0 +1,45 @@
+import pytest
+
+from app.database import AuditSession
+from app.stats import rebuild_stats, stats_summary, unrecord_sessions
+
+
+def _rows(messages):
+    return [(sender, "pesan", "pesan", toxic) for sender, toxic in messages]
+
+
+def test_record_and_unrecord(db, save):
+    save(_rows([("andi", True), ("budi", False)]), source="text", safety_score=50)
+    save(_rows([("andi", True), ("andi", False)]), source="text", safety_score=50)
+    image = save(_rows([("budi", False)]), source="image", safety_score=100)
+
+    stats = stats_summary(db)
+    [day] = stats["daily"]
+    assert (day["sessions"], day["messages"], day["toxic_messages"]) == (3, 5, 2)
+    assert day["toxic_rate"] == 0.4 and day["avg_safety_score"] == pytest.approx(66.7)
+    assert {s["source"]: s["sessions"] for s in stats["sources"]} == {"image": 1, "text": 2}
+    assert stats["senders"][0] == {"sender": "andi", "messages": 3, "toxic_messages": 2, "toxic_rate": 0.6667}
+    assert [b["sessions"] for b in stats["safety_distribution"]] == [0, 0, 0, 0, 0, 2, 0, 0, 0, 1]
+
+    unrecord_sessions(db, [image])
+    db.delete(db.get(AuditSession, image))
+    db.commit()
+    stats = stats_summary(db)
+    assert [s["source"] for s in stats["sources"]] == ["text"]
+    assert {s["sender"]: s["messages"] for s in stats["senders"]} == {"andi": 3, "budi": 1}
+    assert stats["safety_distribution"][9]["sessions"] == 0
+
+    assert stats_summary(db, source="image")["daily"] == []
+
+
+def test_rebuild_matches_incremental(db, save):
+    save(_rows([("andi", True), ("budi", False)]), source="text", safety_score=50)
+    save(_rows([("citra", False)]), source="image", safety_score=100)
+    db.add(AuditSession(source="text", total_messages=5, toxic_messages=5, safety_score=0,
+                        processing_time_seconds=0, status="failed"))
+    db.commit()
+    incremental = stats_summary(db)
+
+    rebuild_stats(db)
+    db.commit()
+    assert stats_summary(db) == incremental
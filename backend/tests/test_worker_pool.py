@@ -0,0 +1,27 @@
+import asyncio
+import threading
+import pytest
+from app.worker_pool import BoundedWorkerPool, PoolSaturatedError
+
+def test_run_returns_result():
+    pool = BoundedWorkerPool(max_workers=2, max_queue=0)
+    assert asyncio.run(pool.run(sum, [1, 2, 3])) == 6
+    assert pool.stats()["in_flight"] == 0
+    pool.shutdown()
+
+def test_rejects_when_queue_full():
+    pool = BoundedWorkerPool(max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def scenario():
+        busy = [asyncio.ensure_future(pool.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(PoolSaturatedError):
+            await pool.run(release.wait)
+        release.set()
+        await asyncio.gather(*busy)
+        return await pool.run(lambda: "ok")
+
+    assert asyncio.run(scenario()) == "ok"
+    assert pool.stats()["rejected"] == 1
+    pool.shutdown()